@@ -18,12 +18,79 @@ class Settings(BaseSettings):
     
     # Redis
     redis_url: str = "redis://localhost:6379"
+    redis_max_connections: int = 50
+    redis_socket_timeout: float = 0.25
+    redis_breaker_threshold: int = 5
+    redis_breaker_cooldown: float = 30.0
+    generation_lease: float = 10.0  # renewed while the leader generates; lapses this long after a crash
+    generation_poll_interval: float = 0.2
+    
+    # In-process cache tier in front of Redis
+    local_cache_max_entries: int = 1000
+    local_cache_ttl: int = 300
+    local_cache_max_pinned: int = 150  # top 50 quick-fix topics x 3 languages
+    local_cache_pin_ttl: int = 3600  # pinned entries are re-read from Redis after this
+    local_cache_pin_refresh: int = 300  # seconds between re-reads of the quick-fix board
+    cache_stale_ttl_factor: float = 6.0  # serve stale up to this many soft TTLs
+    cache_feedback_extension: int = 3600  # fresh time added when a playbook helped
+    cache_feedback_max_ttl: int = 86400
+    cache_ref_ttl: int = 7 * 86400  # shared NCERT refs/videos; outlives any playbook
+    leaderboard_max_entries: int = 5000  # usage leaderboards are trimmed to their top keys
+    
+    # Semantic cache (cosine similarity of hashed n-gram vectors)
+    semantic_cache_threshold: float = 0.88
+    semantic_cache_near_miss: float = 0.6
+    semantic_cache_max_entries: int = 500  # per grade/subject/language scope
+    semantic_cache_refresh_interval: float = 60.0  # re-read a scope from Redis after this
     
     # JWT
     jwt_secret: str = "sahayak-ai-secret-key-2024-finals"
     jwt_algorithm: str = "HS256"
     jwt_expiry_hours: int = 24
     
+    # LLM concurrency (in-flight calls per worker, per provider)
+    llm_max_concurrency: int = 32
+    
+    # SOS pipeline stage deadlines (seconds)
+    context_stage_timeout: float = 4.0
+    context_classifier_threshold: float = 0.4  # ask the LLM below this confidence
+    playbook_stage_timeout: float = 15.0
+    similar_stage_timeout: float = 0.5
+    ncert_stage_timeout: float = 0.5
+    video_stage_timeout: float = 3.0
+    partial_cache_ttl: int = 300
+    
+    # Batch playbook requests
+    batch_max_items: int = 50
+    batch_max_concurrency: int = 8
+    
+    # Retrieval
+    vector_index_dim: int = 512
+    vector_grade_window: int = 2  # quick fixes within +/- this many grades
+    rrf_k: int = 60
+    retrieval_min_score: float = 0.05  # drop fused results below this
+    quick_fix_threshold: float = 0.8  # serve a quick fix above this fused score
+    retrieval_threads: int = 4
+    
+    # Database
+    database_backend: str = "sqlite"  # sqlite | memory
+    database_path: str = str(Path(__file__).parent.parent / "sahayak.db")
+    database_batch_size: int = 50
+    database_flush_interval: float = 0.5
+    
+    # Off-peak cache warming (hours are local; the window may wrap midnight)
+    cache_warm_enabled: bool = True
+    cache_warm_start_hour: int = 21
+    cache_warm_end_hour: int = 6
+    cache_warm_check_interval: int = 900  # seconds
+    cache_warm_llm_budget: int = 50  # LLM generations per window
+    cache_warm_max_candidates: int = 200
+    cache_warm_quick_fixes: int = 20
+    cache_warm_ttl: int = 86400  # long enough to last until the morning
+    
+    # Dashboard response cache (one entry per teacher/cluster/district)
+    dashboard_cache_max_entries: int = 500
+    
     # App
     app_name: str = "SAHAYAK AI"
     debug: bool = True
@@ -1,23 +1,113 @@
-"""Mock database layer simulating MongoDB."""
-import json
+"""Data layer: demo data and the functions routes use, backed by a repository."""
+import asyncio
+import threading
 from datetime import datetime, timedelta
-from typing import Optional
-from pathlib import Path
+from typing import Callable, Optional
 import uuid
 
-# In-memory storage (simulating MongoDB collections)
-USERS_DB: dict = {}
-SOS_HISTORY_DB: dict = {}
-PLAYBOOKS_DB: dict = {}
-SOLUTIONS_DB: dict = {}
+from ..config import get_settings
+from .repository import (
+    Repository, AsyncRepository, MemoryRepository, SQLiteRepository, ThreadedAsyncRepository,
+    ALL_TIME, ROLLUP_KEY, outcome_counts
+)
 
+settings = get_settings()
 
-def init_mock_data():
-    """Initialize mock data for demo."""
-    global USERS_DB, SOS_HISTORY_DB, PLAYBOOKS_DB, SOLUTIONS_DB
+
+def open_repository(backend: Optional[str] = None, path: Optional[str] = None) -> Repository:
+    """Open a repository and seed the demo data into it.
+
+    backend is "sqlite" or "memory" (default settings.database_backend); a
+    SQLite database is created at path (default settings.database_path) if
+    it does not exist yet.
+    """
+    backend = backend or settings.database_backend
+    if backend == "sqlite":
+        path = path or settings.database_path
+        print(f"🗄️ Using SQLite database at {path}")
+        repo = SQLiteRepository(
+            path,
+            batch_size=settings.database_batch_size,
+            flush_interval=settings.database_flush_interval
+        )
+    else:
+        repo = MemoryRepository()
+    init_mock_data(repo)
+    return repo
+
+
+# Global instance, opened by connect_db at startup (or on first use by scripts)
+repository: Optional[Repository] = None
+repository_lock = threading.Lock()
+flush_task: Optional[asyncio.Task] = None
+
+# Called with a teacher ID whenever that teacher's SOS history or feedback changes
+sos_listeners: list = []
+
+
+def get_repository() -> Repository:
+    """Get repository instance, opening it on first use."""
+    global repository
+    if repository is None:
+        with repository_lock:
+            if repository is None:
+                repository = open_repository()
+    return repository
+
+
+def get_async_repository() -> AsyncRepository:
+    """Get the repository behind the async interface, for async callers."""
+    return ThreadedAsyncRepository(get_repository())
+
+
+def add_sos_listener(callback: Callable[[str], None]):
+    """Register a callback for changes to a teacher's SOS records."""
+    sos_listeners.append(callback)
+
+
+def notify_sos_changed(teacher_id: str):
+    """Tell listeners that a teacher's SOS records changed."""
+    for callback in sos_listeners:
+        try:
+            callback(teacher_id)
+        except Exception as e:
+            print(f"SOS listener error: {e}")
+
+
+async def flush_periodically():
+    """Write out buffered writes that no later write or read has flushed."""
+    while True:
+        await asyncio.sleep(settings.database_flush_interval)
+        try:
+            get_repository().flush()
+        except Exception as e:
+            print(f"Database flush error: {e}")
+
+
+async def connect_db():
+    """Open the repository and start the background flush (call from app startup)."""
+    global flush_task
+    await asyncio.to_thread(get_repository)
+    if flush_task is None:
+        flush_task = asyncio.create_task(flush_periodically())
+
+
+async def close_db():
+    """Flush pending writes and close the repository."""
+    global flush_task, repository
+    if flush_task:
+        flush_task.cancel()
+        flush_task = None
+    if repository is not None:
+        repository.close()
+        repository = None
+
+
+def init_mock_data(repo: Repository):
+    """Seed demo data that is not in the repository yet."""
     
     # Mock users
-    USERS_DB = {
+    users = {
         "teacher1": {
             "id": "teacher1",
             "name": "Priya Sharma",
@@ -80,7 +170,7 @@ def init_mock_data():
     
     # Mock SOS history
     base_time = datetime.now()
-    SOS_HISTORY_DB = {
+    sos_history = {
         "sos1": {
             "id": "sos1",
             "teacher_id": "teacher1",
@@ -115,7 +205,7 @@ def init_mock_data():
     }
     
     # Mock shared solutions
-    SOLUTIONS_DB = {
+    solutions = {
         "sol1": {
             "id": "sol1",
             "problem": "Students struggling with place value",
@@ -143,34 +233,84 @@ def init_mock_data():
             "success_rate": 0.82
         }
     }
+    
+    repo.seed(users.values(), sos_history.values(), solutions.values())
+    if not repo.has_rollups():
+        rebuild_rollups(repo)
+
+
+def rollup_keys(sos: dict, teacher: Optional[dict]) -> list:
+    """Get the all-time and daily rollup keys an SOS record counts towards."""
+    teacher = teacher or {}
+    context = sos.get("context") or {}
+    base = (
+        teacher.get("district") or "Unknown",
+        teacher.get("cluster") or "Unknown",
+        context.get("topic") or "Other",
+        context.get("subject") or "General"
+    )
+    return [base + (ALL_TIME,), base + (sos["created_at"][:10],)]
+
+
+def rebuild_rollups(repo: Repository):
+    """Recompute all SOS rollups from the stored history."""
+    teachers = {u["id"]: u for u in repo.list_users()}
+    totals: dict = {}
+    for sos in repo.list_sos():
+        successful, failed = outcome_counts(sos.get("success"))
+        for key in rollup_keys(sos, teachers.get(sos["teacher_id"])):
+            row = totals.setdefault(key, [0, 0, 0])
+            row[0] += 1
+            row[1] += successful
+            row[2] += failed
+    repo.replace_rollups(
+        {**dict(zip(ROLLUP_KEY, key)), "count": c, "successful": ok, "failed": bad}
+        for key, (c, ok, bad) in totals.items()
+    )
+
+
+def get_rollups(
+    district: Optional[str] = None,
+    cluster: Optional[str] = None,
+    since: Optional[str] = None
+) -> list:
+    """Get precomputed SOS aggregates per cluster/topic/subject (daily from since, else all-time)."""
+    return get_repository().get_rollups(district, cluster, since)
 
 
 def get_user_by_username(username: str) -> Optional[dict]:
     """Get user by username."""
-    for user in USERS_DB.values():
-        if user["username"] == username:
-            return user
-    return None
+    return get_repository().get_user_by_username(username)
 
 
 def get_user_by_id(user_id: str) -> Optional[dict]:
     """Get user by ID."""
-    return USERS_DB.get(user_id)
+    return get_repository().get_user(user_id)
+
+
+def get_all_users() -> list:
+    """Get all users."""
+    return get_repository().list_users()
 
 
 def get_sos_history(teacher_id: str, limit: int = 10) -> list:
     """Get SOS history for a teacher."""
-    history = [
-        sos for sos in SOS_HISTORY_DB.values()
-        if sos["teacher_id"] == teacher_id
-    ]
-    history.sort(key=lambda x: x["created_at"], reverse=True)
-    return history[:limit]
+    return get_repository().teacher_sos(teacher_id, limit)
+
+
+def get_all_sos(teacher_ids: Optional[list] = None) -> list:
+    """Get all SOS records, optionally only those of the given teachers."""
+    return get_repository().list_sos(teacher_ids)
+
 
+def get_sos_changes(after_seq: int) -> tuple[list, int]:
+    """Get SOS records saved or updated after a change sequence number."""
+    return get_repository().sos_changes(after_seq)
 
-def get_all_sos(cluster: Optional[str] = None, district: Optional[str] = None) -> list:
-    """Get all SOS records, optionally filtered."""
-    return list(SOS_HISTORY_DB.values())
+
+def get_data_version() -> int:
+    """Version of the SOS data; bumps on every SOS save or feedback update."""
+    return get_repository().sos_version()
 
 
 def save_sos(sos_data: dict) -> str:
@@ -178,26 +318,48 @@ def save_sos(sos_data: dict) -> str:
     sos_id = str(uuid.uuid4())[:8]
     sos_data["id"] = sos_id
     sos_data["created_at"] = datetime.now().isoformat()
-    SOS_HISTORY_DB[sos_id] = sos_data
+    repo = get_repository()
+    repo.save_sos(sos_data)
+    
+    successful, failed = outcome_counts(sos_data.get("success"))
+    keys = rollup_keys(sos_data, repo.get_user(sos_data["teacher_id"]))
+    repo.add_to_rollups(keys, 1, successful, failed)
+    notify_sos_changed(sos_data["teacher_id"])
     return sos_id
 
 
-def update_sos_success(sos_id: str, success: bool, feedback: Optional[str] = None):
-    """Update SOS success status."""
-    if sos_id in SOS_HISTORY_DB:
-        SOS_HISTORY_DB[sos_id]["success"] = success
-        if feedback:
-            SOS_HISTORY_DB[sos_id]["feedback"] = feedback
+def update_sos_success(sos_id: str, success: bool, feedback: Optional[str] = None) -> Optional[dict]:
+    """Update SOS success status; returns the SOS record as it was, if found.
+    
+    The record and its rollups change in one repository transaction, so
+    concurrent feedback on the same SOS moves its outcome only once.
+    """
+    repo = get_repository()
+    sos = repo.get_sos(sos_id)
+    if not sos:
+        return None
+    
+    fields = {"success": success}
+    if feedback:
+        fields["feedback"] = feedback
+    
+    # The rollups an SOS counts towards do not depend on its outcome
+    keys = rollup_keys(sos, repo.get_user(sos["teacher_id"]))
+    previous = repo.update_sos_outcome(sos_id, fields, keys)
+    if previous is None:
+        return None
+    notify_sos_changed(previous["teacher_id"])
+    return previous
 
 
 def get_solutions(topic: Optional[str] = None, grade: Optional[int] = None) -> list:
     """Get shared solutions."""
-    solutions = list(SOLUTIONS_DB.values())
-    if topic:
-        solutions = [s for s in solutions if topic.lower() in s["topic"].lower()]
-    if grade:
-        solutions = [s for s in solutions if s["grade"] == grade]
-    return solutions
+    return get_repository().list_solutions(topic, grade)
+
+
+def get_solution(solution_id: str) -> Optional[dict]:
+    """Get a shared solution by ID."""
+    return get_repository().get_solution(solution_id)
 
 
 def save_solution(solution_data: dict) -> str:
@@ -207,25 +369,43 @@ def save_solution(solution_data: dict) -> str:
     solution_data["trust_score"] = 0.5
     solution_data["usage_count"] = 0
     solution_data["success_rate"] = 0.0
-    SOLUTIONS_DB[sol_id] = solution_data
+    get_repository().save_solution(solution_data)
     return sol_id
 
 
+def update_solution(solution_id: str, fields: dict) -> bool:
+    """Update fields of a shared solution; False if it does not exist."""
+    return get_repository().update_solution(solution_id, fields)
+
+
+def increment_solution_usage(solution_id: str) -> Optional[int]:
+    """Count one more use of a shared solution; the new count, or None if it does not exist."""
+    return get_repository().increment_solution_usage(solution_id)
+
+
+def record_solution_feedback(solution_id: str, success: bool) -> Optional[dict]:
+    """Apply a teacher's feedback to a shared solution's trust; the updated solution, or None."""
+    return get_repository().record_solution_feedback(solution_id, success)
+
+
+def get_playbook(playbook_id: str) -> Optional[dict]:
+    """Get a stored playbook by ID."""
+    return get_repository().get_playbook(playbook_id)
+
+
+def save_playbook(playbook_data: dict) -> str:
+    """Store a playbook and return its ID."""
+    playbook_data.setdefault("id", str(uuid.uuid4())[:8])
+    get_repository().save_playbook(playbook_data)
+    return playbook_data["id"]
+
+
 def get_teachers_by_cluster(cluster: str) -> list:
     """Get all teachers in a cluster."""
-    return [
-        u for u in USERS_DB.values()
-        if u["role"] == "teacher" and u.get("cluster") == cluster
-    ]
+    return get_repository().list_users(role="teacher", cluster=cluster)
 
 
 def get_teachers_by_district(district: str) -> list:
     """Get all teachers in a district."""
-    return [
-        u for u in USERS_DB.values()
-        if u["role"] == "teacher" and u.get("district") == district
-    ]
-
+    return get_repository().list_users(role="teacher", district=district)
 
-# Initialize on import
-init_mock_data()
@@ -0,0 +1,1002 @@
+"""Repository layer behind the mock_db functions.
+
+Repository is the synchronous interface the data functions use; the
+in-memory and SQLite implementations live here. Async routes call it
+through asyncio.to_thread. AsyncRepository is the interface for async
+drivers (Postgres, Mongo); ThreadedAsyncRepository adapts any synchronous
+repository to it.
+
+SQLite is the default backend, so data now survives a restart, but its
+writes are batched: a crash loses the writes buffered since the last flush
+(at most batch_size of them, or flush_interval seconds' worth). Only new
+records and rollup increments are buffered; updates to existing records
+are committed immediately.
+"""
+import asyncio
+import bisect
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+# SOS aggregates are kept per (district, cluster, topic, subject, period),
+# where period is ALL_TIME or a day ("YYYY-MM-DD")
+ROLLUP_KEY = ("district", "cluster", "topic", "subject", "period")
+ALL_TIME = "all"
+
+
+def outcome_counts(success: Optional[bool]) -> tuple[int, int]:
+    """(successful, failed) contribution of an SOS success value."""
+    if success is None:
+        return 0, 0
+    return (1, 0) if success else (0, 1)
+
+
+def solution_feedback(solution: dict, success: bool) -> dict:
+    """New trust_score and success_rate of a shared solution after one piece of feedback.
+
+    Trust moves less the more the solution has been used.
+    """
+    current_trust = solution.get("trust_score", 0.5)
+    usage_count = max(solution.get("usage_count", 1), 1)
+    success_rate = solution.get("success_rate", 0.7) * 0.9
+    if success:
+        trust = min(1.0, current_trust + (0.1 / usage_count))
+        success_rate += 0.1
+    else:
+        trust = max(0.1, current_trust - (0.05 / usage_count))
+    return {"trust_score": round(trust, 2), "success_rate": success_rate}
+
+
+class Repository(ABC):
+    """Storage for users, SOS records, shared solutions and playbooks.
+
+    Records are plain dicts, as returned by the mock_db functions.
+    """
+
+    @abstractmethod
+    def seed(self, users: Iterable[dict], sos: Iterable[dict], solutions: Iterable[dict]):
+        """Insert demo records that are not stored yet."""
+
+    # Users
+    @abstractmethod
+    def get_user(self, user_id: str) -> Optional[dict]:
+        """Get a user by ID."""
+
+    @abstractmethod
+    def get_user_by_username(self, username: str) -> Optional[dict]:
+        """Get a user by username."""
+
+    @abstractmethod
+    def list_users(
+        self,
+        role: Optional[str] = None,
+        cluster: Optional[str] = None,
+        district: Optional[str] = None
+    ) -> list:
+        """Get the users matching every given filter."""
+
+    # SOS history
+    @abstractmethod
+    def list_sos(self, teacher_ids: Optional[Iterable[str]] = None) -> list:
+        """Get all SOS records, or those of the given teachers."""
+
+    @abstractmethod
+    def teacher_sos(self, teacher_id: str, limit: int) -> list:
+        """Get a teacher's most recent SOS records, newest first."""
+
+    @abstractmethod
+    def save_sos(self, record: dict):
+        """Insert or replace an SOS record."""
+
+    @abstractmethod
+    def update_sos(self, sos_id: str, fields: dict) -> bool:
+        """Update fields of an SOS record; False if it does not exist."""
+
+    @abstractmethod
+    def update_sos_outcome(self, sos_id: str, fields: dict, keys: Iterable[tuple]) -> Optional[dict]:
+        """Update an SOS record's success (and other fields) and its rollups atomically.
+
+        The successful/failed counts under each ROLLUP_KEY tuple in keys move
+        from the record's previous success to fields["success"], read and
+        written in one transaction so concurrent feedback cannot count twice.
+        Returns the record as it was before the update, or None if it does
+        not exist.
+        """
+
+    @abstractmethod
+    def get_sos(self, sos_id: str) -> Optional[dict]:
+        """Get an SOS record by ID."""
+
+    @abstractmethod
+    def sos_changes(self, after_seq: int) -> tuple[list, int]:
+        """Get SOS records saved or updated after a change sequence number.
+
+        Every save and update gives the record the next sequence number, so
+        a mirror that remembers the last number it saw can catch up on
+        writes from any worker. Returns (records, latest sequence number).
+        """
+
+    @abstractmethod
+    def sos_version(self) -> int:
+        """Latest SOS change sequence number; changes whenever any SOS is written."""
+
+    # SOS rollups
+    @abstractmethod
+    def add_to_rollups(self, keys: Iterable[tuple], count: int, successful: int, failed: int):
+        """Add deltas to the rollups under each ROLLUP_KEY tuple, creating them as needed."""
+
+    @abstractmethod
+    def get_rollups(
+        self,
+        district: Optional[str] = None,
+        cluster: Optional[str] = None,
+        since: Optional[str] = None
+    ) -> list:
+        """Get rollup rows; all-time rows, or daily rows from the since day on."""
+
+    @abstractmethod
+    def replace_rollups(self, rows: Iterable[dict]):
+        """Replace all rollups at once (used to rebuild them from history)."""
+
+    @abstractmethod
+    def has_rollups(self) -> bool:
+        """Check whether any rollups are stored."""
+
+    # Shared solutions
+    @abstractmethod
+    def get_solution(self, solution_id: str) -> Optional[dict]:
+        """Get a shared solution by ID."""
+
+    @abstractmethod
+    def list_solutions(self, topic: Optional[str] = None, grade: Optional[int] = None) -> list:
+        """Get shared solutions whose topic contains topic, in grade."""
+
+    @abstractmethod
+    def save_solution(self, record: dict):
+        """Insert or replace a shared solution."""
+
+    @abstractmethod
+    def update_solution(self, solution_id: str, fields: dict) -> bool:
+        """Update fields of a shared solution; False if it does not exist."""
+
+    @abstractmethod
+    def increment_solution_usage(self, solution_id: str) -> Optional[int]:
+        """Atomically add one to a solution's usage_count; the new count, or None if it does not exist."""
+
+    @abstractmethod
+    def record_solution_feedback(self, solution_id: str, success: bool) -> Optional[dict]:
+        """Atomically apply solution_feedback to a solution; the updated record, or None if it does not exist."""
+
+    # Playbooks
+    @abstractmethod
+    def get_playbook(self, playbook_id: str) -> Optional[dict]:
+        """Get a stored playbook by ID."""
+
+    @abstractmethod
+    def save_playbook(self, record: dict):
+        """Insert or replace a playbook."""
+
+    def flush(self):
+        """Write out any buffered writes."""
+
+    def close(self):
+        """Flush and release the storage."""
+        self.flush()
+
+
+class MemoryRepository(Repository):
+    """Per-process dicts (the original mock_db behaviour); nothing persists.
+
+    Secondary indexes are kept alongside the records: username -> user ID,
+    cluster/district -> user IDs, and per teacher an append-only list of
+    (created_at, SOS ID) in time order, so the last N SOS of a teacher are
+    read without scanning or sorting. Async routes call in from worker
+    threads, so SOS and rollup changes hold a lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.users: dict = {}
+        self.sos: dict = {}
+        self.solutions: dict = {}
+        self.playbooks: dict = {}
+        self.username_index: dict = {}
+        self.cluster_index: dict = {}
+        self.district_index: dict = {}
+        self.teacher_sos_index: dict = {}
+        self.rollups: dict = {}
+        self.sos_seq: OrderedDict = OrderedDict()  # SOS ID -> change sequence, oldest first
+        self._last_seq = 0
+
+    def seed(self, users, sos, solutions):
+        for user in users:
+            if user["id"] not in self.users:
+                self._add_user(user)
+        for record in sos:
+            if record["id"] not in self.sos:
+                self.save_sos(record)
+        for record in solutions:
+            self.solutions.setdefault(record["id"], record)
+
+    def _add_user(self, user: dict):
+        self.users[user["id"]] = user
+        self.username_index[user["username"]] = user["id"]
+        if user.get("cluster"):
+            self.cluster_index.setdefault(user["cluster"], []).append(user["id"])
+        if user.get("district"):
+            self.district_index.setdefault(user["district"], []).append(user["id"])
+
+    def get_user(self, user_id):
+        return self.users.get(user_id)
+
+    def get_user_by_username(self, username):
+        user_id = self.username_index.get(username)
+        return self.users.get(user_id) if user_id else None
+
+    def list_users(self, role=None, cluster=None, district=None):
+        if cluster is not None:
+            candidates = (self.users[i] for i in self.cluster_index.get(cluster, ()))
+        elif district is not None:
+            candidates = (self.users[i] for i in self.district_index.get(district, ()))
+        else:
+            candidates = self.users.values()
+        return [
+            u for u in candidates
+            if (role is None or u["role"] == role)
+            and (cluster is None or u.get("cluster") == cluster)
+            and (district is None or u.get("district") == district)
+        ]
+
+    def list_sos(self, teacher_ids=None):
+        if teacher_ids is None:
+            return list(self.sos.values())
+        return [
+            self.sos[sos_id]
+            for teacher_id in dict.fromkeys(teacher_ids)
+            for _, sos_id in self.teacher_sos_index.get(teacher_id, ())
+        ]
+
+    def teacher_sos(self, teacher_id, limit):
+        entries = self.teacher_sos_index.get(teacher_id, [])
+        return [self.sos[sos_id] for _, sos_id in reversed(entries[-limit:])] if limit > 0 else []
+
+    def save_sos(self, record):
+        with self._lock:
+            if record["id"] in self.sos:
+                # A reused ID may have belonged to another teacher
+                previous = self.sos[record["id"]]
+                self.teacher_sos_index[previous["teacher_id"]].remove((previous["created_at"], record["id"]))
+            entries = self.teacher_sos_index.setdefault(record["teacher_id"], [])
+            self.sos[record["id"]] = record
+
+            # New records are normally the latest, so this is an append
+            entry = (record["created_at"], record["id"])
+            if not entries or entries[-1] <= entry:
+                entries.append(entry)
+            else:
+                bisect.insort(entries, entry)
+            self._mark_changed(record["id"])
+
+    def update_sos(self, sos_id, fields):
+        with self._lock:
+            if sos_id not in self.sos:
+                return False
+            self.sos[sos_id].update(fields)
+            self._mark_changed(sos_id)
+            return True
+
+    def update_sos_outcome(self, sos_id, fields, keys):
+        with self._lock:
+            if sos_id not in self.sos:
+                return None
+            previous = dict(self.sos[sos_id])
+            self.update_sos(sos_id, fields)
+            old_successful, old_failed = outcome_counts(previous.get("success"))
+            new_successful, new_failed = outcome_counts(fields["success"])
+            if (old_successful, old_failed) != (new_successful, new_failed):
+                self.add_to_rollups(keys, 0, new_successful - old_successful, new_failed - old_failed)
+            return previous
+
+    def _mark_changed(self, sos_id: str):
+        self._last_seq += 1
+        self.sos_seq.pop(sos_id, None)
+        self.sos_seq[sos_id] = self._last_seq
+
+    def get_sos(self, sos_id):
+        return self.sos.get(sos_id)
+
+    def sos_changes(self, after_seq):
+        with self._lock:
+            changed = []
+            for sos_id in reversed(self.sos_seq):
+                if self.sos_seq[sos_id] <= after_seq:
+                    break
+                changed.append(self.sos[sos_id])
+            changed.reverse()
+            return changed, self._last_seq
+
+    def sos_version(self):
+        return self._last_seq
+
+    def add_to_rollups(self, keys, count, successful, failed):
+        with self._lock:
+            for key in keys:
+                totals = self.rollups.setdefault(key, [0, 0, 0])
+                totals[0] += count
+                totals[1] += successful
+                totals[2] += failed
+
+    def get_rollups(self, district=None, cluster=None, since=None):
+        with self._lock:
+            rollups = [(key, tuple(totals)) for key, totals in self.rollups.items()]
+        rows = []
+        for key, (count, successful, failed) in rollups:
+            row = dict(zip(ROLLUP_KEY, key))
+            if district is not None and row["district"] != district:
+                continue
+            if cluster is not None and row["cluster"] != cluster:
+                continue
+            if since is None:
+                if row["period"] != ALL_TIME:
+                    continue
+            elif row["period"] == ALL_TIME or row["period"] < since:
+                continue
+            rows.append({**row, "count": count, "successful": successful, "failed": failed})
+        return rows
+
+    def replace_rollups(self, rows):
+        self.rollups = {
+            tuple(row[field] for field in ROLLUP_KEY): [row["count"], row["successful"], row["failed"]]
+            for row in rows
+        }
+
+    def has_rollups(self):
+        return bool(self.rollups)
+
+    def get_solution(self, solution_id):
+        return self.solutions.get(solution_id)
+
+    def list_solutions(self, topic=None, grade=None):
+        solutions = list(self.solutions.values())
+        if topic:
+            solutions = [s for s in solutions if topic.lower() in s["topic"].lower()]
+        if grade:
+            solutions = [s for s in solutions if s["grade"] == grade]
+        return solutions
+
+    def save_solution(self, record):
+        self.solutions[record["id"]] = record
+
+    def update_solution(self, solution_id, fields):
+        if solution_id not in self.solutions:
+            return False
+        self.solutions[solution_id].update(fields)
+        return True
+
+    def increment_solution_usage(self, solution_id):
+        with self._lock:
+            solution = self.solutions.get(solution_id)
+            if solution is None:
+                return None
+            solution["usage_count"] = solution.get("usage_count", 0) + 1
+            return solution["usage_count"]
+
+    def record_solution_feedback(self, solution_id, success):
+        with self._lock:
+            solution = self.solutions.get(solution_id)
+            if solution is None:
+                return None
+            solution.update(solution_feedback(solution, success))
+            return solution
+
+    def get_playbook(self, playbook_id):
+        return self.playbooks.get(playbook_id)
+
+    def save_playbook(self, record):
+        self.playbooks[record["id"]] = record
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    username TEXT NOT NULL UNIQUE,
+    role TEXT NOT NULL,
+    cluster TEXT,
+    district TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_cluster ON users (cluster, role);
+CREATE INDEX IF NOT EXISTS users_district ON users (district, role);
+
+CREATE TABLE IF NOT EXISTS sos (
+    id TEXT PRIMARY KEY,
+    teacher_id TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    data TEXT NOT NULL,
+    seq INTEGER
+);
+CREATE INDEX IF NOT EXISTS sos_teacher_time ON sos (teacher_id, created_at);
+CREATE INDEX IF NOT EXISTS sos_seq ON sos (seq);
+
+CREATE TABLE IF NOT EXISTS solutions (
+    id TEXT PRIMARY KEY,
+    topic TEXT,
+    grade INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS solutions_grade ON solutions (grade);
+
+CREATE TABLE IF NOT EXISTS sos_rollups (
+    district TEXT NOT NULL,
+    cluster TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    period TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    successful INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (district, period, cluster, topic, subject)
+);
+
+CREATE TABLE IF NOT EXISTS playbooks (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+"""
+
+
+ROLLUP_UPSERT = (
+    "INSERT INTO sos_rollups (district, cluster, topic, subject, period, count, successful, failed) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (district, period, cluster, topic, subject) DO UPDATE SET "
+    "count = count + excluded.count, successful = successful + excluded.successful, "
+    "failed = failed + excluded.failed"
+)
+
+# Evaluated inside each write transaction, which SQLite serializes across
+# processes, so sequence numbers are unique and increasing for all workers
+NEXT_SOS_SEQ = "(SELECT coalesce(max(seq), 0) + 1 FROM sos)"
+
+
+class SQLiteRepository(Repository):
+    """SQLite storage in WAL mode, shared by all workers on a host.
+
+    Each record is stored as a JSON document next to the columns it is
+    looked up by. Writes are buffered and committed together in one
+    transaction once batch_size writes are pending or the oldest has waited
+    flush_interval seconds. A read flushes first only if a pending write
+    touches a table it reads, so a worker always sees its own writes while
+    unrelated reads (like the teacher lookup on every SOS save) leave the
+    batch to grow.
+
+    Buffered writes live only in this process until they are flushed: if it
+    crashes, up to batch_size writes from the last flush_interval seconds
+    are lost. Other workers do not see them before the flush either. Call
+    flush() (close() does) before relying on a write being durable.
+    """
+
+    def __init__(self, path: str, batch_size: int = 50, flush_interval: float = 0.5):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()
+        self._pending: list = []
+        self._pending_tables: set = set()
+        self._oldest_pending: Optional[float] = None
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SQLITE_SCHEMA)
+        self._conn.commit()
+
+    def _write(self, table: str, sql: str, params: tuple):
+        with self._lock:
+            self._pending.append((sql, params))
+            self._pending_tables.add(table)
+            if self._oldest_pending is None:
+                self._oldest_pending = time.monotonic()
+            if (
+                len(self._pending) >= self.batch_size
+                or time.monotonic() - self._oldest_pending >= self.flush_interval
+            ):
+                self.flush()
+
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending, self._oldest_pending = self._pending, [], None
+            self._pending_tables.clear()
+            with self._conn:
+                for sql, params in pending:
+                    self._conn.execute(sql, params)
+
+    def _flush_for(self, table: str):
+        """Flush pending writes (in order) if any of them touch table."""
+        with self._lock:
+            if table in self._pending_tables:
+                self.flush()
+
+    def _query(self, table: str, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            self._flush_for(table)
+            return [json.loads(row[0]) for row in self._conn.execute(sql, params)]
+
+    def _query_one(self, table: str, sql: str, params: tuple = ()) -> Optional[dict]:
+        rows = self._query(table, sql, params)
+        return rows[0] if rows else None
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._conn.close()
+
+    def seed(self, users, sos, solutions):
+        with self._lock:
+            self.flush()
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO users (id, username, role, cluster, district, data) VALUES (?, ?, ?, ?, ?, ?)",
+                    [self._user_row(u) for u in users]
+                )
+                self._conn.executemany(
+                    f"INSERT OR IGNORE INTO sos (id, teacher_id, created_at, data, seq) VALUES (?, ?, ?, ?, {NEXT_SOS_SEQ})",
+                    [self._sos_row(s) for s in sos]
+                )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO solutions (id, topic, grade, data) VALUES (?, ?, ?, ?)",
+                    [self._solution_row(s) for s in solutions]
+                )
+
+    @staticmethod
+    def _user_row(user: dict) -> tuple:
+        return (
+            user["id"], user["username"], user["role"], user.get("cluster"),
+            user.get("district"), json.dumps(user, ensure_ascii=False)
+        )
+
+    @staticmethod
+    def _sos_row(record: dict) -> tuple:
+        return (
+            record["id"], record["teacher_id"], record["created_at"],
+            json.dumps(record, ensure_ascii=False)
+        )
+
+    @staticmethod
+    def _solution_row(record: dict) -> tuple:
+        return (
+            record["id"], (record.get("topic") or "").lower(), record.get("grade"),
+            json.dumps(record, ensure_ascii=False)
+        )
+
+    @staticmethod
+    def _json_set(fields: dict) -> tuple[str, tuple]:
+        """Build a json_set() expression that updates fields inside the data column."""
+        paths = ", ".join("?, json(?)" for _ in fields)
+        params = []
+        for key, value in fields.items():
+            params += [f"$.{key}", json.dumps(value, ensure_ascii=False)]
+        return f"json_set(data, {paths})", tuple(params)
+
+    def get_user(self, user_id):
+        return self._query_one("users", "SELECT data FROM users WHERE id = ?", (user_id,))
+
+    def get_user_by_username(self, username):
+        return self._query_one("users", "SELECT data FROM users WHERE username = ?", (username,))
+
+    def list_users(self, role=None, cluster=None, district=None):
+        clauses, params = [], []
+        for column, value in (("role", role), ("cluster", cluster), ("district", district)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._query("users", f"SELECT data FROM users{where}", tuple(params))
+
+    def list_sos(self, teacher_ids=None):
+        if teacher_ids is None:
+            return self._query("sos", "SELECT data FROM sos")
+        teacher_ids = list(teacher_ids)
+        if not teacher_ids:
+            return []
+        marks = ", ".join("?" for _ in teacher_ids)
+        return self._query("sos", f"SELECT data FROM sos WHERE teacher_id IN ({marks})", tuple(teacher_ids))
+
+    def teacher_sos(self, teacher_id, limit):
+        return self._query(
+            "sos",
+            "SELECT data FROM sos WHERE teacher_id = ? ORDER BY created_at DESC LIMIT ?",
+            (teacher_id, limit)
+        )
+
+    def save_sos(self, record):
+        self._write(
+            "sos",
+            f"INSERT OR REPLACE INTO sos (id, teacher_id, created_at, data, seq) VALUES (?, ?, ?, ?, {NEXT_SOS_SEQ})",
+            self._sos_row(record)
+        )
+
+    def update_sos(self, sos_id, fields):
+        with self._lock:
+            self._flush_for("sos")
+            expression, params = self._json_set(fields)
+            with self._conn:
+                cursor = self._conn.execute(
+                    f"UPDATE sos SET data = {expression}, seq = {NEXT_SOS_SEQ} WHERE id = ?",
+                    params + (sos_id,)
+                )
+            return cursor.rowcount > 0
+
+    def update_sos_outcome(self, sos_id, fields, keys):
+        with self._lock:
+            self.flush()
+            expression, params = self._json_set(fields)
+            with self._conn:
+                # Take the write lock before reading, so no other worker can
+                # change the outcome between the read and the update
+                self._conn.execute("BEGIN IMMEDIATE")
+                row = self._conn.execute("SELECT data FROM sos WHERE id = ?", (sos_id,)).fetchone()
+                if row is None:
+                    return None
+                previous = json.loads(row[0])
+                self._conn.execute(
+                    f"UPDATE sos SET data = {expression}, seq = {NEXT_SOS_SEQ} WHERE id = ?",
+                    params + (sos_id,)
+                )
+                old_successful, old_failed = outcome_counts(previous.get("success"))
+                new_successful, new_failed = outcome_counts(fields["success"])
+                if (old_successful, old_failed) != (new_successful, new_failed):
+                    self._conn.executemany(
+                        ROLLUP_UPSERT,
+                        [
+                            tuple(key) + (0, new_successful - old_successful, new_failed - old_failed)
+                            for key in keys
+                        ]
+                    )
+            return previous
+
+    def get_sos(self, sos_id):
+        return self._query_one("sos", "SELECT data FROM sos WHERE id = ?", (sos_id,))
+
+    def sos_changes(self, after_seq):
+        with self._lock:
+            self._flush_for("sos")
+            rows = self._conn.execute(
+                "SELECT data, seq FROM sos WHERE seq > ? ORDER BY seq", (after_seq,)
+            ).fetchall()
+        if not rows:
+            return [], after_seq
+        return [json.loads(data) for data, _ in rows], rows[-1][1]
+
+    def sos_version(self):
+        with self._lock:
+            self._flush_for("sos")
+            return self._conn.execute("SELECT coalesce(max(seq), 0) FROM sos").fetchone()[0]
+
+    def add_to_rollups(self, keys, count, successful, failed):
+        for key in keys:
+            self._write("sos_rollups", ROLLUP_UPSERT, tuple(key) + (count, successful, failed))
+
+    def get_rollups(self, district=None, cluster=None, since=None):
+        clauses, params = [], []
+        if district is not None:
+            clauses.append("district = ?")
+            params.append(district)
+        if cluster is not None:
+            clauses.append("cluster = ?")
+            params.append(cluster)
+        if since is None:
+            clauses.append("period = ?")
+            params.append(ALL_TIME)
+        else:
+            clauses.append("period >= ? AND period != ?")
+            params += [since, ALL_TIME]
+        columns = ", ".join(ROLLUP_KEY + ("count", "successful", "failed"))
+        with self._lock:
+            self._flush_for("sos_rollups")
+            cursor = self._conn.execute(
+                f"SELECT {columns} FROM sos_rollups WHERE {' AND '.join(clauses)}", tuple(params)
+            )
+            names = [column[0] for column in cursor.description]
+            return [dict(zip(names, row)) for row in cursor]
+
+    def replace_rollups(self, rows):
+        with self._lock:
+            self._flush_for("sos_rollups")
+            with self._conn:
+                self._conn.execute("DELETE FROM sos_rollups")
+                self._conn.executemany(
+                    "INSERT INTO sos_rollups (district, cluster, topic, subject, period, count, successful, failed) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        tuple(row[field] for field in ROLLUP_KEY) + (row["count"], row["successful"], row["failed"])
+                        for row in rows
+                    ]
+                )
+
+    def has_rollups(self):
+        with self._lock:
+            self._flush_for("sos_rollups")
+            return self._conn.execute("SELECT 1 FROM sos_rollups LIMIT 1").fetchone() is not None
+
+    def get_solution(self, solution_id):
+        return self._query_one("solutions", "SELECT data FROM solutions WHERE id = ?", (solution_id,))
+
+    def list_solutions(self, topic=None, grade=None):
+        clauses, params = [], []
+        if topic:
+            clauses.append("instr(topic, ?) > 0")
+            params.append(topic.lower())
+        if grade:
+            clauses.append("grade = ?")
+            params.append(grade)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._query("solutions", f"SELECT data FROM solutions{where}", tuple(params))
+
+    def save_solution(self, record):
+        self._write(
+            "solutions",
+            "INSERT OR REPLACE INTO solutions (id, topic, grade, data) VALUES (?, ?, ?, ?)",
+            self._solution_row(record)
+        )
+
+    def update_solution(self, solution_id, fields):
+        with self._lock:
+            self._flush_for("solutions")
+            expression, params = self._json_set(fields)
+            with self._conn:
+                cursor = self._conn.execute(
+                    f"UPDATE solutions SET data = {expression} WHERE id = ?", params + (solution_id,)
+                )
+            return cursor.rowcount > 0
+
+    def increment_solution_usage(self, solution_id):
+        with self._lock:
+            self._flush_for("solutions")
+            with self._conn:
+                row = self._conn.execute(
+                    "UPDATE solutions SET data = json_set(data, '$.usage_count', "
+                    "coalesce(json_extract(data, '$.usage_count'), 0) + 1) WHERE id = ? "
+                    "RETURNING json_extract(data, '$.usage_count')",
+                    (solution_id,)
+                ).fetchone()
+            return row[0] if row else None
+
+    def record_solution_feedback(self, solution_id, success):
+        with self._lock:
+            self._flush_for("solutions")
+            with self._conn:
+                # Take the write lock before reading, so concurrent feedback
+                # from other workers is applied one after the other
+                self._conn.execute("BEGIN IMMEDIATE")
+                row = self._conn.execute("SELECT data FROM solutions WHERE id = ?", (solution_id,)).fetchone()
+                if row is None:
+                    return None
+                solution = json.loads(row[0])
+                fields = solution_feedback(solution, success)
+                expression, params = self._json_set(fields)
+                self._conn.execute(
+                    f"UPDATE solutions SET data = {expression} WHERE id = ?", params + (solution_id,)
+                )
+            return {**solution, **fields}
+
+    def get_playbook(self, playbook_id):
+        return self._query_one("playbooks", "SELECT data FROM playbooks WHERE id = ?", (playbook_id,))
+
+    def save_playbook(self, record):
+        self._write(
+            "playbooks",
+            "INSERT OR REPLACE INTO playbooks (id, data) VALUES (?, ?)",
+            (record["id"], json.dumps(record, ensure_ascii=False))
+        )
+
+
+class AsyncRepository(ABC):
+    """Async counterpart of Repository, for drivers such as asyncpg or motor.
+
+    Method names and arguments match Repository; every method is a coroutine.
+    """
+
+    @abstractmethod
+    async def seed(self, users: Iterable[dict], sos: Iterable[dict], solutions: Iterable[dict]):
+        """Insert demo records that are not stored yet."""
+
+    @abstractmethod
+    async def get_user(self, user_id: str) -> Optional[dict]:
+        """Get a user by ID."""
+
+    @abstractmethod
+    async def get_user_by_username(self, username: str) -> Optional[dict]:
+        """Get a user by username."""
+
+    @abstractmethod
+    async def list_users(
+        self,
+        role: Optional[str] = None,
+        cluster: Optional[str] = None,
+        district: Optional[str] = None
+    ) -> list:
+        """Get the users matching every given filter."""
+
+    @abstractmethod
+    async def list_sos(self, teacher_ids: Optional[Iterable[str]] = None) -> list:
+        """Get all SOS records, or those of the given teachers."""
+
+    @abstractmethod
+    async def teacher_sos(self, teacher_id: str, limit: int) -> list:
+        """Get a teacher's most recent SOS records, newest first."""
+
+    @abstractmethod
+    async def save_sos(self, record: dict):
+        """Insert or replace an SOS record."""
+
+    @abstractmethod
+    async def update_sos(self, sos_id: str, fields: dict) -> bool:
+        """Update fields of an SOS record; False if it does not exist."""
+
+    @abstractmethod
+    async def update_sos_outcome(self, sos_id: str, fields: dict, keys: Iterable[tuple]) -> Optional[dict]:
+        """Update an SOS record's success and its rollups atomically (see Repository)."""
+
+    @abstractmethod
+    async def get_sos(self, sos_id: str) -> Optional[dict]:
+        """Get an SOS record by ID."""
+
+    @abstractmethod
+    async def sos_changes(self, after_seq: int) -> tuple[list, int]:
+        """Get SOS records saved or updated after a change sequence number."""
+
+    @abstractmethod
+    async def sos_version(self) -> int:
+        """Latest SOS change sequence number."""
+
+    @abstractmethod
+    async def add_to_rollups(self, keys: Iterable[tuple], count: int, successful: int, failed: int):
+        """Add deltas to the rollups under each ROLLUP_KEY tuple."""
+
+    @abstractmethod
+    async def get_rollups(
+        self,
+        district: Optional[str] = None,
+        cluster: Optional[str] = None,
+        since: Optional[str] = None
+    ) -> list:
+        """Get rollup rows; all-time rows, or daily rows from the since day on."""
+
+    @abstractmethod
+    async def replace_rollups(self, rows: Iterable[dict]):
+        """Replace all rollups at once."""
+
+    @abstractmethod
+    async def has_rollups(self) -> bool:
+        """Check whether any rollups are stored."""
+
+    @abstractmethod
+    async def get_solution(self, solution_id: str) -> Optional[dict]:
+        """Get a shared solution by ID."""
+
+    @abstractmethod
+    async def list_solutions(self, topic: Optional[str] = None, grade: Optional[int] = None) -> list:
+        """Get shared solutions whose topic contains topic, in grade."""
+
+    @abstractmethod
+    async def save_solution(self, record: dict):
+        """Insert or replace a shared solution."""
+
+    @abstractmethod
+    async def update_solution(self, solution_id: str, fields: dict) -> bool:
+        """Update fields of a shared solution; False if it does not exist."""
+
+    @abstractmethod
+    async def increment_solution_usage(self, solution_id: str) -> Optional[int]:
+        """Atomically add one to a solution's usage_count; the new count, or None."""
+
+    @abstractmethod
+    async def record_solution_feedback(self, solution_id: str, success: bool) -> Optional[dict]:
+        """Atomically apply solution_feedback to a solution; the updated record, or None."""
+
+    @abstractmethod
+    async def get_playbook(self, playbook_id: str) -> Optional[dict]:
+        """Get a stored playbook by ID."""
+
+    @abstractmethod
+    async def save_playbook(self, record: dict):
+        """Insert or replace a playbook."""
+
+    async def flush(self):
+        """Write out any buffered writes."""
+
+    async def close(self):
+        """Flush and release the storage."""
+        await self.flush()
+
+
+class ThreadedAsyncRepository(AsyncRepository):
+    """Run a synchronous repository's calls in worker threads."""
+
+    def __init__(self, repository: Repository):
+        self.repository = repository
+
+    async def seed(self, users, sos, solutions):
+        # Materialize generators here, not in the worker thread
+        return await asyncio.to_thread(self.repository.seed, list(users), list(sos), list(solutions))
+
+    async def get_user(self, user_id):
+        return await asyncio.to_thread(self.repository.get_user, user_id)
+
+    async def get_user_by_username(self, username):
+        return await asyncio.to_thread(self.repository.get_user_by_username, username)
+
+    async def list_users(self, role=None, cluster=None, district=None):
+        return await asyncio.to_thread(self.repository.list_users, role, cluster, district)
+
+    async def list_sos(self, teacher_ids=None):
+        return await asyncio.to_thread(self.repository.list_sos, teacher_ids)
+
+    async def teacher_sos(self, teacher_id, limit):
+        return await asyncio.to_thread(self.repository.teacher_sos, teacher_id, limit)
+
+    async def save_sos(self, record):
+        return await asyncio.to_thread(self.repository.save_sos, record)
+
+    async def update_sos(self, sos_id, fields):
+        return await asyncio.to_thread(self.repository.update_sos, sos_id, fields)
+
+    async def update_sos_outcome(self, sos_id, fields, keys):
+        return await asyncio.to_thread(self.repository.update_sos_outcome, sos_id, fields, list(keys))
+
+    async def get_sos(self, sos_id):
+        return await asyncio.to_thread(self.repository.get_sos, sos_id)
+
+    async def sos_changes(self, after_seq):
+        return await asyncio.to_thread(self.repository.sos_changes, after_seq)
+
+    async def sos_version(self):
+        return await asyncio.to_thread(self.repository.sos_version)
+
+    async def add_to_rollups(self, keys, count, successful, failed):
+        return await asyncio.to_thread(self.repository.add_to_rollups, list(keys), count, successful, failed)
+
+    async def get_rollups(self, district=None, cluster=None, since=None):
+        return await asyncio.to_thread(self.repository.get_rollups, district, cluster, since)
+
+    async def replace_rollups(self, rows):
+        return await asyncio.to_thread(self.repository.replace_rollups, list(rows))
+
+    async def has_rollups(self):
+        return await asyncio.to_thread(self.repository.has_rollups)
+
+    async def get_solution(self, solution_id):
+        return await asyncio.to_thread(self.repository.get_solution, solution_id)
+
+    async def list_solutions(self, topic=None, grade=None):
+        return await asyncio.to_thread(self.repository.list_solutions, topic, grade)
+
+    async def save_solution(self, record):
+        return await asyncio.to_thread(self.repository.save_solution, record)
+
+    async def update_solution(self, solution_id, fields):
+        return await asyncio.to_thread(self.repository.update_solution, solution_id, fields)
+
+    async def increment_solution_usage(self, solution_id):
+        return await asyncio.to_thread(self.repository.increment_solution_usage, solution_id)
+
+    async def record_solution_feedback(self, solution_id, success):
+        return await asyncio.to_thread(self.repository.record_solution_feedback, solution_id, success)
+
+    async def get_playbook(self, playbook_id):
+        return await asyncio.to_thread(self.repository.get_playbook, playbook_id)
+
+    async def save_playbook(self, record):
+        return await asyncio.to_thread(self.repository.save_playbook, record)
+
+    async def flush(self):
+        return await asyncio.to_thread(self.repository.flush)
+
+    async def close(self):
+        return await asyncio.to_thread(self.repository.close)
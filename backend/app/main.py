@@ -2,10 +2,16 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 
 from .config import get_settings
 from .routes import auth, sos, dashboard, videos, collective
-from .services.cache_service import is_cache_available
+from .data.mock_db import connect_db, close_db
+from .services.cache_service import (
+    is_cache_available, connect_cache, close_cache, get_cache_stats
+)
+from .services.cache_warmer import start_cache_warmer
+from .services.context_classifier import load_context_classifier
 
 settings = get_settings()
 
@@ -15,11 +21,16 @@ async def lifespan(app: FastAPI):
     """Application lifespan events."""
     # Startup
     print(f"🚀 Starting {settings.app_name}")
-    print(f"📦 Redis available: {is_cache_available()}")
+    await connect_db()
+    await asyncio.to_thread(load_context_classifier)
+    print(f"📦 Redis available: {await connect_cache()}")
+    start_cache_warmer()
     print(f"🔑 Gemini configured: {bool(settings.gemini_api_key)}")
     print(f"🎬 YouTube configured: {bool(settings.youtube_api_key)}")
     yield
     # Shutdown
+    await close_cache()
+    await close_db()
     print(f"👋 Shutting down {settings.app_name}")
 
 
@@ -69,5 +80,6 @@ async def health_check():
     return {
         "status": "healthy",
         "redis": is_cache_available(),
-        "gemini": bool(settings.gemini_api_key)
+        "gemini": bool(settings.gemini_api_key),
+        "cache": get_cache_stats()
     }
@@ -21,6 +21,18 @@ class SOSRequest(BaseModel):
     teacher_id: Optional[str] = None
 
 
+class SOSBatchItem(BaseModel):
+    """One problem in a batch playbook request."""
+    id: Optional[str] = None  # client's own reference, echoed back
+    text: str
+    context: Optional[SOSContext] = None
+
+
+class SOSBatchRequest(BaseModel):
+    """Batch playbook request, e.g. for a CRP training pack."""
+    items: list[SOSBatchItem]
+
+
 class QuickFix(BaseModel):
     """Cached quick fix solution."""
     id: str
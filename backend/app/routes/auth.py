@@ -1,4 +1,5 @@
 """Authentication routes."""
+import asyncio
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError
@@ -8,7 +9,7 @@ from typing import Optional
 
 from ..config import get_settings
 from ..models.user import User, UserLogin, Token, UserRole
-from ..data.mock_db import get_user_by_username, get_user_by_id, USERS_DB
+from ..data.mock_db import get_user_by_username, get_all_users, get_async_repository
 
 router = APIRouter(prefix="/api/auth", tags=["Authentication"])
 security = HTTPBearer()
@@ -48,7 +49,7 @@ async def get_current_user(
         if not user_id:
             raise HTTPException(status_code=401, detail="Invalid token")
         
-        user_data = get_user_by_id(user_id)
+        user_data = await get_async_repository().get_user(user_id)
         if not user_data:
             raise HTTPException(status_code=401, detail="User not found")
         
@@ -72,7 +73,7 @@ async def get_current_user(
 async def login(credentials: UserLogin):
     """Login and get access token."""
     
-    user_data = get_user_by_username(credentials.username)
+    user_data = await asyncio.to_thread(get_user_by_username, credentials.username)
     
     if not user_data:
         raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -108,7 +109,7 @@ async def get_me(current_user: User = Depends(get_current_user)):
 async def get_demo_users():
     """Get list of demo users for easy login."""
     demo_users = []
-    for user_id, user in USERS_DB.items():
+    for user in await asyncio.to_thread(get_all_users):
         demo_users.append({
             "username": user["username"],
             "name": user["name"],
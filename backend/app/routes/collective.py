@@ -1,11 +1,15 @@
 """Collective intelligence routes for teacher-to-teacher sharing."""
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException
 from typing import Optional
 from pydantic import BaseModel
 
 from ..models.user import User
 from ..routes.auth import get_current_user
-from ..data.mock_db import get_solutions, save_solution, SOLUTIONS_DB
+from ..services.rag_service import get_rag_service
+from ..data.mock_db import (
+    get_solutions, save_solution, increment_solution_usage, record_solution_feedback
+)
 
 router = APIRouter(prefix="/api/collective", tags=["Collective Intelligence"])
 
@@ -39,7 +43,8 @@ async def share_solution(
         "anonymous": request.anonymous
     }
     
-    solution_id = save_solution(solution_data)
+    solution_id = await asyncio.to_thread(save_solution, solution_data)
+    get_rag_service().index_solution(solution_data)
     
     return {
         "shared": True,
@@ -59,19 +64,21 @@ async def get_shared_solutions(
 ):
     """Get shared solutions from other teachers."""
     
-    solutions = list(SOLUTIONS_DB.values())
-    
-    # Filter by topic
     if topic:
-        solutions = [s for s in solutions if topic.lower() in s.get("topic", "").lower()]
-    
-    # Filter by grade
-    if grade:
-        solutions = [s for s in solutions if s.get("grade") == grade]
-    
-    # Filter by subject
-    if subject:
-        solutions = [s for s in solutions if s.get("subject", "").lower() == subject.lower()]
+        # Keyword search, restricted to the grade and subject postings
+        solutions = await asyncio.to_thread(
+            get_rag_service().search_solutions, topic, grade=grade, subject=subject
+        )
+    else:
+        solutions = await asyncio.to_thread(get_solutions)
+        
+        # Filter by grade
+        if grade:
+            solutions = [s for s in solutions if s.get("grade") == grade]
+        
+        # Filter by subject
+        if subject:
+            solutions = [s for s in solutions if s.get("subject", "").lower() == subject.lower()]
     
     # Sort by trust score and usage
     solutions.sort(
@@ -105,16 +112,15 @@ async def use_solution(
 ):
     """Mark a solution as used (updates usage count)."""
     
-    if solution_id not in SOLUTIONS_DB:
+    # Increment usage count in the store, so concurrent uses are all counted
+    usage_count = await asyncio.to_thread(increment_solution_usage, solution_id)
+    if usage_count is None:
         raise HTTPException(status_code=404, detail="Solution not found")
     
-    # Increment usage count
-    SOLUTIONS_DB[solution_id]["usage_count"] = SOLUTIONS_DB[solution_id].get("usage_count", 0) + 1
-    
     return {
         "used": True,
         "solution_id": solution_id,
-        "new_usage_count": SOLUTIONS_DB[solution_id]["usage_count"]
+        "new_usage_count": usage_count
     }
 
 
@@ -126,26 +132,11 @@ async def provide_feedback(
 ):
     """Provide feedback on a solution (updates trust score)."""
     
-    if solution_id not in SOLUTIONS_DB:
+    # Trust and success rate are updated in the store, so concurrent feedback is all applied
+    solution = await asyncio.to_thread(record_solution_feedback, solution_id, success)
+    if not solution:
         raise HTTPException(status_code=404, detail="Solution not found")
     
-    solution = SOLUTIONS_DB[solution_id]
-    
-    # Update trust score based on feedback
-    current_trust = solution.get("trust_score", 0.5)
-    usage_count = solution.get("usage_count", 1)
-    
-    if success:
-        # Increase trust score
-        new_trust = min(1.0, current_trust + (0.1 / usage_count))
-        solution["success_rate"] = solution.get("success_rate", 0.7) * 0.9 + 0.1
-    else:
-        # Decrease trust score
-        new_trust = max(0.1, current_trust - (0.05 / usage_count))
-        solution["success_rate"] = solution.get("success_rate", 0.7) * 0.9
-    
-    solution["trust_score"] = round(new_trust, 2)
-    
     return {
         "updated": True,
         "solution_id": solution_id,
@@ -1,58 +1,73 @@
 """Dashboard routes for all three user roles."""
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Request
 from collections import Counter
-from datetime import datetime, timedelta
-import random
+from datetime import datetime
+from typing import Optional
 
 from ..models.user import User, UserRole
 from ..models.analytics import ReadinessSignal
 from ..routes.auth import get_current_user
+from ..config import get_settings
+from ..utils.http_cache import ResponseCache
+from ..services.analytics_service import (
+    cluster_analytics, topic_teacher_counts, sum_rollups, get_readiness,
+    window_start, recent_months, rollup_series, failure_rate, trend_direction,
+    upcoming_topics, recent_sos_count
+)
 from ..data.mock_db import (
-    get_sos_history, get_all_sos, get_solutions,
-    get_teachers_by_cluster, get_teachers_by_district, USERS_DB, SOS_HISTORY_DB
+    get_sos_history, get_rollups, get_data_version,
+    get_teachers_by_cluster, get_teachers_by_district
 )
 
+settings = get_settings()
+
 router = APIRouter(prefix="/api/dashboard", tags=["Dashboard"])
 
 
+def dashboard_version() -> str:
+    """Dashboards change with SOS writes, and hourly as time windows move."""
+    return f"{get_data_version()}:{datetime.now():%Y-%m-%d %H}"
+
+
+dashboard_cache = ResponseCache(dashboard_version, max_entries=settings.dashboard_cache_max_entries)
+
+# Sliding windows (days) compared for week-over-week and month-over-month trends
+CLUSTER_TREND_DAYS = 7
+GAP_TREND_DAYS = 30
+DIFFICULTY_TREND_MONTHS = 4
+
+
+def success_rate_change(rows: list, days: int) -> float:
+    """Change in success rate (percentage points) between the last two windows of `days` days."""
+    current_start = window_start(days)
+    current = sum_rollups(r for r in rows if r["period"] >= current_start).get(None)
+    previous = sum_rollups(r for r in rows if r["period"] < current_start).get(None)
+    if not current or not previous or not current["count"] or not previous["count"]:
+        return 0.0
+    return (current["successful"] / current["count"] - previous["successful"] / previous["count"]) * 100
+
+
 def calculate_readiness(teacher_id: str) -> ReadinessSignal:
     """Calculate classroom readiness signal for a teacher."""
-    
-    history = get_sos_history(teacher_id, limit=20)
-    
-    if not history:
-        return ReadinessSignal.READY
-    
-    # Count topics in last 7 days
-    recent = [h for h in history if h.get("created_at")]
-    topic_counts = Counter(h.get("context", {}).get("topic", "unknown") for h in recent)
-    
-    # Check for repeated topics (more than 2 SOS for same topic)
-    repeated_topics = [t for t, c in topic_counts.items() if c >= 2]
-    
-    # Calculate failure rate
-    with_feedback = [h for h in recent if h.get("success") is not None]
-    if with_feedback:
-        failure_rate = sum(1 for h in with_feedback if not h.get("success")) / len(with_feedback)
-    else:
-        failure_rate = 0
-    
-    # Determine readiness
-    if len(repeated_topics) > 2 or failure_rate > 0.5:
-        return ReadinessSignal.AT_RISK
-    elif len(repeated_topics) > 0 or failure_rate > 0.3:
-        return ReadinessSignal.NEEDS_SUPPORT
-    else:
-        return ReadinessSignal.READY
+    return get_readiness([teacher_id])[teacher_id]
 
 
 @router.get("/teacher")
-async def get_teacher_dashboard(current_user: User = Depends(get_current_user)):
+async def get_teacher_dashboard(request: Request, current_user: User = Depends(get_current_user)):
     """Get teacher dashboard data."""
     
     if current_user.role != UserRole.TEACHER:
         raise HTTPException(status_code=403, detail="Teacher access only")
     
+    return await dashboard_cache.respond(
+        request, f"teacher:{current_user.id}", lambda: build_teacher_dashboard(current_user)
+    )
+
+
+def build_teacher_dashboard(current_user: User) -> dict:
+    """Build the teacher dashboard payload."""
+    
     # Get SOS history
     history = get_sos_history(current_user.id, limit=10)
     
@@ -68,17 +83,8 @@ async def get_teacher_dashboard(current_user: User = Depends(get_current_user)):
     # Get saved solutions (mock - user's successful SOS)
     saved_solutions = [h for h in all_history if h.get("success") is True][:5]
     
-    # Upcoming topics (mock based on user's subjects)
-    upcoming_topics = []
-    if current_user.subjects:
-        topic_suggestions = {
-            "Math": ["Fractions", "Measurement", "Geometry"],
-            "Hindi": ["Reading Comprehension", "Grammar", "Writing"],
-            "English": ["Vocabulary", "Speaking", "Listening"],
-            "EVS": ["Plants", "Animals", "Environment"]
-        }
-        for subject in current_user.subjects:
-            upcoming_topics.extend(topic_suggestions.get(subject, [])[:2])
+    # Upcoming topics based on the user's subjects (the cache warmer uses them too)
+    upcoming = upcoming_topics(current_user.subjects or [])
     
     return {
         "user": {
@@ -90,13 +96,13 @@ async def get_teacher_dashboard(current_user: User = Depends(get_current_user)):
         "stats": {
             "total_sos": total_sos,
             "success_rate": round(success_rate, 2),
-            "this_week": len([h for h in all_history[:7]])
+            "this_week": recent_sos_count(current_user.id, days=7)
         },
         "readiness_signal": readiness.value,
         "readiness_message": get_readiness_message(readiness),
         "recent_sos": history[:5],
         "saved_solutions": saved_solutions,
-        "upcoming_topics": upcoming_topics[:5]
+        "upcoming_topics": upcoming[:5]
     }
 
 
@@ -110,42 +116,86 @@ def get_readiness_message(readiness: ReadinessSignal) -> str:
     return messages.get(readiness, "")
 
 
+@router.get("/readiness")
+async def get_cluster_readiness(
+    cluster: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Get readiness signals for every teacher in a cluster in one call.
+    
+    CRPs get their own cluster; DIET users may pass any cluster in their district.
+    """
+    
+    if current_user.role == UserRole.CRP:
+        cluster = current_user.cluster
+    elif current_user.role != UserRole.DIET:
+        raise HTTPException(status_code=403, detail="CRP or DIET access only")
+    
+    if not cluster:
+        raise HTTPException(status_code=400, detail="Cluster is required")
+    
+    teachers = [
+        t for t in await asyncio.to_thread(get_teachers_by_cluster, cluster)
+        if t.get("district") == current_user.district
+    ]
+    readiness = await asyncio.to_thread(get_readiness, [t["id"] for t in teachers])
+    
+    return {
+        "cluster": cluster,
+        "teachers": [
+            {
+                "teacher_id": t["id"],
+                "teacher_name": t["name"],
+                "readiness": readiness[t["id"]].value,
+                "readiness_message": get_readiness_message(readiness[t["id"]])
+            }
+            for t in teachers
+        ],
+        "counts": Counter(signal.value for signal in readiness.values())
+    }
+
+
 @router.get("/crp")
-async def get_crp_dashboard(current_user: User = Depends(get_current_user)):
+async def get_crp_dashboard(request: Request, current_user: User = Depends(get_current_user)):
     """Get CRP (Cluster Resource Person) dashboard data."""
     
     if current_user.role != UserRole.CRP:
         raise HTTPException(status_code=403, detail="CRP access only")
     
+    return await dashboard_cache.respond(
+        request, f"crp:{current_user.district}:{current_user.cluster}", lambda: build_crp_dashboard(current_user)
+    )
+
+
+def build_crp_dashboard(current_user: User) -> dict:
+    """Build the CRP dashboard payload."""
+    
     # Get teachers in cluster
     teachers = get_teachers_by_cluster(current_user.cluster or "")
     teacher_ids = [t["id"] for t in teachers]
     
-    # Get all SOS for cluster teachers
-    all_sos = [s for s in SOS_HISTORY_DB.values() if s.get("teacher_id") in teacher_ids]
+    # Per-teacher and overall aggregates of the cluster's SOS
+    analytics = cluster_analytics(teacher_ids)
+    total_sos = analytics["total"]
     
     # Calculate category distribution
-    categories = Counter(s.get("context", {}).get("subject", "General") for s in all_sos)
     category_stats = [
-        {"category": cat, "count": count, "percentage": round(count / len(all_sos) * 100, 1) if all_sos else 0}
-        for cat, count in categories.most_common(5)
+        {"category": cat, "count": count, "percentage": round(count / total_sos * 100, 1) if total_sos else 0}
+        for cat, count in analytics["subjects"].most_common(5)
     ]
     
     # Topic distribution
-    topics = Counter(s.get("context", {}).get("topic", "Other") for s in all_sos)
     top_issues = [
         {"topic": topic, "count": count, "subject": "Mixed"}
-        for topic, count in topics.most_common(10)
+        for topic, count in analytics["topics"].most_common(10)
     ]
     
     # Teacher engagement
     teacher_engagement = []
     at_risk_count = 0
     for teacher in teachers:
-        teacher_sos = [s for s in all_sos if s.get("teacher_id") == teacher["id"]]
-        successful = sum(1 for s in teacher_sos if s.get("success") is True)
-        success_rate = successful / len(teacher_sos) if teacher_sos else 0
-        readiness = calculate_readiness(teacher["id"])
+        stats = analytics["teachers"][teacher["id"]]
+        readiness = stats["readiness"]
         
         if readiness == ReadinessSignal.AT_RISK:
             at_risk_count += 1
@@ -154,22 +204,28 @@ async def get_crp_dashboard(current_user: User = Depends(get_current_user)):
             "teacher_id": teacher["id"],
             "teacher_name": teacher["name"],
             "school": teacher.get("school", "Unknown"),
-            "sos_count": len(teacher_sos),
-            "success_rate": round(success_rate, 2),
+            "sos_count": stats["sos_count"],
+            "success_rate": round(stats["success_rate"], 2),
             "readiness": readiness.value,
-            "most_common_topic": topics.most_common(1)[0][0] if topics else "N/A"
+            "most_common_topic": stats["top_topic"] or "N/A"
         })
     
     # Calculate overall stats
-    total_successful = sum(1 for s in all_sos if s.get("success") is True)
-    overall_success_rate = total_successful / len(all_sos) if all_sos else 0
+    overall_success_rate = analytics["successful"] / total_sos if total_sos else 0
+    
+    # Daily rollups for this week and last week
+    trend_rows = get_rollups(
+        district=current_user.district,
+        cluster=current_user.cluster or "",
+        since=window_start(2 * CLUSTER_TREND_DAYS)
+    )
     
     return {
         "cluster": current_user.cluster,
         "district": current_user.district,
         "stats": {
             "total_teachers": len(teachers),
-            "total_sos": len(all_sos),
+            "total_sos": total_sos,
             "overall_success_rate": round(overall_success_rate, 2),
             "at_risk_teachers": at_risk_count
         },
@@ -178,49 +234,64 @@ async def get_crp_dashboard(current_user: User = Depends(get_current_user)):
         "teacher_engagement": teacher_engagement,
         "trend": {
             "direction": "up" if overall_success_rate > 0.7 else "down",
-            "change": round(random.uniform(-5, 10), 1)
+            "change": round(success_rate_change(trend_rows, CLUSTER_TREND_DAYS), 1)
         }
     }
 
 
 @router.get("/diet")
-async def get_diet_dashboard(current_user: User = Depends(get_current_user)):
+async def get_diet_dashboard(request: Request, current_user: User = Depends(get_current_user)):
     """Get DIET (District Institute of Education and Training) dashboard data."""
     
     if current_user.role != UserRole.DIET:
         raise HTTPException(status_code=403, detail="DIET access only")
     
+    return await dashboard_cache.respond(
+        request, f"diet:{current_user.district}", lambda: build_diet_dashboard(current_user)
+    )
+
+
+def build_diet_dashboard(current_user: User) -> dict:
+    """Build the DIET dashboard payload."""
+    
     # Get all teachers in district
     teachers = get_teachers_by_district(current_user.district)
-    teacher_ids = [t["id"] for t in teachers]
     
     # Get clusters
     clusters = set(t.get("cluster", "Unknown") for t in teachers)
     
-    # Get all SOS
-    all_sos = list(SOS_HISTORY_DB.values())
+    # Precomputed per-cluster/topic aggregates for the district
+    rollups = get_rollups(district=current_user.district)
+    by_topic = sum_rollups(rollups, "topic")
+    topic_totals = Counter({topic: totals["count"] for topic, totals in by_topic.items()})
+    topic_teachers = topic_teacher_counts(current_user.district)
+    
+    # Daily rollups covering the trend windows
+    months = recent_months(DIFFICULTY_TREND_MONTHS)
+    trend_rows = get_rollups(
+        district=current_user.district,
+        since=min(f"{months[0]}-01", window_start(2 * GAP_TREND_DAYS))
+    )
+    current_start = window_start(GAP_TREND_DAYS)
+    previous_start = window_start(2 * GAP_TREND_DAYS)
+    current_gaps = sum_rollups(r for r in trend_rows if r["period"] >= current_start)
+    previous_gaps = sum_rollups(r for r in trend_rows if previous_start <= r["period"] < current_start)
     
     # Calculate learning gaps
-    topic_failures = Counter()
-    topic_totals = Counter()
-    for sos in all_sos:
-        topic = sos.get("context", {}).get("topic", "Other")
-        topic_totals[topic] += 1
-        if sos.get("success") is False:
-            topic_failures[topic] += 1
-    
     learning_gaps = []
     for topic, total in topic_totals.most_common(10):
-        failures = topic_failures.get(topic, 0)
+        failures = by_topic[topic]["failed"]
         gap_score = failures / total if total > 0 else 0
         learning_gaps.append({
             "topic": topic,
-            "subject": "Mixed",  # Would need to track this
+            "subject": by_topic[topic]["subjects"].most_common(1)[0][0],
             "grade": 3,  # Mock
             "gap_score": round(gap_score, 2),
             "affected_schools": min(len(clusters), int(total / 2) + 1),
-            "affected_teachers": min(len(teachers), total),
-            "trend": random.choice(["increasing", "decreasing", "stable"])
+            "affected_teachers": topic_teachers.get(topic, 0),
+            "trend": trend_direction(
+                failure_rate(previous_gaps.get(topic)), failure_rate(current_gaps.get(topic))
+            )
         })
     
     # Sort by gap score
@@ -238,23 +309,27 @@ async def get_diet_dashboard(current_user: User = Depends(get_current_user)):
             "recommended_training": f"FLN Training: {gap['topic']}"
         })
     
-    # Difficulty trends (mock time series)
+    # Difficulty trends: monthly failure rate per topic
+    monthly = rollup_series(trend_rows, "topic", "month")
     difficulty_trends = []
     for topic in list(topic_totals.keys())[:5]:
         difficulty_trends.append({
             "concept": topic,
             "data": [
-                {"month": "Oct", "difficulty": round(random.uniform(0.2, 0.5), 2)},
-                {"month": "Nov", "difficulty": round(random.uniform(0.2, 0.5), 2)},
-                {"month": "Dec", "difficulty": round(random.uniform(0.2, 0.5), 2)},
-                {"month": "Jan", "difficulty": round(random.uniform(0.2, 0.5), 2)}
+                {
+                    "month": datetime.strptime(month, "%Y-%m").strftime("%b"),
+                    "difficulty": round(failure_rate(monthly.get(topic, {}).get(month)), 2)
+                }
+                for month in months
             ]
         })
     
     # Calculate district health score
-    total_with_feedback = sum(1 for s in all_sos if s.get("success") is not None)
-    total_success = sum(1 for s in all_sos if s.get("success") is True)
+    district_totals = sum_rollups(rollups).get(None, {"successful": 0, "failed": 0})
+    total_with_feedback = district_totals["successful"] + district_totals["failed"]
+    total_success = district_totals["successful"]
     health_score = total_success / total_with_feedback if total_with_feedback > 0 else 0.7
+    by_cluster = sum_rollups(rollups, "cluster")
     
     return {
         "district": current_user.district,
@@ -271,7 +346,9 @@ async def get_diet_dashboard(current_user: User = Depends(get_current_user)):
             {
                 "cluster": cluster,
                 "teachers": len([t for t in teachers if t.get("cluster") == cluster]),
-                "health_score": round(random.uniform(0.6, 0.9), 2)
+                "health_score": round(
+                    1 - failure_rate(by_cluster[cluster]) if cluster in by_cluster else 0.7, 2
+                )
             }
             for cluster in list(clusters)[:5]
         ]
@@ -1,42 +1,49 @@
 """SOS routes for classroom emergency support."""
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from typing import Optional
+from collections import Counter
+import asyncio
 import uuid
 
+from ..config import get_settings
 from ..models.user import User
-from ..models.sos import SOSRequest, SOSResponse, SOSContext, QuickFix
+from ..models.sos import SOSRequest, SOSResponse, SOSContext, QuickFix, SOSBatchItem, SOSBatchRequest
 from ..routes.auth import get_current_user
 from ..services.cache_service import (
-    get_cache_key, get_problem_cache_key,
-    get_cached_response, set_cached_response, increment_usage
+    get_cache_key, get_cached_response, coalesce_generation, adjust_cache_lifetime
+)
+from ..services.cache_warmer import revalidate_playbook
+from ..services.mistral_service import (
+    generate_playbook, stream_playbook, extract_context_from_text,
+    extract_context_fallback, get_fallback_playbook
 )
-from ..services.mistral_service import generate_playbook, extract_context_from_text
 from ..services.rag_service import get_rag_service
-from ..services.youtube_service import search_videos
+from ..services.semantic_cache import get_semantic_cache
+from ..services.sos_pipeline import (
+    StageRunner, start_resource_stages, start_similar_stage,
+    find_quick_fix, build_quick_fix_playbook, summarize_similar, mark_partial, cache_playbook,
+    PLAYBOOK_SECTIONS, QUICK_FIX_TTL, GENERATED_TTL
+)
+from ..utils.streaming import sse_event, iter_with_deadline, PartialJSONParser
 from ..data.mock_db import save_sos, update_sos_success, get_sos_history
 
 router = APIRouter(prefix="/api/sos", tags=["SOS"])
+settings = get_settings()
 
+# Batch item status by where its playbook came from
+BATCH_STATUSES = {
+    "cache": "cached",
+    "coalesced": "cached",
+    "quick_fix": "quick_fix",
+    "generated": "generated"
+}
 
-@router.post("/submit", response_model=SOSResponse)
-async def submit_sos(
-    request: SOSRequest,
-    current_user: User = Depends(get_current_user)
-):
-    """Submit an SOS request and get a teaching playbook."""
-    
-    # Extract text from request (voice would be transcribed on frontend)
-    query_text = request.text or ""
-    
-    if not query_text:
-        raise HTTPException(status_code=400, detail="SOS text or audio required")
-    
-    # Extract context from text first
-    extracted = await extract_context_from_text(query_text)
-    
-    # Merge with request context if provided, prioritizing request values
+
+def merge_context(request: SOSRequest, current_user: User, extracted: dict, query_text: str) -> SOSContext:
+    """Merge extracted context with request context, prioritizing request values."""
     req_ctx = request.context
-    context = SOSContext(
+    return SOSContext(
         grade=req_ctx.grade if req_ctx and req_ctx.grade else (
             extracted.get("grade") or (current_user.grade_teaching[0] if current_user.grade_teaching else 3)
         ),
@@ -44,8 +51,88 @@ async def submit_sos(
         topic=req_ctx.topic if req_ctx and req_ctx.topic else extracted.get("topic", query_text[:50]),
         language=req_ctx.language if req_ctx and req_ctx.language else current_user.language
     )
+
+
+async def run_context_stage(runner: StageRunner, query_text: str) -> dict:
+    """Extract context with the LLM, using keywords if it misses its deadline."""
+    runner.start(
+        "context",
+        extract_context_from_text(query_text),
+        timeout=settings.context_stage_timeout,
+        default=extract_context_fallback(query_text)
+    )
+    return await runner.result("context")
+
+
+async def find_cached_playbook(
+    cache_key: str,
+    query_text: str,
+    context: SOSContext,
+    current_user: User,
+    track_usage: bool = True
+) -> tuple[str, Optional[dict]]:
+    """Look up a playbook by exact context key, then by SOS text similarity.
+
+    A stale playbook under the exact key is returned and regenerated for
+    its context in the background. With track_usage, the lookup counts on
+    the usage leaderboards.
+    """
+    cached = await get_cached_response(
+        cache_key, track_usage=track_usage, district=current_user.district, grade=context.grade,
+        revalidate=lambda: revalidate_playbook(context, query_text)
+    )
+    if cached:
+        return cache_key, cached
     
-    print(f"🌐 SOS request with language: {context.language}")
+    similar_key = await get_semantic_cache().lookup(
+        query_text, context.grade, context.subject, context.language
+    )
+    if similar_key and similar_key != cache_key:
+        cached = await get_cached_response(
+            similar_key, track_usage=track_usage, district=current_user.district, grade=context.grade
+        )
+        if cached:
+            return similar_key, cached
+    
+    return cache_key, None
+
+
+async def record_sos(
+    current_user: User,
+    query_text: str,
+    context: SOSContext,
+    response_id: str,
+    from_cache: bool,
+    cache_key: str
+) -> str:
+    """Save the SOS record for the current teacher.
+
+    The cache key lets feedback on the SOS reach the cached playbook.
+    """
+    return await asyncio.to_thread(save_sos, {
+        "teacher_id": current_user.id,
+        "request_text": query_text,
+        "context": context.model_dump(),
+        "response_id": response_id,
+        "from_cache": from_cache,
+        "cache_key": cache_key
+    })
+
+
+async def resolve_playbook(
+    runner: StageRunner,
+    query_text: str,
+    context: SOSContext,
+    current_user: User,
+    track_usage: bool = True
+) -> dict:
+    """Find or build the playbook for an SOS: cache, then quick fix, then the LLM.
+    
+    Returns {"cache_key", "playbook", "source", "similar"}, where source is
+    "cache", "coalesced" (another request generated it), "quick_fix" or
+    "generated". Without track_usage, nothing counts on the usage or
+    quick-fix leaderboards.
+    """
     
     # Generate cache key
     cache_key = get_cache_key({
@@ -56,170 +143,357 @@ async def submit_sos(
     })
     
     # Check cache first
-    cached = await get_cached_response(cache_key)
+    cache_key, cached = await find_cached_playbook(cache_key, query_text, context, current_user, track_usage)
     if cached:
-        await increment_usage(cache_key)
-        
-        # Save SOS record
-        sos_id = save_sos({
-            "teacher_id": current_user.id,
-            "request_text": query_text,
-            "context": context.model_dump(),
-            "response_id": cached.get("id", "cached"),
-            "from_cache": True
-        })
-        
-        return SOSResponse(
-            sos_id=sos_id,
-            extracted_context=context,
-            playbook=cached,
-            from_cache=True,
-            cache_key=cache_key
-        )
+        return {"cache_key": cache_key, "playbook": cached, "source": "cache", "similar": None}
     
-    # Check RAG for similar problems
-    rag = get_rag_service()
-    similar = rag.search_similar_problems(
-        query_text,
-        grade=context.grade,
-        subject=context.subject,
-        limit=3
-    )
-    
-    # Cache-first: Check quick fixes (top 50 common topics) before using LLM
-    if similar and similar[0].get("relevance_score", 0) > 0.8:
-        best_match = similar[0]
-        print(f"📦 Using quick fix for: {best_match.get('topic', 'unknown')} in lang={context.language}")
+    # Identical SOS in flight (here or on another worker) share one generation
+    async with coalesce_generation(cache_key) as flight:
+        if not flight.leader:
+            return {"cache_key": cache_key, "playbook": flight.result, "source": "coalesced", "similar": None}
         
-        # Get language-appropriate content
-        lang = context.language or "en"
-        if lang == "hi":
-            what_to_say = best_match.get("what_to_say_hi", best_match.get("what_to_say", []))
-            problem_text = best_match.get("problem_hi", best_match.get("problem", query_text))
-            activity_name = best_match.get("activity_hi", best_match.get("activity", "Interactive Activity"))
-        elif lang == "kn":
-            what_to_say = best_match.get("what_to_say_kn", best_match.get("what_to_say", []))
-            problem_text = best_match.get("problem_kn", best_match.get("problem", query_text))
-            activity_name = best_match.get("activity_kn", best_match.get("activity", "Interactive Activity"))
-        else:
-            what_to_say = best_match.get("what_to_say_en", best_match.get("what_to_say", []))
-            problem_text = best_match.get("problem_en", best_match.get("problem", query_text))
-            activity_name = best_match.get("activity_en", best_match.get("activity", "Interactive Activity"))
+        # Cache miss: NCERT refs and videos only depend on the context, so start
+        # them now and let them overlap the similar-problem lookup and the LLM call
+        rag = get_rag_service()
+        start_resource_stages(runner, rag, query_text, context)
+        start_similar_stage(runner, rag, query_text, context)
+        similar = await runner.result("similar")
         
-        playbook = {
-            "id": best_match["id"],
-            "problem": problem_text,
-            "what_to_say": what_to_say,
-            "activity": {
-                "name": activity_name,
-                "steps": best_match.get(f"steps_{lang}", ["Follow the quick fix guidance"]),
-                "materials": best_match.get("materials", ["Available classroom materials"]),
-                "duration_minutes": 10
-            },
-            "class_management": best_match.get(f"class_management_{lang}", ["Use attention signals", "Praise participation"]),
-            "quick_check": {
-                "questions": best_match.get(f"questions_{lang}", ["Did students understand?"]),
-                "expected_responses": ["Students demonstrate understanding"],
-                "success_indicators": ["Active participation"]
-            },
-            "trust_score": best_match.get("success_rate", 0.8),
-            "from_quick_fix": True
-        }
+        # Cache-first: Check quick fixes (top 50 common topics) before using LLM
+        best_match = find_quick_fix(similar)
+        if best_match:
+            print(f"📦 Using quick fix for: {best_match.get('topic', 'unknown')} in lang={context.language}")
+            
+            playbook = build_quick_fix_playbook(best_match, query_text, context.language)
+            stages = await runner.gather()
+            playbook["ncert_refs"] = stages["ncert_refs"]
+            playbook["videos"] = stages["videos"]
+            mark_partial(playbook, runner)
+            
+            # Cache the response (briefly if a stage was late, so it gets refilled);
+            # complete quick-fix playbooks count towards pinning in process memory
+            ttl = settings.partial_cache_ttl if runner.partial else QUICK_FIX_TTL
+            pin = track_usage and not runner.partial
+            await cache_playbook(cache_key, playbook, ttl, query_text, context, pin=pin)
+            
+            flight.publish(playbook)
+            return {"cache_key": cache_key, "playbook": playbook, "source": "quick_fix", "similar": similar}
         
-        # Also get NCERT references and videos for quick fixes
-        ncert_refs = rag.get_ncert_references(
-            topic=context.topic or query_text,
-            grade=context.grade,
-            subject=context.subject
+        # Generate new playbook with the LLM while refs and videos finish
+        runner.start(
+            "playbook",
+            generate_playbook(
+                problem=query_text,
+                grade=context.grade or 3,
+                subject=context.subject or "General",
+                topic=context.topic or "General",
+                language=context.language,
+                constraints=context.rural_constraints,
+                raise_errors=True
+            ),
+            timeout=settings.playbook_stage_timeout,
+            default=get_fallback_playbook(
+                query_text,
+                context.grade or 3,
+                context.subject or "General",
+                context.topic or "General",
+                context.language
+            )
         )
-        videos = await search_videos(
-            query=context.topic or query_text,
-            grade=context.grade,
-            language=context.language,
-            limit=3
-        )
-        playbook["ncert_refs"] = ncert_refs
-        playbook["videos"] = videos
+        stages = await runner.gather()
         
-        # Cache the response
-        await set_cached_response(cache_key, playbook)
+        # Build complete playbook
+        playbook = {
+            "id": str(uuid.uuid4())[:8],
+            "problem": query_text,
+            **stages["playbook"],
+            "ncert_refs": stages["ncert_refs"],
+            "videos": stages["videos"],
+            "trust_score": 0.7,  # New AI-generated, lower initial trust
+            "from_quick_fix": False
+        }
+        mark_partial(playbook, runner)
+        print(f"⏱️ SOS stage timings (ms): {runner.timings}")
         
-        # Save SOS record
-        sos_id = save_sos({
-            "teacher_id": current_user.id,
-            "request_text": query_text,
-            "context": context.model_dump(),
-            "response_id": playbook["id"],
-            "from_cache": True
-        })
+        # Cache the response; never keep a fallback playbook from a late LLM around
+        if "playbook" not in runner.late + runner.failed:
+            ttl = settings.partial_cache_ttl if runner.partial else GENERATED_TTL
+            await cache_playbook(cache_key, playbook, ttl, query_text, context)
         
-        return SOSResponse(
-            sos_id=sos_id,
-            extracted_context=context,
-            playbook=playbook,
-            from_cache=True,
-            cache_key=cache_key,
-            similar_solutions=[{"id": s["id"], "problem": s["problem"], "success_rate": s.get("success_rate", 0.8)} for s in similar[:3]]
-        )
+        flight.publish(playbook)
+        return {"cache_key": cache_key, "playbook": playbook, "source": "generated", "similar": similar}
+
+
+@router.post("/submit", response_model=SOSResponse)
+async def submit_sos(
+    request: SOSRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Submit an SOS request and get a teaching playbook."""
     
-    # Generate new playbook with Gemini
-    playbook_data = await generate_playbook(
-        problem=query_text,
-        grade=context.grade or 3,
-        subject=context.subject or "General",
-        topic=context.topic or "General",
-        language=context.language,
-        constraints=context.rural_constraints
-    )
+    # Extract text from request (voice would be transcribed on frontend)
+    query_text = request.text or ""
     
-    # Get NCERT references
-    ncert_refs = rag.get_ncert_references(
-        topic=context.topic or query_text,
-        grade=context.grade,
-        subject=context.subject
-    )
+    if not query_text:
+        raise HTTPException(status_code=400, detail="SOS text or audio required")
     
-    # Get relevant videos
-    videos = await search_videos(
-        query=context.topic or query_text,
-        grade=context.grade,
-        language=context.language,
-        limit=3
-    )
+    runner = StageRunner()
     
-    # Build complete playbook
-    playbook_id = str(uuid.uuid4())[:8]
-    playbook = {
-        "id": playbook_id,
-        "problem": query_text,
-        **playbook_data,
-        "ncert_refs": ncert_refs,
-        "videos": videos,
-        "trust_score": 0.7,  # New AI-generated, lower initial trust
-        "from_quick_fix": False
-    }
+    # Extract context from text first; fall back to keywords if the LLM is late
+    extracted = await run_context_stage(runner, query_text)
     
-    # Cache the response
-    await set_cached_response(cache_key, playbook, ttl=7200)  # 2 hours
+    # Merge with request context if provided, prioritizing request values
+    context = merge_context(request, current_user, extracted, query_text)
+    
+    print(f"🌐 SOS request with language: {context.language}")
+    
+    result = await resolve_playbook(runner, query_text, context, current_user)
+    playbook = result["playbook"]
+    from_cache = result["source"] != "generated"
     
     # Save SOS record
-    sos_id = save_sos({
-        "teacher_id": current_user.id,
-        "request_text": query_text,
-        "context": context.model_dump(),
-        "response_id": playbook_id,
-        "from_cache": False
-    })
+    sos_id = await record_sos(
+        current_user, query_text, context, playbook.get("id", "cached"),
+        from_cache=from_cache, cache_key=result["cache_key"]
+    )
     
     return SOSResponse(
         sos_id=sos_id,
         extracted_context=context,
         playbook=playbook,
-        from_cache=False,
-        similar_solutions=[{"id": s["id"], "problem": s["problem"], "success_rate": s.get("success_rate", 0.8)} for s in similar[:3]] if similar else None
+        from_cache=from_cache,
+        cache_key=result["cache_key"] if from_cache else None,
+        similar_solutions=summarize_similar(result["similar"]) if result["similar"] else None
+    )
+
+
+@router.post("/batch")
+async def batch_playbooks(
+    request: SOSBatchRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Get playbooks for many problems at once, streamed as Server-Sent Events.
+    
+    For training packs: items already cached are answered from the cache,
+    the rest are generated concurrently (at most batch_max_concurrency at
+    a time). An `item` event with the item's index, status and playbook is
+    sent as each one completes, then `done`. Batch items are not recorded
+    as classroom SOS and do not count on the usage leaderboards.
+    """
+    
+    if not request.items:
+        raise HTTPException(status_code=400, detail="At least one item required")
+    if len(request.items) > settings.batch_max_items:
+        raise HTTPException(status_code=400, detail=f"At most {settings.batch_max_items} items per batch")
+    if any(not item.text for item in request.items):
+        raise HTTPException(status_code=400, detail="Every item needs problem text")
+    
+    return StreamingResponse(
+        batch_event_stream(request.items, current_user),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def resolve_batch_item(item: SOSBatchItem, current_user: User) -> dict:
+    """Run one batch item through context extraction and resolve_playbook."""
+    runner = StageRunner()
+    try:
+        # Items that name their subject and topic need no extraction
+        if item.context and item.context.subject and item.context.topic:
+            extracted = {}
+        else:
+            extracted = await run_context_stage(runner, item.text)
+        context = merge_context(SOSRequest(text=item.text, context=item.context), current_user, extracted, item.text)
+        result = await resolve_playbook(runner, item.text, context, current_user, track_usage=False)
+    except Exception as e:
+        print(f"Batch item error: {e}")
+        return {"status": "error", "error": str(e)}
+    
+    return {
+        "status": BATCH_STATUSES[result["source"]],
+        "partial": bool(result["playbook"].get("partial")),
+        "context": context.model_dump(),
+        "cache_key": result["cache_key"],
+        "playbook": result["playbook"]
+    }
+
+
+async def batch_event_stream(items: list, current_user: User):
+    """Resolve batch items concurrently, yielding an SSE event as each completes."""
+    
+    semaphore = asyncio.Semaphore(settings.batch_max_concurrency)
+    
+    async def run(index: int, item: SOSBatchItem) -> tuple[int, dict]:
+        async with semaphore:
+            return index, await resolve_batch_item(item, current_user)
+    
+    tasks = [asyncio.ensure_future(run(index, item)) for index, item in enumerate(items)]
+    statuses = Counter()
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            index, result = await next_done
+            statuses[result["status"]] += 1
+            yield sse_event("item", {"index": index, "id": items[index].id, **result})
+        yield sse_event("done", {"total": len(items), "statuses": statuses})
+    finally:
+        # Stop outstanding work if the client goes away
+        for task in tasks:
+            task.cancel()
+
+
+@router.post("/stream")
+async def stream_sos(
+    request: SOSRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Submit an SOS request and stream the playbook as Server-Sent Events.
+    
+    Events arrive in the order a teacher needs them: `context`, then each
+    playbook section (`what_to_say`, `activity`, ...) as the LLM finishes it,
+    then `ncert_refs` and `videos`, and finally `done` with the full playbook.
+    """
+    
+    query_text = request.text or ""
+    
+    if not query_text:
+        raise HTTPException(status_code=400, detail="SOS text or audio required")
+    
+    return StreamingResponse(
+        sos_event_stream(request, query_text, current_user),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 
+async def replay_playbook(playbook: dict, current_user: User, query_text: str, context: SOSContext, cache_key: str):
+    """SSE events for a playbook that is already complete, e.g. from the cache."""
+    for section in PLAYBOOK_SECTIONS + ("ncert_refs", "videos"):
+        if section in playbook:
+            yield sse_event(section, playbook[section])
+    sos_id = await record_sos(current_user, query_text, context, playbook.get("id", "cached"), from_cache=True, cache_key=cache_key)
+    yield sse_event("done", {
+        "sos_id": sos_id,
+        "from_cache": True,
+        "cache_key": cache_key,
+        "playbook": playbook
+    })
+
+
+async def sos_event_stream(request: SOSRequest, query_text: str, current_user: User):
+    """Run the SOS pipeline, yielding SSE events as each section is ready."""
+    
+    runner = StageRunner()
+    extracted = await run_context_stage(runner, query_text)
+    context = merge_context(request, current_user, extracted, query_text)
+    yield sse_event("context", context.model_dump())
+    
+    cache_key = get_cache_key({
+        "grade": context.grade,
+        "subject": context.subject,
+        "topic": context.topic,
+        "language": context.language
+    })
+    
+    cache_key, cached = await find_cached_playbook(cache_key, query_text, context, current_user)
+    if cached:
+        async for event in replay_playbook(cached, current_user, query_text, context, cache_key):
+            yield event
+        return
+    
+    async with coalesce_generation(cache_key) as flight:
+        if not flight.leader:
+            async for event in replay_playbook(flight.result, current_user, query_text, context, cache_key):
+                yield event
+            return
+        
+        rag = get_rag_service()
+        start_resource_stages(runner, rag, query_text, context)
+        start_similar_stage(runner, rag, query_text, context)
+        similar = await runner.result("similar")
+        
+        best_match = find_quick_fix(similar)
+        if best_match:
+            playbook = build_quick_fix_playbook(best_match, query_text, context.language)
+            for section in PLAYBOOK_SECTIONS:
+                yield sse_event(section, playbook[section])
+            ttl = QUICK_FIX_TTL
+        else:
+            # Stream the LLM output and emit each section as soon as it and the
+            # sections before it have parsed; keys outside PLAYBOOK_SECTIONS
+            # are never sent as sections
+            parser = PartialJSONParser()
+            sent = 0
+            tokens = stream_playbook(
+                problem=query_text,
+                grade=context.grade or 3,
+                subject=context.subject or "General",
+                topic=context.topic or "General",
+                language=context.language,
+                constraints=context.rural_constraints
+            )
+            try:
+                async for chunk in iter_with_deadline(tokens, settings.playbook_stage_timeout):
+                    parser.feed(chunk)
+                    while sent < len(PLAYBOOK_SECTIONS) and PLAYBOOK_SECTIONS[sent] in parser.fields:
+                        yield sse_event(PLAYBOOK_SECTIONS[sent], parser.fields[PLAYBOOK_SECTIONS[sent]])
+                        sent += 1
+            except asyncio.TimeoutError:
+                print(f"⏱️ Stage 'playbook' missed its {settings.playbook_stage_timeout}s deadline")
+                runner.late.append("playbook")
+            except Exception as e:
+                # Even if every section arrived, a broken stream is not cached
+                print(f"Stage 'playbook' error: {e}")
+                runner.failed.append("playbook")
+            
+            # Fill any section the LLM did not deliver from the fallback playbook
+            fallback = get_fallback_playbook(
+                query_text,
+                context.grade or 3,
+                context.subject or "General",
+                context.topic or "General",
+                context.language
+            )
+            missing = [section for section in PLAYBOOK_SECTIONS if section not in parser.fields]
+            for section in PLAYBOOK_SECTIONS[sent:]:
+                yield sse_event(section, parser.fields.get(section, fallback[section]))
+            if missing and "playbook" not in runner.late + runner.failed:
+                runner.failed.append("playbook")
+            
+            playbook = {
+                "id": str(uuid.uuid4())[:8],
+                "problem": query_text,
+                **fallback,
+                **parser.fields,
+                "trust_score": 0.7,  # New AI-generated, lower initial trust
+                "from_quick_fix": False
+            }
+            ttl = GENERATED_TTL
+        
+        playbook["ncert_refs"] = await runner.result("ncert_refs")
+        yield sse_event("ncert_refs", playbook["ncert_refs"])
+        playbook["videos"] = await runner.result("videos")
+        yield sse_event("videos", playbook["videos"])
+        mark_partial(playbook, runner)
+        
+        # Same caching rules as /submit: never keep a fallback playbook around
+        if "playbook" not in runner.late + runner.failed:
+            ttl = settings.partial_cache_ttl if runner.partial else ttl
+            pin = playbook["from_quick_fix"] and not runner.partial
+            await cache_playbook(cache_key, playbook, ttl, query_text, context, pin=pin)
+        
+        flight.publish(playbook)
+        
+        sos_id = await record_sos(current_user, query_text, context, playbook["id"], from_cache=playbook["from_quick_fix"], cache_key=cache_key)
+        yield sse_event("done", {
+            "sos_id": sos_id,
+            "from_cache": playbook["from_quick_fix"],
+            "cache_key": cache_key,
+            "playbook": playbook,
+            "similar_solutions": summarize_similar(similar) if similar else None
+        })
+
+
 @router.get("/quick-fixes")
 async def get_quick_fixes(
     current_user: User = Depends(get_current_user),
@@ -250,7 +524,17 @@ async def mark_success(
 ):
     """Mark an SOS response as successful or not."""
     
-    update_sos_success(sos_id, success, feedback)
+    sos = await asyncio.to_thread(update_sos_success, sos_id, success, feedback)
+    
+    # Feedback keeps a helpful cached playbook around longer, or gets a
+    # playbook that did not help regenerated; only the teacher's own verdict
+    # counts, and only when it changes
+    if (
+        sos and sos.get("cache_key")
+        and sos["teacher_id"] == current_user.id
+        and sos.get("success") != success
+    ):
+        await adjust_cache_lifetime(sos["cache_key"], success)
     
     # In production, this would update trust scores and learning loop
     return {"updated": True, "sos_id": sos_id}
@@ -263,5 +547,5 @@ async def get_history(
 ):
     """Get SOS history for current teacher."""
     
-    history = get_sos_history(current_user.id, limit)
+    history = await asyncio.to_thread(get_sos_history, current_user.id, limit)
     return {"history": history}
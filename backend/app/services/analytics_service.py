@@ -0,0 +1,302 @@
+"""SOS analytics for dashboards: readiness, vectorized group-bys and rollups."""
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Iterable, Optional
+
+import numpy as np
+
+from ..models.analytics import ReadinessSignal
+from ..data.mock_db import add_sos_listener
+from .sos_columns import (
+    SOSColumns, get_sos_columns, count_by, count_pairs, top_per_group, latest_per_group,
+    UNKNOWN, FAILED, SUCCESSFUL
+)
+
+# Topics a teacher is likely to reach next, per subject
+UPCOMING_TOPICS = {
+    "Math": ["Fractions", "Measurement", "Geometry"],
+    "Hindi": ["Reading Comprehension", "Grammar", "Writing"],
+    "English": ["Vocabulary", "Speaking", "Listening"],
+    "EVS": ["Plants", "Animals", "Environment"]
+}
+
+# Readiness is based on a teacher's most recent SOS within the last few days
+READINESS_WINDOW = 20
+READINESS_DAYS = 7
+
+
+def readiness_cutoff(now: Optional[datetime] = None) -> datetime:
+    return (now or datetime.now()) - timedelta(days=READINESS_DAYS)
+
+
+def compute_readiness(teacher_ids: list, window: int = READINESS_WINDOW) -> dict:
+    """Classify readiness for teachers from the columnar SOS store.
+
+    Uses each teacher's latest `window` SOS from the last READINESS_DAYS
+    days. Returns {teacher ID: (ReadinessSignal, expires_at)}, where
+    expires_at is the epoch time the oldest of those SOS leaves the window
+    (None when there are none), after which the result may change.
+    """
+    columns = get_sos_columns()
+    size = len(teacher_ids)
+    lookup = teacher_lookup(columns, teacher_ids)
+
+    rows = np.flatnonzero(columns.column("created") >= readiness_cutoff().timestamp())
+    rows = rows[lookup[columns.column("teacher")[rows]] >= 0]
+    teacher = lookup[columns.column("teacher")[rows]]
+    recent = rows[latest_per_group(teacher, columns.column("created")[rows], window)]
+    recent_teacher = lookup[columns.column("teacher")[recent]]
+    topic = columns.column("topic")[recent]
+    success = columns.column("success")[recent]
+    created = columns.column("created")[recent]
+
+    # Topics with 2+ SOS, and failure rate among SOS with feedback
+    pair_teacher, _, pair_counts = count_pairs(recent_teacher, topic, len(columns.labels["topic"]))
+    repeated_topics = count_by(pair_teacher[pair_counts >= 2], size)
+    with_feedback = count_by(recent_teacher, size, success != UNKNOWN)
+    failures = count_by(recent_teacher, size, success == FAILED)
+    failure_rate = np.divide(failures, with_feedback, out=np.zeros(size), where=with_feedback > 0)
+    at_risk = (repeated_topics > 2) | (failure_rate > 0.5)
+    needs_support = (repeated_topics > 0) | (failure_rate > 0.3)
+
+    oldest = np.full(size, np.inf)
+    np.minimum.at(oldest, recent_teacher, created)
+    window_seconds = READINESS_DAYS * 86400
+
+    results = {}
+    for position, teacher_id in enumerate(teacher_ids):
+        if at_risk[position]:
+            readiness = ReadinessSignal.AT_RISK
+        elif needs_support[position]:
+            readiness = ReadinessSignal.NEEDS_SUPPORT
+        else:
+            readiness = ReadinessSignal.READY
+        expires_at = oldest[position] + window_seconds if np.isfinite(oldest[position]) else None
+        results[teacher_id] = (readiness, expires_at)
+    return results
+
+
+class ReadinessCache:
+    """Readiness per teacher, kept until that teacher's SOS change.
+
+    Entries are dropped by the SOS change events from save_sos and
+    update_sos_success (and, via the columnar store's sync, from other
+    workers' writes), or when their oldest SOS ages out of the window.
+    """
+
+    def __init__(self):
+        self._entries: dict = {}
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self, teacher_id: str):
+        self._entries.pop(teacher_id, None)
+
+    def get_many(self, teacher_ids: Iterable[str]) -> dict:
+        """Get {teacher ID: ReadinessSignal}, computing missing ones in one batch."""
+        teacher_ids = list(dict.fromkeys(teacher_ids))
+        get_sos_columns()  # apply other workers' writes, invalidating their teachers
+
+        now = time.time()
+        results = {}
+        missing = []
+        for teacher_id in teacher_ids:
+            entry = self._entries.get(teacher_id)
+            if entry and (entry[1] is None or entry[1] > now):
+                results[teacher_id] = entry[0]
+            else:
+                missing.append(teacher_id)
+        self.hits += len(results)
+        self.misses += len(missing)
+
+        if missing:
+            for teacher_id, entry in compute_readiness(missing).items():
+                self._entries[teacher_id] = entry
+                results[teacher_id] = entry[0]
+        return results
+
+
+# Global instance
+readiness_cache = ReadinessCache()
+add_sos_listener(readiness_cache.invalidate)
+
+
+def get_readiness(teacher_ids: Iterable[str]) -> dict:
+    """Get {teacher ID: ReadinessSignal} for any number of teachers."""
+    return readiness_cache.get_many(teacher_ids)
+
+
+def recent_sos_count(teacher_id: str, days: int, now: Optional[datetime] = None) -> int:
+    """Number of a teacher's SOS in the sliding window of `days` days ending today.
+
+    The window starts at midnight of window_start(days), the same days the
+    daily rollups of trend windows cover.
+    """
+    columns = get_sos_columns()
+    start = datetime.fromisoformat(window_start(days, now)).timestamp()
+    teacher = columns.code_of("teacher", teacher_id)
+    return int(np.count_nonzero(
+        (columns.column("teacher") == teacher) & (columns.column("created") >= start)
+    ))
+
+
+def upcoming_topics(subjects: Iterable[str], per_subject: int = 2) -> list:
+    """Upcoming topics for a teacher's subjects."""
+    topics = []
+    for subject in subjects:
+        topics.extend(UPCOMING_TOPICS.get(subject, [])[:per_subject])
+    return topics
+
+
+def teacher_lookup(columns: SOSColumns, teacher_ids: list) -> np.ndarray:
+    """Array mapping global teacher codes to positions in teacher_ids (-1 elsewhere)."""
+    lookup = np.full(len(columns.labels["teacher"]) + 1, -1, dtype=np.int64)
+    for position, teacher_id in enumerate(teacher_ids):
+        lookup[columns.code_of("teacher", teacher_id)] = position
+    return lookup
+
+
+def cluster_analytics(teacher_ids: Iterable[str]) -> dict:
+    """Per-teacher and overall SOS aggregates for a set of teachers.
+
+    Vectorized over the columnar SOS store: counts, success rates and top
+    topics are group-bys on the teacher code; readiness comes from the
+    readiness cache. Returns {"teachers": {teacher ID:
+    {"sos_count", "success_rate", "top_topic", "readiness"}}, "total",
+    "successful", "topics", "subjects"}.
+    """
+    teacher_ids = list(dict.fromkeys(teacher_ids))
+    columns = get_sos_columns()
+    size = len(teacher_ids)
+
+    lookup = teacher_lookup(columns, teacher_ids)
+    rows = np.flatnonzero(lookup[columns.column("teacher")] >= 0)
+
+    teacher = lookup[columns.column("teacher")[rows]]
+    topic = columns.column("topic")[rows]
+    subject = columns.column("subject")[rows]
+    success = columns.column("success")[rows]
+    topic_count = len(columns.labels["topic"])
+
+    counts = count_by(teacher, size)
+    successful = count_by(teacher, size, success == SUCCESSFUL)
+    top_teacher, top_topic = top_per_group(*count_pairs(teacher, topic, topic_count))
+    top_topics = dict(zip(top_teacher.tolist(), top_topic.tolist()))
+
+    readiness = get_readiness(teacher_ids)
+
+    teachers = {}
+    for position, teacher_id in enumerate(teacher_ids):
+        count = int(counts[position])
+        teachers[teacher_id] = {
+            "sos_count": count,
+            "success_rate": successful[position] / count if count else 0,
+            "top_topic": columns.labels["topic"][top_topics[position]] if count else None,
+            "readiness": readiness[teacher_id]
+        }
+
+    return {
+        "teachers": teachers,
+        "total": len(rows),
+        "successful": int(successful.sum()),
+        "topics": labelled_counts(columns, "topic", topic),
+        "subjects": labelled_counts(columns, "subject", subject)
+    }
+
+
+def labelled_counts(columns: SOSColumns, name: str, codes: np.ndarray) -> Counter:
+    """Counter of label -> number of rows, for a coded column's values."""
+    totals = count_by(codes, len(columns.labels[name]))
+    return Counter({columns.labels[name][code]: int(totals[code]) for code in np.flatnonzero(totals)})
+
+
+def topic_teacher_counts(district: str) -> Counter:
+    """Number of distinct teachers in a district with SOS on each topic."""
+    columns = get_sos_columns()
+    mask = columns.district_mask(district)
+    topic_count = len(columns.labels["topic"])
+    pairs = np.unique(columns.column("teacher")[mask].astype(np.int64) * topic_count + columns.column("topic")[mask])
+    return labelled_counts(columns, "topic", pairs % topic_count if topic_count else pairs)
+
+
+def sum_rollups(rows: Iterable[dict], field: Optional[str] = None) -> dict:
+    """Sum precomputed rollup rows, grouped by one of their key fields.
+
+    Returns {field value: {"count", "successful", "failed", "subjects",
+    "clusters"}}; with no field everything is summed under None.
+    """
+    totals: dict = {}
+    for row in rows:
+        group_key = row[field] if field else None
+        group = totals.get(group_key)
+        if group is None:
+            group = totals[group_key] = {
+                "count": 0, "successful": 0, "failed": 0,
+                "subjects": Counter(), "clusters": set()
+            }
+        group["count"] += row["count"]
+        group["successful"] += row["successful"]
+        group["failed"] += row["failed"]
+        group["subjects"][row["subject"]] += row["count"]
+        if row["count"]:
+            group["clusters"].add(row["cluster"])
+    return totals
+
+
+def window_start(days: int, now: Optional[datetime] = None) -> str:
+    """First day (YYYY-MM-DD) of a sliding window of `days` days ending today."""
+    return ((now or datetime.now()).date() - timedelta(days=days - 1)).isoformat()
+
+
+def recent_months(count: int, now: Optional[datetime] = None) -> list:
+    """The last `count` months as YYYY-MM, oldest first, including this one."""
+    year, month = (now or datetime.now()).year, (now or datetime.now()).month
+    months = []
+    for _ in range(count):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return months[::-1]
+
+
+def bucket_of(day: str, granularity: str) -> str:
+    """Bucket label of a day: the day itself, its ISO week or its month."""
+    if granularity == "month":
+        return day[:7]
+    if granularity == "week":
+        year, week, _ = date.fromisoformat(day).isocalendar()
+        return f"{year}-W{week:02d}"
+    return day
+
+
+def rollup_series(rows: Iterable[dict], field: str, granularity: str = "day") -> dict:
+    """Fold daily rollup rows into {field value: {bucket: totals}}.
+
+    Windowed queries read only the daily rows in the window (see
+    get_rollups' since), so this is linear in buckets, not in SOS.
+    """
+    series: dict = {}
+    for row in rows:
+        bucket = bucket_of(row["period"], granularity)
+        totals = series.setdefault(row[field], {}).setdefault(
+            bucket, {"count": 0, "successful": 0, "failed": 0}
+        )
+        totals["count"] += row["count"]
+        totals["successful"] += row["successful"]
+        totals["failed"] += row["failed"]
+    return series
+
+
+def failure_rate(totals: Optional[dict]) -> float:
+    """Share of SOS with feedback that did not help."""
+    if not totals or not totals["successful"] + totals["failed"]:
+        return 0.0
+    return totals["failed"] / (totals["successful"] + totals["failed"])
+
+
+def trend_direction(previous: float, current: float, tolerance: float = 0.05) -> str:
+    if current > previous + tolerance:
+        return "increasing"
+    if current < previous - tolerance:
+        return "decreasing"
+    return "stable"
@@ -1,19 +1,295 @@
 """Redis caching service with TTL management."""
-import redis
+import redis.asyncio as aioredis
+import asyncio
 import json
 import hashlib
-from typing import Optional, Any
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Optional, Any, Awaitable, Callable
 from ..config import get_settings
+from .playbook_codec import (
+    split_refs, join_refs, ref_ids, ref_key, encode_playbook, decode_playbook, encode_refs
+)
 
 settings = get_settings()
 
-# Redis connection
+
+class CircuitBreaker:
+    """Skip Redis for a cooldown period after repeated failures.
+
+    Once the cooldown has passed, calls are let through again; the first
+    failure after that re-opens the breaker immediately.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    def allow(self) -> bool:
+        """Check whether a Redis call may be attempted."""
+        if self.opened_at is None:
+            return True
+        return time.monotonic() - self.opened_at >= self.cooldown
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+    def trip(self):
+        self.failures = self.threshold
+        self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+
+class LocalCache:
+    """Size-bounded in-process LRU with per-entry TTL.
+
+    Keys in pin_keys (the most used quick-fix playbooks, see refresh_pins)
+    are pinned when set with pin: they live outside the LRU and are never
+    evicted, but are dropped after pin_ttl, so an invalidation missed while
+    the listener reconnects cannot leave them stale for good.
+    An entry may also carry a soft expiry (fresh_for), after which lookup
+    still returns it but reports it stale.
+    Values are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries: int, max_pinned: int, pin_ttl: float = 0):
+        self.max_entries = max_entries
+        self.max_pinned = max_pinned
+        self.pin_ttl = pin_ttl
+        self.pin_keys: set = set()
+        self._entries: OrderedDict = OrderedDict()
+        self._pinned: dict = {}
+
+    def get(self, key: str) -> Optional[dict]:
+        return self.lookup(key)[0]
+
+    def lookup(self, key: str) -> tuple[Optional[dict], bool]:
+        """Get (value, fresh) for a key; (None, False) if absent or expired."""
+        now = time.monotonic()
+        pinned = self._pinned.get(key)
+        if pinned is not None:
+            refresh_at, fresh_until, value = pinned
+            if now < refresh_at:
+                return value, now < fresh_until
+            del self._pinned[key]
+            return None, False
+
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, False
+
+        expires_at, fresh_until, value = entry
+        if now >= expires_at:
+            del self._entries[key]
+            return None, False
+
+        self._entries.move_to_end(key)
+        return value, now < fresh_until
+
+    def set(self, key: str, value: dict, ttl: float, pin: bool = False, fresh_for: Optional[float] = None):
+        """Store a value for ttl seconds (pin_ttl if pinned), fresh for fresh_for of them."""
+        now = time.monotonic()
+        fresh_until = now + fresh_for if fresh_for is not None else float("inf")
+        if pin and key in self.pin_keys:
+            self._entries.pop(key, None)
+            self._pinned[key] = (now + self.pin_ttl, fresh_until, value)
+            return
+
+        self._pinned.pop(key, None)
+        self._entries[key] = (now + ttl, fresh_until, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        self._entries.pop(key, None)
+        self._pinned.pop(key, None)
+
+    def set_pin_keys(self, keys: list):
+        """Pin up to max_pinned of these keys from now on.
+
+        Entries that lost their place are dropped; the next lookup refills
+        them from Redis into the LRU.
+        """
+        self.pin_keys = set(keys[:self.max_pinned])
+        for key in [key for key in self._pinned if key not in self.pin_keys]:
+            del self._pinned[key]
+
+    def sizes(self) -> dict:
+        return {"entries": len(self._entries), "pinned": len(self._pinned)}
+
+
+breaker = CircuitBreaker(settings.redis_breaker_threshold, settings.redis_breaker_cooldown)
+
+local_cache = LocalCache(
+    settings.local_cache_max_entries, settings.local_cache_max_pinned, settings.local_cache_pin_ttl
+)
+
+# Shared NCERT refs and videos by ID, so most reads join them without Redis
+ref_cache = LocalCache(settings.local_cache_max_entries, 0)
+
+# Hit/miss counters per tier
+cache_stats = {
+    "local": {"hits": 0, "misses": 0, "stale": 0},
+    "redis": {"hits": 0, "misses": 0, "stale": 0},
+    "revalidations": 0
+}
+
+# Redis fetches in flight, so concurrent misses on one key share a single GET
+inflight_fills: dict = {}
+
+# Extend shared refs to at least ARGV[1] seconds, never shortening them
+KEEP_REFS_SCRIPT = """
+for _, key in ipairs(KEYS) do
+    if redis.call("ttl", key) < tonumber(ARGV[1]) then
+        redis.call("expire", key, ARGV[1])
+    end
+end
+return 0
+"""
+
+# Keeps fire-and-forget tasks referenced until they finish
+background_tasks: set = set()
+
+# Stale keys being regenerated by this worker
+revalidating: set = set()
+
+# Usage leaderboards (sorted sets of cache keys scored by lookups); quick-fix
+# playbooks are also counted on their own board, which picks the pinned keys
+USAGE_LEADERBOARD = "sahayak:leaderboard:usage"
+QUICK_FIX_LEADERBOARD = "sahayak:leaderboard:quick_fix"
+
+# Cross-worker invalidation: each worker drops its local copy of a key when
+# another worker writes or invalidates it
+INVALIDATION_CHANNEL = "sahayak:cache:invalidate"
+WORKER_ID = uuid.uuid4().hex[:8]
+
+# Redis connection pool (connections are opened lazily, on first use)
 try:
-    redis_client = redis.from_url(settings.redis_url, decode_responses=True)
-    REDIS_AVAILABLE = redis_client.ping()
-except:
+    redis_pool = aioredis.BlockingConnectionPool.from_url(
+        settings.redis_url,
+        decode_responses=True,
+        max_connections=settings.redis_max_connections,
+        timeout=settings.redis_socket_timeout,
+        socket_timeout=settings.redis_socket_timeout,
+        socket_connect_timeout=settings.redis_socket_timeout
+    )
+    redis_client = aioredis.Redis(connection_pool=redis_pool)
+
+    # Cached playbooks are binary (see playbook_codec), so they get their
+    # own pool without response decoding
+    bytes_pool = aioredis.BlockingConnectionPool.from_url(
+        settings.redis_url,
+        max_connections=settings.redis_max_connections,
+        timeout=settings.redis_socket_timeout,
+        socket_timeout=settings.redis_socket_timeout,
+        socket_connect_timeout=settings.redis_socket_timeout
+    )
+    redis_bytes = aioredis.Redis(connection_pool=bytes_pool)
+except Exception as e:
+    print(f"Redis config error: {e}")
+    redis_pool = None
     redis_client = None
-    REDIS_AVAILABLE = False
+    redis_bytes = None
+
+
+async def connect_cache() -> bool:
+    """Ping Redis at startup; open the breaker if it is unreachable."""
+    if redis_client is None:
+        return False
+
+    # Listen for invalidations even if Redis is down now; it retries
+    run_in_background(listen_for_invalidations())
+    run_in_background(refresh_pins())
+
+    try:
+        await redis_client.ping()
+        breaker.record_success()
+        return True
+    except Exception as e:
+        print(f"Redis connect error: {e}")
+        breaker.trip()
+        return False
+
+
+async def close_cache():
+    """Stop background cache tasks and release pooled Redis connections."""
+    for task in list(background_tasks):
+        task.cancel()
+    if redis_client is not None:
+        await redis_client.aclose()
+        await redis_bytes.aclose()
+
+
+def run_in_background(coro):
+    """Schedule a cache task without blocking the request path."""
+    task = asyncio.ensure_future(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+
+async def listen_for_invalidations():
+    """Drop local entries that other workers have overwritten or invalidated."""
+    while True:
+        # Dedicated connection: pub/sub reads block, so no socket timeout
+        subscriber = aioredis.from_url(settings.redis_url, decode_responses=True)
+        try:
+            async with subscriber.pubsub() as pubsub:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    origin, _, key = message["data"].partition("|")
+                    if origin != WORKER_ID:
+                        local_cache.delete(key)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Cache invalidation listener error: {e}")
+        finally:
+            await subscriber.aclose()
+        await asyncio.sleep(settings.redis_breaker_cooldown)
+
+
+async def refresh_pins():
+    """Pin the most used quick-fix playbooks, re-reading the board periodically."""
+    while True:
+        if redis_ready():
+            try:
+                await redis_client.zremrangebyrank(
+                    QUICK_FIX_LEADERBOARD, 0, -(settings.leaderboard_max_entries + 1)
+                )
+                keys = await redis_client.zrevrange(QUICK_FIX_LEADERBOARD, 0, local_cache.max_pinned - 1)
+                breaker.record_success()
+                local_cache.set_pin_keys(keys)
+            except Exception as e:
+                breaker.record_failure()
+                print(f"Cache pin refresh error: {e}")
+        await asyncio.sleep(settings.local_cache_pin_refresh)
+
+
+def is_pinnable(response: dict) -> bool:
+    """Complete quick-fix playbooks may be pinned (if used enough)."""
+    return bool(response.get("from_quick_fix")) and not response.get("partial")
+
+
+def redis_ready() -> bool:
+    """Check whether a Redis call should be attempted right now."""
+    return redis_client is not None and breaker.allow()
 
 
 def get_cache_key(context: dict) -> str:
@@ -28,78 +304,602 @@ def get_cache_key(context: dict) -> str:
     return f"sahayak:sos:{hashlib.md5(raw_key.encode()).hexdigest()[:12]}"
 
 
+def fresh_key(cache_key: str) -> str:
+    """Marker key that exists while a cached response is fresh (its soft TTL)."""
+    return f"{cache_key}:fresh"
+
+
+def rejected_key(cache_key: str) -> str:
+    """Set of quick-fix IDs teachers said did not help for a cache key."""
+    return f"{cache_key}:rejected"
+
+
+def hard_ttl(ttl: int) -> int:
+    """How long a response with soft TTL ttl may still be served stale."""
+    return int(ttl * settings.cache_stale_ttl_factor)
+
+
+def get_leaderboard_key(district: Optional[str] = None, grade: Optional[int] = None) -> str:
+    """Get the usage leaderboard key, scoped to a district (preferred) or grade."""
+    if district:
+        return f"{USAGE_LEADERBOARD}:district:{district.lower()}"
+    if grade:
+        return f"{USAGE_LEADERBOARD}:grade:{grade}"
+    return USAGE_LEADERBOARD
+
+
+def queue_usage(
+    pipe,
+    cache_key: str,
+    district: Optional[str] = None,
+    grade: Optional[int] = None,
+    quick_fix: bool = False
+):
+    """Queue leaderboard increments for one lookup on a Redis pipeline."""
+    pipe.zincrby(USAGE_LEADERBOARD, 1, cache_key)
+    if quick_fix:
+        pipe.zincrby(QUICK_FIX_LEADERBOARD, 1, cache_key)
+    if district:
+        pipe.zincrby(get_leaderboard_key(district=district), 1, cache_key)
+    if grade:
+        pipe.zincrby(get_leaderboard_key(grade=grade), 1, cache_key)
+
+
 def get_problem_cache_key(problem_text: str) -> str:
     """Generate cache key from problem text."""
     normalized = problem_text.lower().strip()[:100]
     return f"sahayak:problem:{hashlib.md5(normalized.encode()).hexdigest()[:12]}"
 
 
-async def get_cached_response(cache_key: str) -> Optional[dict]:
-    """Get cached response if available."""
-    if not REDIS_AVAILABLE:
+async def get_cached_response(
+    cache_key: str,
+    track_usage: bool = False,
+    district: Optional[str] = None,
+    grade: Optional[int] = None,
+    revalidate: Optional[Callable[[], Awaitable]] = None
+) -> Optional[dict]:
+    """Get cached response if available.
+
+    The in-process tier is checked first; on a local miss, concurrent callers
+    for the same key share one Redis fetch and the result fills the local tier.
+    With track_usage, each lookup also counts towards the key's demand on the
+    global leaderboard and the district and grade boards, and for quick-fix
+    playbooks on the quick-fix board.
+
+    A response past its soft TTL is still returned until its hard TTL; if
+    revalidate is given, it is called in the background to replace it. The
+    local tier keeps each entry's soft expiry, so this applies to local
+    hits too.
+    """
+    cached, fresh = local_cache.lookup(cache_key)
+    if cached is not None:
+        cache_stats["local"]["hits"] += 1
+        if track_usage:
+            run_in_background(increment_usage(cache_key, district, grade, is_pinnable(cached)))
+        if not fresh:
+            cache_stats["local"]["stale"] += 1
+            if revalidate is not None:
+                schedule_revalidation(cache_key, revalidate)
+        return cached
+    cache_stats["local"]["misses"] += 1
+
+    if not redis_ready():
         return None
-    
+
+    fill = inflight_fills.get(cache_key)
+    if fill is not None:
+        cached = await asyncio.shield(fill)
+        if track_usage and cached is not None:
+            run_in_background(increment_usage(cache_key, district, grade, is_pinnable(cached)))
+        return cached
+
+    fill = asyncio.get_running_loop().create_future()
+    inflight_fills[cache_key] = fill
+    cached = None
     try:
-        cached = redis_client.get(cache_key)
-        if cached:
-            return json.loads(cached)
+        usage = (district, grade) if track_usage else None
+        cached, fresh_for = await fetch_from_redis(cache_key, usage)
+        fresh = fresh_for > 0
+        if cached is not None:
+            local_cache.set(
+                cache_key, cached, ttl=settings.local_cache_ttl, pin=is_pinnable(cached), fresh_for=fresh_for
+            )
+            if track_usage and is_pinnable(cached):
+                run_in_background(increment_quick_fix_usage(cache_key))
+            if not fresh and revalidate is not None:
+                schedule_revalidation(cache_key, revalidate)
+        return cached
+    finally:
+        # Resolve even if this request was cancelled, so waiters never hang
+        inflight_fills.pop(cache_key, None)
+        fill.set_result(cached)
+
+
+async def fetch_from_redis(cache_key: str, usage: Optional[tuple] = None) -> tuple[Optional[dict], float]:
+    """Read and decode one key from Redis, with how many seconds it stays fresh.
+
+    The GET, the freshness check (the TTL of the fresh marker; 0 when it
+    is stale) and, with a (district, grade) usage scope, the leaderboard
+    increments are pipelined into a single round trip.
+    """
+    try:
+        async with redis_bytes.pipeline(transaction=False) as pipe:
+            pipe.get(cache_key)
+            pipe.pttl(fresh_key(cache_key))
+            if usage is not None:
+                queue_usage(pipe, cache_key, *usage)
+            cached, fresh_ms = (await pipe.execute())[:2]
+        breaker.record_success()
+        playbook = await load_playbook(cached) if cached else None
+        if playbook is not None:
+            cache_stats["redis"]["hits"] += 1
+            # -1: a marker without expiry; -2: no marker, so stale
+            fresh_for = float("inf") if fresh_ms == -1 else max(fresh_ms, 0) / 1000
+            if not fresh_for:
+                cache_stats["redis"]["stale"] += 1
+            return playbook, fresh_for
+        cache_stats["redis"]["misses"] += 1
     except Exception as e:
+        breaker.record_failure()
         print(f"Cache get error: {e}")
-    
-    return None
+
+    return None, 0.0
 
 
-async def set_cached_response(cache_key: str, response: dict, ttl: int = 3600):
-    """Cache a response with TTL."""
-    if not REDIS_AVAILABLE:
+async def load_playbook(raw: bytes) -> Optional[dict]:
+    """Decode a cached playbook and join its shared refs.
+
+    Refs come from the in-process ref cache; any it lacks are fetched in
+    one MGET. Returns None (a cache miss) if a ref has expired, so the
+    playbook is regenerated instead of served without it.
+    """
+    slim = decode_playbook(raw)
+    refs = {}
+    missing = []
+    for item_id in ref_ids(slim):
+        item = ref_cache.get(item_id)
+        if item is None:
+            missing.append(item_id)
+        else:
+            refs[item_id] = item
+
+    if missing:
+        values = await redis_bytes.mget([ref_key(item_id) for item_id in missing])
+        for item_id, value in zip(missing, values):
+            if value:
+                refs[item_id] = json.loads(value)
+                ref_cache.set(item_id, refs[item_id], ttl=settings.cache_ref_ttl)
+            else:
+                print(f"Cache ref {item_id} missing, treating playbook as a miss")
+                return None
+    return join_refs(slim, refs)
+
+
+def schedule_revalidation(cache_key: str, revalidate: Callable[[], Awaitable]):
+    """Regenerate a stale response in the background, once per key and worker."""
+    if cache_key in revalidating:
+        return
+    revalidating.add(cache_key)
+    cache_stats["revalidations"] += 1
+
+    async def run():
+        try:
+            await revalidate()
+        except Exception as e:
+            print(f"Cache revalidate error: {e}")
+        finally:
+            revalidating.discard(cache_key)
+
+    run_in_background(run())
+
+
+async def set_cached_response(cache_key: str, response: dict, ttl: int = 3600, pin: bool = False):
+    """Cache a response in both tiers, fresh for ttl seconds.
+
+    Redis keeps it for hard_ttl(ttl), so it can be served stale while it is
+    regenerated. With pin (a complete quick-fix playbook), the response
+    counts on the quick-fix board and stays in process memory while it is
+    one of the most used. Other workers are told to drop their local copy.
+    """
+    local_cache.set(cache_key, response, ttl=min(ttl, settings.local_cache_ttl), pin=pin, fresh_for=ttl)
+
+    if not redis_ready():
         return False
-    
+
     try:
-        redis_client.setex(cache_key, ttl, json.dumps(response, ensure_ascii=False))
+        slim, refs = split_refs(response)
+        for item_id, item in refs.items():
+            ref_cache.set(item_id, item, ttl=settings.cache_ref_ttl)
+        async with redis_bytes.pipeline(transaction=False) as pipe:
+            pipe.setex(cache_key, hard_ttl(ttl), encode_playbook(slim))
+            # Shared refs must outlive every playbook that points to them
+            ref_ttl = max(settings.cache_ref_ttl, hard_ttl(ttl))
+            for key, value in encode_refs(refs):
+                pipe.set(key, value, nx=True, ex=ref_ttl)
+            if refs:
+                pipe.eval(KEEP_REFS_SCRIPT, len(refs), *map(ref_key, refs), ref_ttl)
+            pipe.setex(fresh_key(cache_key), ttl, 1)
+            if pin:
+                pipe.zincrby(QUICK_FIX_LEADERBOARD, 1, cache_key)
+            pipe.publish(INVALIDATION_CHANNEL, f"{WORKER_ID}|{cache_key}")
+            await pipe.execute()
+        breaker.record_success()
         return True
     except Exception as e:
+        breaker.record_failure()
         print(f"Cache set error: {e}")
         return False
 
 
-async def increment_usage(cache_key: str):
-    """Increment usage count for a cached solution."""
-    if not REDIS_AVAILABLE:
+async def invalidate_cached_response(cache_key: str):
+    """Remove a response from every tier and every worker."""
+    local_cache.delete(cache_key)
+
+    if not redis_ready():
         return
-    
+
     try:
-        usage_key = f"{cache_key}:usage"
-        redis_client.incr(usage_key)
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.delete(cache_key, fresh_key(cache_key))
+            pipe.publish(INVALIDATION_CHANNEL, f"{WORKER_ID}|{cache_key}")
+            await pipe.execute()
+        breaker.record_success()
     except Exception as e:
+        breaker.record_failure()
+        print(f"Cache invalidate error: {e}")
+
+
+async def adjust_cache_lifetime(cache_key: str, success: bool):
+    """Apply teacher feedback on a cached response to its lifetime.
+
+    A playbook that helped stays fresh (and cached) for
+    cache_feedback_extension seconds longer, up to cache_feedback_max_ttl
+    in total. One that did not help goes stale at once, so
+    the next lookup serves it one last time while it is regenerated. Either
+    way every worker drops its local copy, whose soft expiry is now out of
+    date, and re-reads it from Redis. If it was built from a quick fix,
+    that quick fix is recorded as rejected for the key (see
+    get_rejected_fixes), so the regeneration does not rebuild the same one.
+    """
+    if not success:
+        local_cache.delete(cache_key)
+    if not redis_ready():
+        return
+
+    try:
+        async with redis_bytes.pipeline(transaction=False) as pipe:
+            pipe.ttl(cache_key)
+            pipe.ttl(fresh_key(cache_key))
+            pipe.get(cache_key)
+            remaining, fresh_remaining, raw = await pipe.execute()
+        if remaining is None or remaining < 0 or not raw:
+            breaker.record_success()
+            return
+
+        async with redis_client.pipeline(transaction=False) as pipe:
+            if success:
+                fresh_for = min(max(fresh_remaining, 0) + settings.cache_feedback_extension, settings.cache_feedback_max_ttl)
+                keep_for = max(remaining, hard_ttl(fresh_for))
+                pipe.setex(fresh_key(cache_key), fresh_for, 1)
+                pipe.expire(cache_key, keep_for)
+                # Its shared refs must live at least as long
+                ids = ref_ids(decode_playbook(raw))
+                if ids:
+                    pipe.eval(KEEP_REFS_SCRIPT, len(ids), *map(ref_key, ids), keep_for)
+            else:
+                pipe.delete(fresh_key(cache_key))
+                slim = decode_playbook(raw)
+                if slim.get("from_quick_fix") and slim.get("id"):
+                    pipe.sadd(rejected_key(cache_key), slim["id"])
+                    pipe.expire(rejected_key(cache_key), remaining)
+            pipe.publish(INVALIDATION_CHANNEL, f"{WORKER_ID}|{cache_key}")
+            await pipe.execute()
+        local_cache.delete(cache_key)
+        breaker.record_success()
+    except Exception as e:
+        breaker.record_failure()
+        print(f"Cache lifetime error: {e}")
+
+
+async def get_rejected_fixes(cache_key: str) -> set:
+    """IDs of the quick fixes whose playbooks got negative feedback under a key.
+
+    They are kept as long as the rejected playbook could still be served.
+    """
+    if not redis_ready():
+        return set()
+
+    try:
+        rejected = await redis_client.smembers(rejected_key(cache_key))
+        breaker.record_success()
+        return set(rejected)
+    except Exception as e:
+        breaker.record_failure()
+        print(f"Cache rejected fixes error: {e}")
+        return set()
+
+
+async def increment_usage(
+    cache_key: str,
+    district: Optional[str] = None,
+    grade: Optional[int] = None,
+    quick_fix: bool = False
+):
+    """Increment usage count for a cached solution on the leaderboards."""
+    if not redis_ready():
+        return
+
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            queue_usage(pipe, cache_key, district, grade, quick_fix)
+            await pipe.execute()
+        breaker.record_success()
+    except Exception as e:
+        breaker.record_failure()
         print(f"Usage increment error: {e}")
 
 
-async def get_popular_problems(limit: int = 10) -> list:
-    """Get most frequently accessed problems."""
-    if not REDIS_AVAILABLE:
+async def increment_quick_fix_usage(cache_key: str):
+    """Count a lookup of a quick-fix playbook read from Redis on the quick-fix board.
+
+    The other boards were already counted in the same round trip as the GET.
+    """
+    if not redis_ready():
+        return
+
+    try:
+        await redis_client.zincrby(QUICK_FIX_LEADERBOARD, 1, cache_key)
+        breaker.record_success()
+    except Exception as e:
+        breaker.record_failure()
+        print(f"Usage increment error: {e}")
+
+
+async def get_popular_problems(
+    limit: int = 10,
+    district: Optional[str] = None,
+    grade: Optional[int] = None
+) -> list:
+    """Get most frequently accessed problems, optionally for a district or grade.
+
+    Keys whose playbook has expired are removed from the board as they are
+    found, and the next ranks are read in their place, so up to limit live
+    problems are returned. The board is also trimmed to
+    leaderboard_max_entries.
+    """
+    if not redis_ready() or limit <= 0:
         return []
-    
+
+    board = get_leaderboard_key(district, grade)
+    popular = []
     try:
-        # Get all usage keys
-        keys = redis_client.keys("sahayak:*:usage")
-        usage_data = []
-        for key in keys[:limit]:
-            count = redis_client.get(key)
-            if count:
-                base_key = key.replace(":usage", "")
-                cached = redis_client.get(base_key)
-                if cached:
-                    usage_data.append({
-                        "key": base_key,
-                        "count": int(count),
-                        "data": json.loads(cached)
-                    })
-        return sorted(usage_data, key=lambda x: x["count"], reverse=True)
+        await redis_client.zremrangebyrank(board, 0, -(settings.leaderboard_max_entries + 1))
+        start = 0
+        while len(popular) < limit:
+            leaders = await redis_client.zrevrange(board, start, start + limit - 1, withscores=True)
+            if not leaders:
+                break
+
+            cached_values = await redis_bytes.mget([key for key, _ in leaders])
+            expired = []
+            for (key, score), cached in zip(leaders, cached_values):
+                if not cached:
+                    expired.append(key)
+                    continue
+                # None if a shared ref is gone; it is regenerated on the next SOS
+                data = await load_playbook(cached)
+                if data is not None and len(popular) < limit:
+                    popular.append({"key": key, "count": int(score), "data": data})
+            if expired:
+                await redis_client.zrem(board, *expired)
+
+            if len(leaders) < limit:
+                break
+            # Removing expired keys moved the later ranks up
+            start += len(leaders) - len(expired)
+        breaker.record_success()
+        return popular
     except Exception as e:
+        breaker.record_failure()
         print(f"Popular problems error: {e}")
         return []
 
 
+# Compare-and-delete, so a worker only releases a lease it still holds
+RELEASE_LEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# Compare-and-extend, so a worker only renews a lease it still holds
+# ARGV: token, lease in milliseconds
+EXTEND_LEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class Flight:
+    """One request's part in a coalesced generation.
+
+    The leader generates and publishes; followers find the leader's
+    playbook in result.
+    """
+
+    def __init__(self, cache_key: str, future: Optional[asyncio.Future] = None):
+        self.cache_key = cache_key
+        self.future = future
+        self.result: Optional[dict] = None
+        self.leader = False
+        self.token: Optional[str] = None
+
+    def publish(self, playbook: dict):
+        """Hand the playbook to waiting followers right away."""
+        self.result = playbook
+        if self.future is not None and not self.future.done():
+            self.future.set_result(playbook)
+
+
+class GenerationCoalescer:
+    """Single-flight playbook generation per cache key, across workers.
+
+    Within a worker, concurrent requests for a key share one future. Across
+    workers, the first to SET NX the key's lease in Redis generates, and
+    renews the lease every lease / 3 seconds while it does, so a slow
+    generation never loses it. The others poll the cache until its
+    playbook lands there, or until the lease is released or lapses (its
+    holder crashed), when they take over. A follower stops waiting after
+    max_wait seconds and generates itself. Without Redis only the
+    in-process coalescing applies.
+    """
+
+    def __init__(self, lease: float, poll_interval: float, max_wait: float):
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.max_wait = max_wait
+        self._inflight: dict = {}
+        self.coalesced = 0
+
+    @asynccontextmanager
+    async def flight(self, cache_key: str):
+        flight = Flight(cache_key)
+
+        # Wait for this worker's own generation of the key, if there is one
+        while (pending := self._inflight.get(cache_key)) is not None:
+            flight.result = await asyncio.shield(pending)
+            if flight.result is not None:
+                self.coalesced += 1
+                yield flight
+                return
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[cache_key] = future
+        flight.future = future
+        keeper = None
+        try:
+            flight.result = await self._claim(flight)
+            if flight.result is None:
+                flight.leader = True
+                if flight.token:
+                    keeper = asyncio.ensure_future(self._keep_lease(flight))
+            else:
+                self.coalesced += 1
+            yield flight
+        finally:
+            # Resolve even if the leader failed or was cancelled, so waiters
+            # never hang; a None result makes one of them generate instead
+            if self._inflight.get(cache_key) is future:
+                del self._inflight[cache_key]
+            if not future.done():
+                future.set_result(flight.result)
+            if keeper is not None:
+                keeper.cancel()
+            if flight.token:
+                await self._release(flight)
+
+    async def _claim(self, flight: Flight) -> Optional[dict]:
+        """Take the cross-worker lease, or get the playbook its holder cached."""
+        lease_key = f"{flight.cache_key}:lease"
+        token = f"{WORKER_ID}:{uuid.uuid4().hex[:8]}"
+        deadline = time.monotonic() + self.max_wait
+        waited = False
+
+        while redis_ready():
+            try:
+                acquired = await redis_client.set(lease_key, token, nx=True, px=int(self.lease * 1000))
+                breaker.record_success()
+            except Exception as e:
+                breaker.record_failure()
+                print(f"Generation lease error: {e}")
+                return None
+
+            if acquired:
+                flight.token = token
+                # The holder we waited for may have cached its playbook
+                # just before releasing the lease
+                return await get_cached_response(flight.cache_key) if waited else None
+            if time.monotonic() >= deadline:
+                return None
+
+            waited = True
+
+            await asyncio.sleep(self.poll_interval)
+            cached = await get_cached_response(flight.cache_key)
+            if cached is not None:
+                return cached
+        return None
+
+    async def _keep_lease(self, flight: Flight):
+        """Renew the leader's lease until cancelled, or until it is lost."""
+        lease_key = f"{flight.cache_key}:lease"
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            if not redis_ready():
+                continue
+            try:
+                kept = await redis_client.eval(
+                    EXTEND_LEASE_SCRIPT, 1, lease_key, flight.token, int(self.lease * 1000)
+                )
+                breaker.record_success()
+            except Exception as e:
+                breaker.record_failure()
+                print(f"Generation lease renew error: {e}")
+                continue
+            if not kept:
+                print(f"Generation lease for {flight.cache_key} lost")
+                return
+
+    async def _release(self, flight: Flight):
+        if not redis_ready():
+            return
+        try:
+            await redis_client.eval(RELEASE_LEASE_SCRIPT, 1, f"{flight.cache_key}:lease", flight.token)
+            breaker.record_success()
+        except Exception as e:
+            breaker.record_failure()
+            print(f"Generation lease release error: {e}")
+
+
+# Longest a leader should take: context, then similar and playbook stages in
+# turn while refs and videos run alongside. Followers wait that long plus
+# one lease before they give up on it.
+GENERATION_DEADLINE = (
+    settings.context_stage_timeout
+    + settings.similar_stage_timeout
+    + settings.playbook_stage_timeout
+    + max(settings.ncert_stage_timeout, settings.video_stage_timeout)
+)
+
+generation_coalescer = GenerationCoalescer(
+    settings.generation_lease,
+    settings.generation_poll_interval,
+    max_wait=GENERATION_DEADLINE + settings.generation_lease
+)
+
+
+def coalesce_generation(cache_key: str):
+    """Context manager yielding a Flight: generate if leader, else use its result.
+
+    The leader must cache its playbook before leaving the block, so
+    followers in other workers can find it.
+    """
+    return generation_coalescer.flight(cache_key)
+
+
+def get_cache_stats() -> dict:
+    """Get hit/miss counters per cache tier and local tier sizes."""
+    return {
+        "local": {**cache_stats["local"], **local_cache.sizes()},
+        "redis": {**cache_stats["redis"], "available": is_cache_available()},
+        "revalidations": cache_stats["revalidations"],
+        "coalesced_generations": generation_coalescer.coalesced
+    }
+
+
 def is_cache_available() -> bool:
     """Check if Redis is available."""
-    return REDIS_AVAILABLE
+    return redis_client is not None and not breaker.is_open
@@ -0,0 +1,229 @@
+"""Off-peak pre-warming of the playbook cache for likely SOS contexts."""
+import asyncio
+import time
+from collections import Counter
+from datetime import datetime, date, timedelta
+from typing import Optional
+
+from ..config import get_settings
+from ..models.sos import SOSContext
+from ..data.mock_db import get_all_sos, get_all_users
+from .analytics_service import upcoming_topics, window_start
+from .cache_service import (
+    get_cache_key, get_cached_response, get_rejected_fixes, coalesce_generation,
+    redis_ready, redis_client, breaker, run_in_background, WORKER_ID
+)
+from .mistral_service import client as llm_client, generate_playbook
+from .rag_service import get_rag_service
+from .sos_pipeline import (
+    StageRunner, start_resource_stages, start_similar_stage, find_quick_fix, build_quick_fix_playbook,
+    cache_playbook, QUICK_FIX_TTL, GENERATED_TTL
+)
+
+settings = get_settings()
+
+# SOS from this many days count as demand
+DEMAND_DAYS = 30
+
+# One worker warms per off-peak window
+WARM_RUN_KEY = "sahayak:warm:run"
+
+
+def is_off_peak(now: Optional[datetime] = None) -> bool:
+    """Check whether the hour falls in the off-peak window (which may wrap midnight)."""
+    hour = (now or datetime.now()).hour
+    start, end = settings.cache_warm_start_hour, settings.cache_warm_end_hour
+    return start <= hour < end if start < end else hour >= start or hour < end
+
+
+def off_peak_window(now: Optional[datetime] = None) -> date:
+    """Date the current off-peak window started on."""
+    now = now or datetime.now()
+    if settings.cache_warm_start_hour > settings.cache_warm_end_hour and now.hour < settings.cache_warm_end_hour:
+        return now.date() - timedelta(days=1)
+    return now.date()
+
+
+def warm_candidates(limit: int) -> list:
+    """(grade, subject, topic, language) tuples ranked by expected demand.
+
+    Recent SOS count double, as real demand; each teacher adds their
+    upcoming topics for every grade they teach, and the top quick fixes
+    are added in each language teachers use.
+    """
+    demand: Counter = Counter()
+    since = window_start(DEMAND_DAYS)
+    for sos in get_all_sos():
+        context = sos.get("context") or {}
+        if sos["created_at"][:10] >= since and context.get("subject") and context.get("topic"):
+            demand[(context.get("grade"), context["subject"], context["topic"], context.get("language", "hi"))] += 2
+
+    teachers = [user for user in get_all_users() if user.get("role") == "teacher"]
+    languages = {teacher.get("language", "hi") for teacher in teachers} or {"hi"}
+    for teacher in teachers:
+        for grade in teacher.get("grade_teaching") or [3]:
+            for subject in teacher.get("subjects") or []:
+                for topic in upcoming_topics([subject]):
+                    demand[(grade, subject, topic, teacher.get("language", "hi"))] += 1
+
+    for fix in get_rag_service().get_top_quick_fixes(settings.cache_warm_quick_fixes):
+        for language in languages:
+            demand[(fix.get("grade"), fix.get("subject"), fix.get("topic"), language)] += 1
+
+    return [candidate for candidate, _ in demand.most_common(limit)]
+
+
+async def warm_playbook(
+    grade: Optional[int],
+    subject: str,
+    topic: str,
+    language: str,
+    use_llm: bool,
+    ttl: Optional[int] = None,
+    refresh: bool = False,
+    problem: Optional[str] = None
+) -> Optional[str]:
+    """Build and cache the playbook for one context, like a cache-miss SOS would.
+
+    It is cached through cache_playbook, as a real SOS would cache it: indexed
+    in the semantic cache, and a quick-fix playbook counts towards pinning.
+
+    problem is the SOS text to match and generate for (the topic by default).
+
+    Returns "cached" when it was already warm (unless refresh), "quick_fix"
+    or "llm" for the source of a new playbook, "llm_failed" when an LLM call
+    was spent but nothing was cached, or None when it was skipped. Without
+    a ttl the playbook gets the usual soft TTL for its source.
+    """
+    context = SOSContext(grade=grade, subject=subject, topic=topic, language=language)
+    cache_key = get_cache_key({"grade": grade, "subject": subject, "topic": topic, "language": language})
+    if not refresh and await get_cached_response(cache_key):
+        return "cached"
+
+    async with coalesce_generation(cache_key) as flight:
+        if not flight.leader:
+            return "cached"
+
+        runner = StageRunner()
+        rag = get_rag_service()
+        problem = problem or topic
+        start_similar_stage(runner, rag, problem, context)
+        # A refresh never rebuilds a quick fix teachers said did not help
+        rejected = await get_rejected_fixes(cache_key) if refresh else set()
+        best_match = find_quick_fix(await runner.result("similar"), skip=rejected)
+        if not best_match and not use_llm:
+            await runner.gather()
+            return None
+
+        start_resource_stages(runner, rag, problem, context)
+        if best_match:
+            playbook = build_quick_fix_playbook(best_match, problem, language)
+        else:
+            runner.start(
+                "playbook",
+                generate_playbook(
+                    problem=problem, grade=grade or 3, subject=subject, topic=topic,
+                    language=language, raise_errors=True
+                ),
+                timeout=settings.playbook_stage_timeout
+            )
+        stages = await runner.gather()
+        if not best_match:
+            if not stages["playbook"]:
+                return "llm_failed"
+            playbook = {
+                "id": f"warm-{cache_key[-8:]}",
+                "problem": problem,
+                **stages["playbook"],
+                "trust_score": 0.7,
+                "from_quick_fix": False
+            }
+        playbook["ncert_refs"] = stages["ncert_refs"]
+        playbook["videos"] = stages["videos"]
+
+        # Incomplete playbooks are left for a real SOS to fill
+        if runner.partial:
+            return None if best_match else "llm_failed"
+        if ttl is None:
+            ttl = QUICK_FIX_TTL if best_match else GENERATED_TTL
+        await cache_playbook(cache_key, playbook, ttl, problem, context, pin=bool(best_match))
+        flight.publish(playbook)
+        return "quick_fix" if best_match else "llm"
+
+
+async def warm_cache(llm_budget: Optional[int] = None) -> dict:
+    """Warm the most demanded contexts, spending at most llm_budget LLM calls.
+
+    Contexts a quick fix answers cost no LLM call and are always warmed.
+    Every LLM call counts against the budget, including failed ones.
+    Without an LLM client only quick fixes are warmed, since the fallback
+    playbook is not worth caching.
+    """
+    budget = settings.cache_warm_llm_budget if llm_budget is None else llm_budget
+    if llm_client is None:
+        budget = 0
+
+    started = time.perf_counter()
+    counts: Counter = Counter()
+    for candidate in await asyncio.to_thread(warm_candidates, settings.cache_warm_max_candidates):
+        try:
+            llm_calls = counts["llm"] + counts["llm_failed"]
+            outcome = await warm_playbook(*candidate, use_llm=llm_calls < budget, ttl=settings.cache_warm_ttl)
+        except Exception as e:
+            print(f"Cache warm error for {candidate}: {e}")
+            outcome = None
+        counts[outcome or "skipped"] += 1
+
+    summary = {**counts, "seconds": round(time.perf_counter() - started, 1)}
+    print(f"🔥 Cache warmed: {summary}")
+    return summary
+
+
+async def revalidate_playbook(context: SOSContext, query_text: str) -> Optional[str]:
+    """Regenerate the stale cached playbook for an SOS context from its text.
+
+    A quick fix that got negative feedback under the key is skipped, so the
+    next best one or the LLM replaces it. A failed or incomplete
+    regeneration caches nothing, so the stale playbook is kept until its
+    hard TTL.
+    """
+    return await warm_playbook(
+        context.grade, context.subject, context.topic, context.language,
+        use_llm=llm_client is not None, refresh=True, problem=query_text
+    )
+
+
+async def claim_warm_run(window: date) -> bool:
+    """Let only one worker warm per off-peak window (any worker without Redis)."""
+    if not redis_ready():
+        return True
+    try:
+        claimed = await redis_client.set(f"{WARM_RUN_KEY}:{window.isoformat()}", WORKER_ID, nx=True, ex=86400)
+        breaker.record_success()
+        return bool(claimed)
+    except Exception as e:
+        breaker.record_failure()
+        print(f"Cache warm claim error: {e}")
+        return True
+
+
+async def warm_periodically():
+    """Warm the cache once in each off-peak window."""
+    last_window = None
+    while True:
+        await asyncio.sleep(settings.cache_warm_check_interval)
+        window = off_peak_window()
+        if not is_off_peak() or window == last_window:
+            continue
+        last_window = window
+        try:
+            if await claim_warm_run(window):
+                await warm_cache()
+        except Exception as e:
+            print(f"Cache warm error: {e}")
+
+
+def start_cache_warmer():
+    """Start the off-peak warm-up loop, if enabled."""
+    if settings.cache_warm_enabled:
+        run_in_background(warm_periodically())
@@ -0,0 +1,211 @@
+"""Local subject/topic classifier, so confidently classified SOS skip the LLM context call.
+
+Softmax logistic regression over hashed word and character-trigram
+features (without stopwords), one head per label. It is trained offline
+from quick_fixes.json, the topic keywords and SOS history and shipped as a
+compressed .npz artifact:
+
+    python -m app.services.context_classifier
+"""
+import json
+import zlib
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+from ..config import get_settings
+from .context_matcher import matcher, KEYWORDS_PATH
+from .embedding_service import HashedNgramEmbedder
+
+settings = get_settings()
+
+ARTIFACT_PATH = Path(__file__).parent.parent / "data" / "context_classifier.npz"
+
+FEATURE_DIM = 4096
+LABELS = ("subject", "topic")
+
+# Problem type follows from the topic; everything else is a concept gap
+PROBLEM_TYPES = {
+    "Attention": "attention",
+    "Listening": "attention",
+    "Participation": "behavior",
+    "Classroom Management": "behavior",
+    "Values": "behavior",
+}
+
+
+class ContextClassifier:
+    """Hashed n-gram logistic regression predicting subject and topic.
+
+    weights[label] is a (FEATURE_DIM + 1) x classes matrix, the last row
+    being the bias. Confidence is the lowest of the heads' top
+    probabilities, so a confident result is confident on every label.
+    """
+
+    def __init__(self, weights: dict, classes: dict, dim: int = FEATURE_DIM):
+        self.weights = weights
+        self.classes = classes
+        self.dim = dim
+        self._features = HashedNgramEmbedder(dim, drop_stopwords=True)
+
+    def vectorize(self, texts: Iterable[str]) -> np.ndarray:
+        """Rows of L2-normalized, signed hashed feature counts plus a bias column."""
+        texts = list(texts)
+        matrix = np.zeros((len(texts), self.dim + 1), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features.features(text):
+                hashed = zlib.crc32(feature.encode("utf-8"))
+                matrix[row, hashed % self.dim] += 1.0 if hashed & 0x80000000 else -1.0
+            norm = np.linalg.norm(matrix[row])
+            if norm:
+                matrix[row] /= norm
+            matrix[row, self.dim] = 1.0
+        return matrix
+
+    def predict(self, text: str) -> dict:
+        """Get {label: value} plus "confidence" for a text."""
+        vector = self.vectorize([text])[0]
+        result = {}
+        confidence = 1.0
+        for label in LABELS:
+            probs = softmax(vector @ self.weights[label].astype(np.float32))
+            best = int(probs.argmax())
+            result[label] = self.classes[label][best]
+            confidence = min(confidence, float(probs[best]))
+        result["confidence"] = confidence
+        return result
+
+    def save(self, path: Path = ARTIFACT_PATH):
+        arrays = {}
+        for label in LABELS:
+            arrays[f"{label}_weights"] = self.weights[label].astype(np.float16)
+            arrays[f"{label}_classes"] = np.array(self.classes[label])
+        np.savez_compressed(path, dim=self.dim, **arrays)
+
+    @classmethod
+    def load(cls, path: Path = ARTIFACT_PATH) -> "ContextClassifier":
+        with np.load(path) as data:
+            return cls(
+                {label: data[f"{label}_weights"] for label in LABELS},
+                {label: [str(c) for c in data[f"{label}_classes"]] for label in LABELS},
+                int(data["dim"])
+            )
+
+
+def softmax(scores: np.ndarray) -> np.ndarray:
+    exp = np.exp(scores - scores.max(axis=-1, keepdims=True))
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+def training_examples() -> list:
+    """(text, subject, topic) from quick fixes in every language, topic keywords and labelled SOS."""
+    # Imported here because these pull in the RAG service and the database
+    from .rag_service import load_quick_fixes
+    from ..data.mock_db import get_all_sos
+
+    examples = []
+    for fix in load_quick_fixes():
+        for field in ("problem", "problem_en", "problem_hi", "problem_kn"):
+            if fix.get(field):
+                examples.append((fix[field], fix["subject"], fix["topic"]))
+
+    # Keywords of topics the quick fixes cover, under those fixes' subject
+    subjects = {topic: subject for _, subject, topic in examples}
+    with open(KEYWORDS_PATH, encoding="utf-8") as f:
+        for item in json.load(f)["topic"]:
+            if item["value"] in subjects:
+                for keywords in item["keywords"].values():
+                    examples.extend((keyword, subjects[item["value"]], item["value"]) for keyword in keywords)
+
+    for sos in get_all_sos():
+        context = sos.get("context") or {}
+        if sos.get("request_text") and context.get("subject") and context.get("topic"):
+            examples.append((sos["request_text"], context["subject"], context["topic"]))
+    return examples
+
+
+def train(
+    examples: list,
+    dim: int = FEATURE_DIM,
+    epochs: int = 500,
+    learning_rate: float = 10.0,
+    l2: float = 1e-4
+) -> ContextClassifier:
+    """Fit each head with full-batch gradient descent on the cross-entropy."""
+    classes = {label: sorted({ex[i + 1] for ex in examples}) for i, label in enumerate(LABELS)}
+    classifier = ContextClassifier({}, classes, dim)
+    features = classifier.vectorize(ex[0] for ex in examples)
+
+    for i, label in enumerate(LABELS):
+        index = {value: position for position, value in enumerate(classes[label])}
+        targets = np.zeros((len(examples), len(classes[label])), dtype=np.float32)
+        targets[np.arange(len(examples)), [index[ex[i + 1]] for ex in examples]] = 1.0
+
+        weights = np.zeros((dim + 1, len(classes[label])), dtype=np.float32)
+        for _ in range(epochs):
+            gradient = features.T @ (softmax(features @ weights) - targets) / len(examples)
+            weights -= learning_rate * (gradient + l2 * weights)
+        classifier.weights[label] = weights
+    return classifier
+
+
+def build_artifact(path: Path = ARTIFACT_PATH) -> ContextClassifier:
+    """Train on current data and write the artifact."""
+    examples = training_examples()
+    classifier = train(examples)
+    classifier.save(path)
+    print(f"✅ Context classifier trained on {len(examples)} examples -> {path}")
+    return classifier
+
+
+# Global instance, loaded at startup by load_context_classifier
+classifier = None
+
+
+def load_context_classifier() -> Optional[ContextClassifier]:
+    """Load the classifier from its artifact (call from startup, off the event loop).
+
+    Nothing is trained here: without the artifact, context extraction uses
+    the LLM and keywords until one is built offline.
+    """
+    global classifier
+    try:
+        classifier = ContextClassifier.load()
+    except FileNotFoundError:
+        print(f"⚠️ Context classifier artifact missing at {ARTIFACT_PATH}, using the LLM and keywords")
+    except Exception as e:
+        print(f"Context classifier error: {e}")
+    return classifier
+
+
+def get_context_classifier() -> Optional[ContextClassifier]:
+    """Get the classifier, or None if it is not loaded."""
+    return classifier
+
+
+def classify_context(text: str) -> Optional[dict]:
+    """Extract context locally, or None when the LLM should be asked.
+
+    The grade comes from the keyword matcher; subject, topic and problem
+    type from the classifier, if its confidence reaches
+    settings.context_classifier_threshold. Before the classifier is loaded
+    (or without its artifact) this is always None.
+    """
+    model = get_context_classifier()
+    if not model or not text:
+        return None
+
+    prediction = model.predict(text)
+    if prediction["confidence"] < settings.context_classifier_threshold:
+        return None
+    return {
+        "grade": matcher.match(text).get("grade"),
+        "subject": prediction["subject"],
+        "topic": prediction["topic"],
+        "problem_type": PROBLEM_TYPES.get(prediction["topic"], "understanding")
+    }
+
+
+if __name__ == "__main__":
+    build_artifact()
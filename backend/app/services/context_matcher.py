@@ -0,0 +1,123 @@
+"""Keyword-based context extraction (the fallback when no LLM is available)."""
+import json
+import re
+from pathlib import Path
+
+from ..utils.text import normalize_text, TOKEN_CHARS
+
+KEYWORDS_PATH = Path(__file__).parent.parent / "data" / "context_keywords.json"
+
+DEFAULT_SUBJECT = "General"
+DEFAULT_TOPIC = "General classroom issue"
+
+
+class KeywordMatcher:
+    """One compiled regex over every grade, subject and topic keyword.
+
+    Each keyword maps to (field, value, rank); entries earlier in the
+    keyword table have a lower rank and win when several values of a field
+    match. The regex is built from a trie of the keywords, so each position
+    is checked against all keywords at once. It is wrapped in a lookahead,
+    so a single scan over the text finds overlapping keywords too, and a
+    longer keyword carries the entries of the shorter keywords it starts
+    with.
+
+    Keywords only match at the start of a token. English keywords must also
+    end the token (plurals allowed); Hindi and Kannada ones are stems that
+    may take a suffix ("पढ़" matches "पढ़ने").
+    """
+
+    def __init__(self, table: dict):
+        self.entries: dict = {}  # keyword without spaces -> [(field, value, rank)]
+        self.keywords: dict = {}  # keyword without spaces -> keyword
+
+        grade = table["grade"]
+        for n in range(grade["min"], grade["max"] + 1):
+            for pattern in grade["patterns"]:
+                self._add(pattern.format(n=n), "grade", n, n)
+
+        for field in ("subject", "topic"):
+            for rank, item in enumerate(table[field]):
+                for keywords in item["keywords"].values():
+                    for keyword in keywords:
+                        self._add(keyword, field, item["value"], rank)
+
+        # A match of "पढ़ना" must also count as "पढ़"
+        for keyword, entries in self.entries.items():
+            for other, other_entries in self.entries.items():
+                if other != keyword and keyword.startswith(other):
+                    entries.extend(e for e in other_entries if e not in entries)
+
+        trie: dict = {}
+        for keyword in self.keywords.values():
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[""] = True
+        self.pattern = re.compile(f"(?<![{TOKEN_CHARS}])(?=(" + self._trie_regex(trie) + "))")
+        self._spaces = re.compile(r"\s+")
+
+    def _add(self, keyword: str, field: str, value, rank: int):
+        keyword = normalize_text(keyword)
+        key = keyword.replace(" ", "")
+        self.keywords.setdefault(key, keyword)
+        entry = (field, value, rank)
+        entries = self.entries.setdefault(key, [])
+        if entry not in entries:
+            entries.append(entry)
+
+    @classmethod
+    def _trie_regex(cls, node: dict, char: str = "") -> str:
+        """Regex for a keyword trie; shared prefixes are matched once.
+
+        Greedy alternatives make the longest keyword at a position win.
+        """
+        branches = []
+        for next_char, child in sorted((k, v) for k, v in node.items() if k):
+            atom = r"\s*" if next_char == " " else re.escape(next_char)
+            branches.append(atom + cls._trie_regex(child, next_char))
+        if "" in node:
+            branches.append(cls._keyword_end(char))
+        return branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+
+    @staticmethod
+    def _keyword_end(char: str) -> str:
+        """Assertion after a keyword ending in char."""
+        if char.isdigit():
+            # "grade 1" must not match "grade 10"
+            return r"(?!\d)"
+        if char.isascii():
+            # "fraction" matches "fractions" but not "fractional"
+            return f"(?=(?:e?s)?(?![{TOKEN_CHARS}]))"
+        return ""
+
+    def match(self, text: str) -> dict:
+        """Get {field: best-ranked value} for the keywords found in text."""
+        best: dict = {}
+        for found in self.pattern.finditer(normalize_text(text)):
+            keyword = found.group(1)
+            entries = self.entries.get(keyword) or self.entries.get(self._spaces.sub("", keyword), ())
+            for field, value, rank in entries:
+                if field not in best or rank < best[field][1]:
+                    best[field] = (value, rank)
+        return {field: value for field, (value, _) in best.items()}
+
+
+def load_matcher() -> KeywordMatcher:
+    with open(KEYWORDS_PATH, encoding="utf-8") as f:
+        return KeywordMatcher(json.load(f))
+
+
+# Global instance, compiled at import
+matcher = load_matcher()
+
+
+def extract_context_fallback(text: str) -> dict:
+    """Fallback context extraction using keywords."""
+    found = matcher.match(text)
+    return {
+        "grade": found.get("grade"),
+        "subject": found.get("subject", DEFAULT_SUBJECT),
+        "topic": found.get("topic", DEFAULT_TOPIC),
+        "problem_type": "other"
+    }
@@ -0,0 +1,92 @@
+"""Hashed n-gram embeddings for multilingual SOS text."""
+import math
+import zlib
+from typing import Iterable
+
+from ..utils.text import tokenize, char_ngrams, fold_token, is_stopword
+
+EMBEDDING_DIM = 4096
+
+
+class HashedNgramEmbedder:
+    """Embed text as IDF-weighted hashed word and character-trigram features.
+
+    Needs no model download and treats Hindi, Kannada, English and Hinglish
+    alike. Vectors are sparse dicts of index -> weight with unit L2 norm.
+    With drop_stopwords, filler words ("बच्चे", "नहीं", "students") are left
+    out so they cannot make unrelated problems look alike.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM, drop_stopwords: bool = False):
+        self.dim = dim
+        self.drop_stopwords = drop_stopwords
+        self.doc_freq: dict = {}
+        self.doc_count = 0
+
+    def features(self, text: str) -> list[str]:
+        """Get the word and character-trigram features of a text."""
+        features = []
+        for word in tokenize(text):
+            if self.drop_stopwords and is_stopword(fold_token(word)):
+                continue
+            features.append(f"w:{word}")
+            features.extend(char_ngrams(word))
+        return features
+
+    def fit(self, texts: Iterable[str]):
+        """Learn document frequencies so common phrasing is down-weighted."""
+        for text in texts:
+            self.doc_count += 1
+            for feature in set(self.features(text)):
+                self.doc_freq[feature] = self.doc_freq.get(feature, 0) + 1
+
+    def idf(self, feature: str) -> float:
+        return math.log((self.doc_count + 1) / (self.doc_freq.get(feature, 0) + 1)) + 1
+
+    def embed(self, text: str) -> dict:
+        """Embed a text as a sparse, L2-normalized vector."""
+        vector: dict = {}
+        for feature in self.features(text):
+            hashed = zlib.crc32(feature.encode("utf-8"))
+            index = hashed % self.dim
+            sign = 1.0 if hashed & 0x80000000 else -1.0
+            vector[index] = vector.get(index, 0.0) + sign * self.idf(feature)
+
+        norm = math.sqrt(sum(v * v for v in vector.values()))
+        if not norm:
+            return {}
+        return {index: value / norm for index, value in vector.items()}
+
+
+def cosine(a: dict, b: dict) -> float:
+    """Cosine similarity of two normalized sparse vectors."""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(index, 0.0) for index, value in a.items())
+
+
+def build_embedder() -> HashedNgramEmbedder:
+    """Build an embedder fitted on the quick fix problem statements."""
+    # Imported here because the RAG service itself embeds with this module
+    from .rag_service import load_quick_fixes
+
+    embedder = HashedNgramEmbedder()
+    embedder.fit(
+        fix[field]
+        for fix in load_quick_fixes()
+        for field in ("problem", "problem_en", "problem_hi", "problem_kn")
+        if fix.get(field)
+    )
+    return embedder
+
+
+# Global instance, built on first use
+embedder = None
+
+
+def get_embedder() -> HashedNgramEmbedder:
+    """Get embedder instance."""
+    global embedder
+    if embedder is None:
+        embedder = build_embedder()
+    return embedder
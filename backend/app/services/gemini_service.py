@@ -1,8 +1,11 @@
 """Gemini AI service for playbook generation."""
 import google.generativeai as genai
 from typing import Optional
+import asyncio
 import json
 from ..config import get_settings
+from .context_matcher import extract_context_fallback
+from .context_classifier import classify_context
 
 settings = get_settings()
 
@@ -10,6 +13,9 @@ settings = get_settings()
 if settings.gemini_api_key:
     genai.configure(api_key=settings.gemini_api_key)
 
+# Cap in-flight calls so a burst of SOS requests cannot exhaust the worker
+llm_semaphore = asyncio.Semaphore(settings.llm_max_concurrency)
+
 # Models
 FLASH_MODEL = "gemini-2.0-flash"  # For live responses
 BACKGROUND_MODEL = "gemini-2.0-flash"  # For background processing
@@ -63,6 +69,25 @@ IMPORTANT:
 """
 
 
+def format_playbook_prompt(
+    problem: str,
+    grade: int,
+    subject: str,
+    topic: str,
+    language: str,
+    constraints: Optional[list]
+) -> str:
+    """Fill the playbook prompt template."""
+    return PLAYBOOK_PROMPT.format(
+        grade=grade,
+        subject=subject,
+        topic=topic,
+        problem=problem,
+        language="Hindi" if language == "hi" else "English",
+        constraints=", ".join(constraints) if constraints else "None specified"
+    )
+
+
 async def generate_playbook(
     problem: str,
     grade: int,
@@ -79,16 +104,10 @@ async def generate_playbook(
     try:
         model = get_flash_model()
         
-        prompt = PLAYBOOK_PROMPT.format(
-            grade=grade,
-            subject=subject,
-            topic=topic,
-            problem=problem,
-            language="Hindi" if language == "hi" else "English",
-            constraints=", ".join(constraints) if constraints else "None specified"
-        )
+        prompt = format_playbook_prompt(problem, grade, subject, topic, language, constraints)
         
-        response = model.generate_content(prompt)
+        async with llm_semaphore:
+            response = await model.generate_content_async(prompt)
         response_text = response.text
         
         # Extract JSON from response
@@ -109,6 +128,38 @@ async def generate_playbook(
         return get_fallback_playbook(problem, grade, subject, topic, language)
 
 
+async def stream_playbook(
+    problem: str,
+    grade: int,
+    subject: str,
+    topic: str,
+    language: str = "hi",
+    constraints: Optional[list] = None
+):
+    """Stream a teaching playbook from Gemini as raw JSON text chunks.
+    
+    Raises if the API is not configured or the stream breaks, so callers
+    can tell a partial or missing playbook from a generated one.
+    """
+    
+    if not settings.gemini_api_key:
+        raise RuntimeError("Gemini API not configured")
+    
+    try:
+        model = get_flash_model()
+        prompt = format_playbook_prompt(problem, grade, subject, topic, language, constraints)
+        
+        async with llm_semaphore:
+            response = await model.generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+        
+    except Exception as e:
+        print(f"Gemini stream error: {e}")
+        raise
+
+
 def get_fallback_playbook(
     problem: str,
     grade: int,
@@ -174,6 +225,10 @@ def get_fallback_playbook(
 async def extract_context_from_text(text: str) -> dict:
     """Extract grade,subject, topic from natural language query."""
     
+    local = classify_context(text)
+    if local:
+        return local
+    
     if not settings.gemini_api_key:
         return extract_context_fallback(text)
     
@@ -193,7 +248,8 @@ Return JSON with:
 
 Only return valid JSON, no explanation."""
         
-        response = model.generate_content(prompt)
+        async with llm_semaphore:
+            response = await model.generate_content_async(prompt)
         response_text = response.text
         
         if "```" in response_text:
@@ -209,45 +265,3 @@ Only return valid JSON, no explanation."""
     except Exception as e:
         print(f"Context extraction error: {e}")
         return extract_context_fallback(text)
-
-
-def extract_context_fallback(text: str) -> dict:
-    """Fallback context extraction using keywords."""
-    text_lower = text.lower()
-    
-    # Detect grade
-    grade = None
-    for g in range(1, 9):
-        if f"grade {g}" in text_lower or f"class {g}" in text_lower or f"कक्षा {g}" in text:
-            grade = g
-            break
-    
-    # Detect subject
-    subject = "General"
-    subject_keywords = {
-        "Math": ["math", "गणित", "counting", "गिनती", "addition", "जोड़", "subtraction", "घटा"],
-        "Hindi": ["hindi", "हिंदी", "reading", "पढ़ना", "writing", "लिखना", "अक्षर"],
-        "English": ["english", "अंग्रेजी", "alphabet"],
-        "EVS": ["evs", "पर्यावरण", "science", "विज्ञान", "nature"]
-    }
-    
-    for subj, keywords in subject_keywords.items():
-        if any(kw in text_lower for kw in keywords):
-            subject = subj
-            break
-    
-    # Basic topic extraction
-    topic = "General classroom issue"
-    if "attention" in text_lower or "ध्यान" in text:
-        topic = "Attention"
-    elif "counting" in text_lower or "गिनती" in text:
-        topic = "Counting"
-    elif "reading" in text_lower or "पढ़" in text:
-        topic = "Reading"
-    
-    return {
-        "grade": grade,
-        "subject": subject,
-        "topic": topic,
-        "problem_type": "other"
-    }
@@ -0,0 +1,117 @@
+"""Hybrid lexical + dense retrieval fused with reciprocal rank fusion."""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from ..config import get_settings
+from .lexical_index import InvertedIndex
+from .vector_index import VectorIndex, PROBLEM_FIELDS, GENERAL_SUBJECT
+
+settings = get_settings()
+
+# Dense searches run here while the lexical search runs on the caller's thread
+# (NumPy releases the GIL for the matrix product)
+retrieval_executor = ThreadPoolExecutor(
+    max_workers=settings.retrieval_threads,
+    thread_name_prefix="retrieval"
+)
+
+
+class HybridRetriever:
+    """Run a BM25 index and a vector index over the same documents and fuse them.
+
+    Both indexes are filled in the same order, so a document index means the
+    same document in each. Results are ranked by reciprocal rank fusion; the
+    reported score is calibrated to 0-1 so thresholds mean the same thing for
+    every query:
+
+        score = (rrf / best possible rrf) * (strongest absolute match)
+
+    The second factor, the larger of the raw cosine and the normalized BM25
+    score, stops the top result of an off-topic query, which is still rank 1
+    in both lists, from scoring 1.0.
+    """
+
+    def __init__(
+        self,
+        lexical_text_fn: Callable[[dict], str],
+        dense_fields: tuple = PROBLEM_FIELDS,
+        dim: int = 512,
+        grade_window: int = 2,
+        rrf_k: int = 60
+    ):
+        self.dense = VectorIndex(dim=dim, grade_window=grade_window, text_fields=dense_fields)
+        self.lexical = InvertedIndex(lexical_text_fn)
+        self.grade_window = grade_window
+        self.rrf_k = rrf_k
+
+    @property
+    def documents(self) -> list:
+        return self.dense.documents
+
+    def __len__(self) -> int:
+        return len(self.dense)
+
+    def build(self, documents: list):
+        """Fit and fill both indexes."""
+        self.dense.build(documents)
+        self.lexical.build(documents)
+
+    def add(self, documents: list):
+        """Append documents to both indexes."""
+        self.dense.add(documents)
+        self.lexical.build(documents)
+
+    def lexical_filter(self, grade: Optional[int], subject: Optional[str]) -> Optional[set]:
+        """Documents allowed by the same grade/subject pre-filter as the vector index."""
+        if not grade and not (subject and subject.lower() != GENERAL_SUBJECT):
+            return None
+
+        grades = range(grade - self.grade_window, grade + self.grade_window + 1) if grade else None
+        subjects = [subject] if subject and subject.lower() != GENERAL_SUBJECT else None
+        allowed = self.lexical.docs_for(grades=grades, subjects=subjects)
+        return allowed | self.lexical.docs_for(subjects=[GENERAL_SUBJECT])
+
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        grade: Optional[int] = None,
+        subject: Optional[str] = None
+    ) -> list[dict]:
+        """Get up to k fused results, best first.
+
+        Each result has the document index, the calibrated fused score and the
+        dense similarity and normalized BM25 score it came from.
+        """
+        depth = k * 3
+        dense_future = retrieval_executor.submit(
+            self.dense.search, query, depth, grade, subject
+        )
+        lexical = self.lexical.normalized_search(
+            query, k=depth, allowed=self.lexical_filter(grade, subject)
+        )
+        dense = dense_future.result()
+
+        fused: dict = {}
+        for ranking in (dense, lexical):
+            for rank, (doc_index, _) in enumerate(ranking, start=1):
+                fused[doc_index] = fused.get(doc_index, 0.0) + 1 / (self.rrf_k + rank)
+
+        best_possible = 2 / (self.rrf_k + 1)
+        dense_scores = dict(dense)
+        lexical_scores = dict(lexical)
+
+        results = []
+        for doc_index, rrf in fused.items():
+            similarity = dense_scores.get(doc_index, 0.0)
+            keyword = lexical_scores.get(doc_index, 0.0)
+            strength = max(similarity, keyword, 0.0)
+            results.append({
+                "index": doc_index,
+                "score": (rrf / best_possible) * strength,
+                "dense": similarity,
+                "lexical": keyword
+            })
+
+        results.sort(key=lambda r: r["score"], reverse=True)
+        return results[:k]
@@ -0,0 +1,141 @@
+"""Inverted keyword index with BM25 scoring."""
+import math
+from collections import Counter
+from typing import Any, Callable, Iterable, Optional
+
+from ..utils.text import index_terms
+
+
+class InvertedIndex:
+    """BM25 index over documents built once and extended incrementally.
+
+    Each term maps to a posting list of {document index: term frequency}, and
+    documents are also listed per grade and per subject, so a query only
+    touches the postings of its own terms within the allowed documents.
+    With keep_fn, only what it returns (e.g. the ID) is kept per document.
+    """
+
+    def __init__(
+        self,
+        text_fn: Callable[[dict], str],
+        k1: float = 1.2,
+        b: float = 0.75,
+        keep_fn: Optional[Callable[[dict], Any]] = None
+    ):
+        self.text_fn = text_fn
+        self.keep_fn = keep_fn
+        self.k1 = k1
+        self.b = b
+        self.documents: list = []
+        self.postings: dict = {}
+        self.doc_lengths: list = []
+        self.total_length = 0
+        self.grade_docs: dict = {}
+        self.subject_docs: dict = {}
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def build(self, documents: Iterable[dict]):
+        """Index a batch of documents."""
+        for doc in documents:
+            self.add(doc)
+
+    def add(self, doc: dict) -> int:
+        """Index one document and return its index."""
+        doc_index = len(self.documents)
+        self.documents.append(self.keep_fn(doc) if self.keep_fn else doc)
+
+        terms = index_terms(self.text_fn(doc))
+        for term, count in Counter(terms).items():
+            self.postings.setdefault(term, {})[doc_index] = count
+        self.doc_lengths.append(len(terms))
+        self.total_length += len(terms)
+
+        self.grade_docs.setdefault(doc.get("grade"), set()).add(doc_index)
+        self.subject_docs.setdefault((doc.get("subject") or "").lower(), set()).add(doc_index)
+        return doc_index
+
+    def idf(self, term: str) -> float:
+        doc_freq = len(self.postings.get(term, ()))
+        count = len(self.documents)
+        return math.log(1 + (count - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    def docs_for(
+        self,
+        grades: Optional[Iterable[int]] = None,
+        subjects: Optional[Iterable[str]] = None
+    ) -> Optional[set]:
+        """Get the documents in any of the given grades and any of the subjects.
+
+        Returns None (no restriction) when neither filter is given.
+        """
+        allowed = None
+        if grades is not None:
+            allowed = set().union(*(self.grade_docs.get(g, set()) for g in grades))
+        if subjects is not None:
+            subject_docs = set().union(*(self.subject_docs.get(s.lower(), set()) for s in subjects))
+            allowed = subject_docs if allowed is None else allowed & subject_docs
+        return allowed
+
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        allowed: Optional[set] = None
+    ) -> list[tuple[int, float]]:
+        """Get up to k (document index, BM25 score) pairs, best first."""
+        if not self.documents:
+            return []
+
+        scores: dict = {}
+        for term in set(index_terms(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            for doc_index, freq in postings.items():
+                if allowed is not None and doc_index not in allowed:
+                    continue
+                scores[doc_index] = scores.get(doc_index, 0.0) + self.term_score(term, doc_index, freq)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:k]
+
+    def term_score(self, term: str, doc_index: int, freq: int) -> float:
+        """BM25 contribution of one term to one document."""
+        avg_length = self.total_length / len(self.documents) or 1.0
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_index] / avg_length)
+        return self.idf(term) * freq * (self.k1 + 1) / (freq + norm)
+
+    def max_score(self, query: str) -> float:
+        """Highest BM25 score any document could reach for the query.
+
+        Each known term adds its best contribution over all documents, and
+        each term that appears in no document adds what it would score in an
+        average-length document that used it once. Normalized scores therefore
+        only reach 1 when a document matches every query term as well as any
+        document could, so one shared incidental word cannot.
+        """
+        ceiling = 0.0
+        for term in set(index_terms(query)):
+            postings = self.postings.get(term)
+            if postings:
+                ceiling += max(self.term_score(term, doc_index, freq) for doc_index, freq in postings.items())
+            else:
+                ceiling += self.idf(term)
+        return ceiling
+
+    def normalized_search(
+        self,
+        query: str,
+        k: int = 5,
+        allowed: Optional[set] = None
+    ) -> list[tuple[int, float]]:
+        """Like search, with scores divided by max_score (so 0-1)."""
+        ceiling = self.max_score(query)
+        if not ceiling:
+            return []
+        return [
+            (doc_index, score / ceiling)
+            for doc_index, score in self.search(query, k, allowed)
+        ]
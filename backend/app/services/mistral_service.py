@@ -1,8 +1,11 @@
 """Mistral AI service for playbook generation."""
 from mistralai import Mistral
 from typing import Optional
+import asyncio
 import json
 from ..config import get_settings
+from .context_matcher import extract_context_fallback
+from .context_classifier import classify_context
 
 settings = get_settings()
 
@@ -11,6 +14,9 @@ client = None
 if settings.mistral_api_key:
     client = Mistral(api_key=settings.mistral_api_key)
 
+# Cap in-flight calls so a burst of SOS requests cannot exhaust the worker
+llm_semaphore = asyncio.Semaphore(settings.llm_max_concurrency)
+
 # Use Mistral Small for fast responses (good balance of speed/quality)
 MODEL = "mistral-small-latest"
 
@@ -54,39 +60,59 @@ IMPORTANT:
 """
 
 
+def format_playbook_prompt(
+    problem: str,
+    grade: int,
+    subject: str,
+    topic: str,
+    language: str,
+    constraints: Optional[list]
+) -> str:
+    """Fill the playbook prompt template."""
+    return PLAYBOOK_PROMPT.format(
+        grade=grade,
+        subject=subject,
+        topic=topic,
+        problem=problem,
+        language="Hindi" if language == "hi" else "English",
+        constraints=", ".join(constraints) if constraints else "None specified"
+    )
+
+
 async def generate_playbook(
     problem: str,
     grade: int,
     subject: str,
     topic: str,
     language: str = "hi",
-    constraints: Optional[list] = None
+    constraints: Optional[list] = None,
+    raise_errors: bool = False
 ) -> dict:
-    """Generate a teaching playbook using Mistral AI."""
+    """Generate a teaching playbook using Mistral AI.
+    
+    With raise_errors, failures raise instead of returning the fallback
+    playbook, so callers that cache the result can tell the two apart.
+    """
     
     if not client:
+        if raise_errors:
+            raise RuntimeError("Mistral API not configured")
         print("Mistral API not configured, using fallback")
         return get_fallback_playbook(problem, grade, subject, topic, language)
     
     try:
-        prompt = PLAYBOOK_PROMPT.format(
-            grade=grade,
-            subject=subject,
-            topic=topic,
-            problem=problem,
-            language="Hindi" if language == "hi" else "English",
-            constraints=", ".join(constraints) if constraints else "None specified"
-        )
+        prompt = format_playbook_prompt(problem, grade, subject, topic, language, constraints)
         
-        response = client.chat.complete(
-            model=MODEL,
-            messages=[
-                {"role": "system", "content": "You are SAHAYAK AI, an expert teaching assistant. Always respond with valid JSON only."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=1024
-        )
+        async with llm_semaphore:
+            response = await client.chat.complete_async(
+                model=MODEL,
+                messages=[
+                    {"role": "system", "content": "You are SAHAYAK AI, an expert teaching assistant. Always respond with valid JSON only."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.7,
+                max_tokens=1024
+            )
         
         response_text = response.choices[0].message.content
         
@@ -106,9 +132,51 @@ async def generate_playbook(
         
     except Exception as e:
         print(f"❌ Mistral error: {e}")
+        if raise_errors:
+            raise
         return get_fallback_playbook(problem, grade, subject, topic, language)
 
 
+async def stream_playbook(
+    problem: str,
+    grade: int,
+    subject: str,
+    topic: str,
+    language: str = "hi",
+    constraints: Optional[list] = None
+):
+    """Stream a teaching playbook from Mistral AI as raw JSON text chunks.
+    
+    Raises if the API is not configured or the stream breaks, so callers
+    can tell a partial or missing playbook from a generated one.
+    """
+    
+    if not client:
+        raise RuntimeError("Mistral API not configured")
+    
+    try:
+        prompt = format_playbook_prompt(problem, grade, subject, topic, language, constraints)
+        
+        async with llm_semaphore:
+            response = await client.chat.stream_async(
+                model=MODEL,
+                messages=[
+                    {"role": "system", "content": "You are SAHAYAK AI, an expert teaching assistant. Always respond with valid JSON only."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.7,
+                max_tokens=1024
+            )
+            async for chunk in response:
+                content = chunk.data.choices[0].delta.content
+                if content:
+                    yield content
+        
+    except Exception as e:
+        print(f"❌ Mistral stream error: {e}")
+        raise
+
+
 def get_fallback_playbook(
     problem: str,
     grade: int,
@@ -174,6 +242,10 @@ def get_fallback_playbook(
 async def extract_context_from_text(text: str) -> dict:
     """Extract grade, subject, topic from natural language query using Mistral."""
     
+    local = classify_context(text)
+    if local:
+        return local
+    
     if not client:
         return extract_context_fallback(text)
     
@@ -191,15 +263,16 @@ Return JSON with:
 
 Only return valid JSON, no explanation."""
         
-        response = client.chat.complete(
-            model=MODEL,
-            messages=[
-                {"role": "system", "content": "You extract teaching context. Return only valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=256
-        )
+        async with llm_semaphore:
+            response = await client.chat.complete_async(
+                model=MODEL,
+                messages=[
+                    {"role": "system", "content": "You extract teaching context. Return only valid JSON."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.3,
+                max_tokens=256
+            )
         
         response_text = response.choices[0].message.content
         
@@ -216,51 +289,3 @@ Only return valid JSON, no explanation."""
     except Exception as e:
         print(f"Context extraction error: {e}")
         return extract_context_fallback(text)
-
-
-def extract_context_fallback(text: str) -> dict:
-    """Fallback context extraction using keywords."""
-    text_lower = text.lower()
-    
-    # Detect grade
-    grade = None
-    for g in range(1, 9):
-        if f"grade {g}" in text_lower or f"class {g}" in text_lower or f"कक्षा {g}" in text:
-            grade = g
-            break
-    
-    # Detect subject
-    subject = "General"
-    subject_keywords = {
-        "Math": ["math", "गणित", "counting", "गिनती", "addition", "जोड़", "subtraction", "घटा", "division", "multiply", "fraction"],
-        "Hindi": ["hindi", "हिंदी", "reading", "पढ़ना", "writing", "लिखना", "अक्षर"],
-        "English": ["english", "अंग्रेजी", "alphabet"],
-        "EVS": ["evs", "पर्यावरण", "science", "विज्ञान", "nature"]
-    }
-    
-    for subj, keywords in subject_keywords.items():
-        if any(kw in text_lower for kw in keywords):
-            subject = subj
-            break
-    
-    # Basic topic extraction
-    topic = "General classroom issue"
-    if "attention" in text_lower or "ध्यान" in text:
-        topic = "Attention"
-    elif "counting" in text_lower or "गिनती" in text:
-        topic = "Counting"
-    elif "reading" in text_lower or "पढ़" in text:
-        topic = "Reading"
-    elif "fraction" in text_lower or "भिन्न" in text:
-        topic = "Fractions"
-    elif "division" in text_lower or "भाग" in text:
-        topic = "Division"
-    elif "place value" in text_lower:
-        topic = "Place Value"
-    
-    return {
-        "grade": grade,
-        "subject": subject,
-        "topic": topic,
-        "problem_type": "other"
-    }
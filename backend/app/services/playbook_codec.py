@@ -0,0 +1,105 @@
+"""Compact Redis encoding for cached playbooks.
+
+A cached playbook is a version byte followed by zlib-compressed compact
+JSON. Its NCERT refs and videos are the same few objects across thousands
+of playbooks, so each is stored once under a content-addressed ID and the
+playbook keeps only {"$ref": ID} stubs (plus per-use fields such as the
+relevance score), joined back at read time.
+"""
+import hashlib
+import json
+import zlib
+from typing import Iterable
+
+FORMAT_VERSION = 1
+
+# Playbook lists whose items are stored by ID
+SHARED_FIELDS = ("ncert_refs", "videos")
+
+# Item fields that differ per playbook and stay inline
+PER_USE_FIELDS = ("relevance_score",)
+
+REF_PREFIX = "sahayak:ref"
+
+
+def dumps(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def ref_key(ref_id: str) -> str:
+    return f"{REF_PREFIX}:{ref_id}"
+
+
+def ref_id(item: dict) -> str:
+    """Content-addressed ID of an item's shared fields."""
+    shared = {k: v for k, v in item.items() if k not in PER_USE_FIELDS}
+    return hashlib.md5(json.dumps(shared, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def split_refs(playbook: dict) -> tuple[dict, dict]:
+    """Replace shared items with ID stubs; returns (slim playbook, {ID: item})."""
+    slim = dict(playbook)
+    refs = {}
+    for field in SHARED_FIELDS:
+        items = playbook.get(field)
+        if not isinstance(items, list):
+            continue
+        stubs = []
+        for item in items:
+            if not isinstance(item, dict):
+                stubs.append(item)
+                continue
+            item_id = ref_id(item)
+            refs[item_id] = {k: v for k, v in item.items() if k not in PER_USE_FIELDS}
+            stubs.append({"$ref": item_id, **{k: item[k] for k in PER_USE_FIELDS if k in item}})
+        slim[field] = stubs
+    return slim, refs
+
+
+def ref_ids(slim: dict) -> set:
+    """IDs of the shared items a slim playbook points to."""
+    return {
+        item["$ref"]
+        for field in SHARED_FIELDS
+        for item in slim.get(field) or ()
+        if isinstance(item, dict) and "$ref" in item
+    }
+
+
+def join_refs(slim: dict, refs: dict) -> dict:
+    """Put shared items back in place of their stubs.
+
+    Raises KeyError for an ID missing from refs, rather than returning a
+    playbook with its refs or videos silently emptied.
+    """
+    playbook = dict(slim)
+    for field in SHARED_FIELDS:
+        items = slim.get(field)
+        if not isinstance(items, list):
+            continue
+        joined = []
+        for item in items:
+            if isinstance(item, dict) and "$ref" in item:
+                shared = refs[item["$ref"]]
+                item = {**shared, **{k: v for k, v in item.items() if k != "$ref"}}
+            joined.append(item)
+        playbook[field] = joined
+    return playbook
+
+
+def encode_playbook(slim: dict) -> bytes:
+    return bytes([FORMAT_VERSION]) + zlib.compress(dumps(slim), 6)
+
+
+def decode_playbook(raw: bytes) -> dict:
+    """Decode a cached playbook; plain JSON from older entries is accepted too."""
+    if raw[:1] == b"{":
+        return json.loads(raw)
+    if raw[0] != FORMAT_VERSION:
+        raise ValueError(f"Unknown playbook encoding version {raw[0]}")
+    return json.loads(zlib.decompress(raw[1:]))
+
+
+def encode_refs(refs: dict) -> Iterable[tuple[str, bytes]]:
+    """(Redis key, value) for each shared item."""
+    return ((ref_key(item_id), dumps(item)) for item_id, item in refs.items())
@@ -1,10 +1,18 @@
 """RAG service with ChromaDB for pedagogy retrieval."""
 import json
+import threading
 from typing import Optional
 from pathlib import Path
 
-# Mock RAG - in production would use ChromaDB
-# For demo, we use simple keyword matching
+from ..config import get_settings
+from ..data.mock_db import get_solutions, get_solution
+from .hybrid_retriever import HybridRetriever
+from .lexical_index import InvertedIndex
+
+# Quick fixes and NCERT references are retrieved by fusing an in-process
+# NumPy vector index with a BM25 keyword index; shared solutions use BM25
+
+settings = get_settings()
 
 DATA_DIR = Path(__file__).parent.parent / "data"
 
@@ -18,6 +26,22 @@ def load_quick_fixes() -> list:
         return []
 
 
+def quick_fix_text(fix: dict) -> str:
+    """Text indexed for a quick fix; the topic counts double."""
+    problems = " ".join(fix.get(field, "") for field in ("problem", "problem_en", "problem_hi", "problem_kn"))
+    return f"{problems} {fix.get('topic', '')} {fix.get('topic', '')}"
+
+
+def ncert_ref_text(ref: dict) -> str:
+    """Text indexed for an NCERT reference; the topic counts double."""
+    return f"{ref.get('topic', '')} {ref.get('topic', '')} {ref.get('chapter', '')}"
+
+
+def solution_text(solution: dict) -> str:
+    """Text indexed for a shared solution; the topic counts double."""
+    return f"{solution.get('problem', '')} {solution.get('solution', '')} {solution.get('topic', '')} {solution.get('topic', '')}"
+
+
 def load_ncert_refs() -> list:
     """Load NCERT references."""
     try:
@@ -33,6 +57,50 @@ class MockRAGService:
     def __init__(self):
         self.quick_fixes = load_quick_fixes()
         self.ncert_refs = load_ncert_refs()
+        
+        self.quick_fix_retriever = HybridRetriever(
+            quick_fix_text,
+            dim=settings.vector_index_dim,
+            grade_window=settings.vector_grade_window,
+            rrf_k=settings.rrf_k
+        )
+        self.quick_fix_retriever.build(self.quick_fixes)
+        
+        self.ncert_retriever = HybridRetriever(
+            ncert_ref_text,
+            dense_fields=("topic", "chapter"),
+            dim=settings.vector_index_dim,
+            rrf_k=settings.rrf_k
+        )
+        self.ncert_retriever.build(self.ncert_refs)
+        
+        # Only solution IDs are indexed; records are read from the repository
+        # so usage and trust are current. The stored solutions are indexed on
+        # the first search, so importing this module opens no database.
+        self.solution_index = InvertedIndex(solution_text, keep_fn=lambda solution: solution["id"])
+        self.solution_ids: set = set()
+        self.solution_lock = threading.Lock()
+        self.solutions_loaded = False
+    
+    def add_quick_fixes(self, fixes: list):
+        """Add community or state-authored fixes to the knowledge base."""
+        self.quick_fixes.extend(fixes)
+        self.quick_fix_retriever.add(fixes)
+    
+    def index_solution(self, solution: dict):
+        """Make a newly shared solution searchable (once)."""
+        with self.solution_lock:
+            if solution["id"] not in self.solution_ids:
+                self.solution_ids.add(solution["id"])
+                self.solution_index.add(solution)
+    
+    def load_solutions(self):
+        """Index the stored shared solutions (once)."""
+        if self.solutions_loaded:
+            return
+        for solution in get_solutions():
+            self.index_solution(solution)
+        self.solutions_loaded = True
     
     def search_similar_problems(
         self,
@@ -41,41 +109,25 @@ class MockRAGService:
         subject: Optional[str] = None,
         limit: int = 5
     ) -> list:
-        """Search for similar problems in the knowledge base."""
+        """Search for similar problems in the knowledge base.
         
-        query_lower = query.lower()
-        results = []
+        relevance_score is the calibrated fused score of the hybrid
+        retriever, pre-filtered on grade and subject.
+        """
         
-        for fix in self.quick_fixes:
-            score = 0
-            
-            # Check problem text match
-            problem_text = fix.get("problem", "") + " " + fix.get("problem_hi", "") + " " + fix.get("problem_en", "")
-            if any(word in problem_text.lower() for word in query_lower.split() if len(word) > 2):
-                score += 2
-            
-            # Check topic match
-            if fix.get("topic", "").lower() in query_lower or query_lower in fix.get("topic", "").lower():
-                score += 2
-            
-            # Check grade match
-            if grade and fix.get("grade") == grade:
-                score += 1
-            
-            # Check subject match
-            if subject and fix.get("subject", "").lower() == subject.lower():
-                score += 1
-            
-            if score > 0:
-                results.append({
-                    **fix,
-                    "relevance_score": min(score / 6, 1.0)
-                })
+        results = []
+        for hit in self.quick_fix_retriever.search(query, k=limit, grade=grade, subject=subject):
+            if hit["score"] < settings.retrieval_min_score:
+                continue
+            results.append({
+                **self.quick_fixes[hit["index"]],
+                "relevance_score": round(hit["score"], 3)
+            })
         
         # Sort by relevance and success rate
         results.sort(key=lambda x: (x["relevance_score"], x.get("success_rate", 0)), reverse=True)
         
-        return results[:limit]
+        return results
     
     def get_ncert_references(
         self,
@@ -86,23 +138,24 @@ class MockRAGService:
     ) -> list:
         """Get NCERT references for a topic."""
         
-        topic_lower = topic.lower()
-        topic_words = topic_lower.split()
         results = []
         
-        for ref in self.ncert_refs:
-            score = 0
-            
-            # Check topic match (more flexible)
-            ref_topic = ref.get("topic", "").lower()
-            ref_chapter = ref.get("chapter", "").lower()
+        # Topic/chapter matches from the hybrid retriever, plus references in
+        # neighbouring grades
+        matches = {
+            hit["index"]: hit["score"]
+            for hit in self.ncert_retriever.search(topic, k=limit * 5)
+            if hit["score"] >= settings.retrieval_min_score
+        }
+        candidates = set(matches)
+        if grade:
+            candidates |= self.ncert_retriever.lexical.docs_for(grades=(grade - 1, grade, grade + 1))
+        
+        for doc_index in candidates:
+            ref = self.ncert_refs[doc_index]
             
-            for word in topic_words:
-                if len(word) > 2:  # Skip short words
-                    if word in ref_topic:
-                        score += 2
-                    if word in ref_chapter:
-                        score += 1
+            # Topic and chapter match
+            score = 3 * matches.get(doc_index, 0.0)
             
             # Check grade match
             if grade and ref.get("grade") == grade:
@@ -129,6 +182,38 @@ class MockRAGService:
         
         return results[:limit]
     
+    def search_solutions(
+        self,
+        query: str,
+        grade: Optional[int] = None,
+        subject: Optional[str] = None
+    ) -> list:
+        """Get current shared solutions matching a query, best BM25 match first.
+        
+        Solutions whose topic contains the query ("read" in "Reading") come
+        after the BM25 matches; that lookup goes to the repository, so it
+        also finds solutions shared on other workers, which are then indexed.
+        """
+        self.load_solutions()
+        with self.solution_lock:
+            allowed = self.solution_index.docs_for(
+                grades=[grade] if grade else None,
+                subjects=[subject] if subject else None
+            )
+            hits = self.solution_index.search(query, k=len(self.solution_index), allowed=allowed)
+            ids = [self.solution_index.documents[doc_index] for doc_index, _ in hits]
+        
+        topic_matches = {}
+        for solution in get_solutions(query, grade):
+            if subject and (solution.get("subject") or "").lower() != subject.lower():
+                continue
+            self.index_solution(solution)
+            topic_matches[solution["id"]] = solution
+        ids += [solution_id for solution_id in topic_matches if solution_id not in ids]
+        
+        solutions = (topic_matches.get(solution_id) or get_solution(solution_id) for solution_id in ids)
+        return [solution for solution in solutions if solution]
+    
     def get_top_quick_fixes(self, limit: int = 50) -> list:
         """Get top quick fixes by usage."""
         fixes = sorted(
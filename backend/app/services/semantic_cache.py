@@ -0,0 +1,243 @@
+"""Semantic cache: find cached playbooks for near-duplicate SOS texts."""
+import json
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from ..config import get_settings
+from .cache_service import get_problem_cache_key, redis_ready, redis_client, breaker
+from .embedding_service import get_embedder
+
+settings = get_settings()
+
+SEMANTIC_INDEX_PREFIX = "sahayak:semantic"
+
+# Store an entry in a scope's hash and its expiry time in the scope's sorted
+# set, drop expired entries and then the soonest-expiring ones over the cap,
+# and keep both keys alive as long as their longest-lived entry.
+# KEYS: hash, sorted set; ARGV: field, value, expires_at, now, max_entries, ttl
+ADD_ENTRY_SCRIPT = """
+redis.call("hset", KEYS[1], ARGV[1], ARGV[2])
+redis.call("zadd", KEYS[2], ARGV[3], ARGV[1])
+local expired = redis.call("zrangebyscore", KEYS[2], "-inf", ARGV[4])
+for _, field in ipairs(expired) do
+    redis.call("hdel", KEYS[1], field)
+end
+redis.call("zremrangebyscore", KEYS[2], "-inf", ARGV[4])
+local excess = redis.call("zcard", KEYS[2]) - tonumber(ARGV[5])
+if excess > 0 then
+    for _, field in ipairs(redis.call("zrange", KEYS[2], 0, excess - 1)) do
+        redis.call("hdel", KEYS[1], field)
+    end
+    redis.call("zremrangebyrank", KEYS[2], 0, excess - 1)
+end
+for _, key in ipairs(KEYS) do
+    if redis.call("ttl", key) < tonumber(ARGV[6]) then
+        redis.call("expire", key, ARGV[6])
+    end
+end
+return 0
+"""
+
+
+def get_scope(grade: Optional[int], subject: Optional[str], language: Optional[str]) -> str:
+    """Get the filter scope; only SOS texts in the same scope are compared."""
+    return f"{grade or 0}:{(subject or 'general').lower()}:{language or 'hi'}"
+
+
+class ScopeEntries:
+    """The entries of one scope, with their vectors stacked for NumPy.
+
+    Each entry is (sparse vector, cache key, text, expires_at). The sparse
+    vectors are flattened into parallel arrays of (row, feature index,
+    value), rebuilt after a change, so a lookup is one gather and one
+    bincount instead of a Python loop over the entries.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: OrderedDict = OrderedDict()
+        self._arrays: Optional[tuple] = None
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, problem_key: str) -> bool:
+        return problem_key in self.entries
+
+    def put(self, problem_key: str, vector: dict, cache_key: str, text: str, expires_at: float):
+        self.entries.pop(problem_key, None)
+        self.entries[problem_key] = (vector, cache_key, text, expires_at)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self._arrays = None
+
+    def prune(self, now: float):
+        """Drop entries whose playbook has expired."""
+        expired = [key for key, entry in self.entries.items() if entry[3] <= now]
+        for key in expired:
+            del self.entries[key]
+        if expired:
+            self._arrays = None
+
+    def arrays(self) -> tuple:
+        if self._arrays is None:
+            rows, indexes, values = [], [], []
+            for row, (vector, _, _, _) in enumerate(self.entries.values()):
+                rows.extend([row] * len(vector))
+                indexes.extend(vector.keys())
+                values.extend(vector.values())
+            self._arrays = (
+                np.array(rows, dtype=np.int32),
+                np.array(indexes, dtype=np.int32),
+                np.array(values, dtype=np.float32),
+                list(self.entries.values())
+            )
+        return self._arrays
+
+    def best(self, query: np.ndarray) -> tuple[float, Optional[tuple]]:
+        """Get (cosine, entry) of the entry most similar to a dense query vector."""
+        rows, indexes, values, entries = self.arrays()
+        if not entries:
+            return 0.0, None
+        scores = np.bincount(rows, weights=values * query[indexes], minlength=len(entries))
+        best = int(scores.argmax())
+        return float(scores[best]), entries[best]
+
+
+class SemanticCache:
+    """Nearest-neighbour lookup from SOS text to a cached playbook key.
+
+    Entries are kept per (grade, subject, language) scope in process memory
+    and mirrored to Redis, per scope a hash of entries and a sorted set of
+    their expiry times. An entry expires with the playbook it points to,
+    each scope keeps at most max_entries, and a worker re-reads a scope
+    from Redis every refresh_interval seconds to pick up entries other
+    workers have added.
+    """
+
+    def __init__(self, threshold: float, near_miss: float, max_entries: int, refresh_interval: float):
+        self.threshold = threshold
+        self.near_miss = near_miss
+        self.max_entries = max_entries
+        self.refresh_interval = refresh_interval
+        self._scopes: dict = {}
+        self._loaded_at: dict = {}
+
+    def _scope(self, scope: str) -> ScopeEntries:
+        entries = self._scopes.get(scope)
+        if entries is None:
+            entries = self._scopes[scope] = ScopeEntries(self.max_entries)
+        return entries
+
+    def _remember(self, scope: str, text: str, cache_key: str, expires_at: float):
+        entries = self._scope(scope)
+        entries.put(get_problem_cache_key(text), get_embedder().embed(text), cache_key, text, expires_at)
+
+    async def _load_scope(self, scope: str):
+        """Merge a scope's entries from Redis, at most every refresh_interval seconds."""
+        loaded_at = self._loaded_at.get(scope)
+        if loaded_at is not None and time.monotonic() - loaded_at < self.refresh_interval:
+            return
+        if not redis_ready():
+            return
+        # Set before the read, so concurrent lookups do not load it again
+        self._loaded_at[scope] = time.monotonic()
+
+        try:
+            stored = await redis_client.hgetall(f"{SEMANTIC_INDEX_PREFIX}:{scope}")
+            breaker.record_success()
+        except Exception as e:
+            breaker.record_failure()
+            print(f"Semantic cache load error: {e}")
+            return
+
+        entries = self._scope(scope)
+        now = time.time()
+        for problem_key, raw in stored.items():
+            entry = json.loads(raw)
+            # Texts this worker has seen keep their vector
+            if problem_key not in entries and entry.get("expires_at", 0) > now:
+                self._remember(scope, entry["text"], entry["cache_key"], entry["expires_at"])
+
+    async def lookup(
+        self,
+        text: str,
+        grade: Optional[int],
+        subject: Optional[str],
+        language: Optional[str]
+    ) -> Optional[str]:
+        """Get the cache key of the most similar SOS above the threshold."""
+        scope = get_scope(grade, subject, language)
+        await self._load_scope(scope)
+
+        entries = self._scopes.get(scope)
+        if not entries:
+            return None
+        entries.prune(time.time())
+
+        query = np.zeros(get_embedder().dim, dtype=np.float32)
+        for index, value in get_embedder().embed(text).items():
+            query[index] = value
+        best_score, best = entries.best(query)
+        if best is None:
+            return None
+
+        _, best_key, best_text, _ = best
+        if best_score >= self.threshold:
+            print(f"🧠 Semantic cache hit ({best_score:.2f}): '{text[:40]}' ~ '{best_text[:40]}'")
+            return best_key
+        if best_score >= self.near_miss:
+            print(f"🧠 Semantic cache near-miss ({best_score:.2f}): '{text[:40]}' ~ '{best_text[:40]}'")
+        return None
+
+    async def add(
+        self,
+        text: str,
+        grade: Optional[int],
+        subject: Optional[str],
+        language: Optional[str],
+        cache_key: str,
+        ttl: int
+    ):
+        """Remember for ttl seconds that a playbook for this SOS text is cached under cache_key."""
+        scope = get_scope(grade, subject, language)
+        expires_at = time.time() + ttl
+        self._remember(scope, text, cache_key, expires_at)
+
+        if not redis_ready():
+            return
+
+        try:
+            await redis_client.eval(
+                ADD_ENTRY_SCRIPT,
+                2,
+                f"{SEMANTIC_INDEX_PREFIX}:{scope}",
+                f"{SEMANTIC_INDEX_PREFIX}:{scope}:expiry",
+                get_problem_cache_key(text),
+                json.dumps({"text": text, "cache_key": cache_key, "expires_at": expires_at}, ensure_ascii=False),
+                expires_at,
+                time.time(),
+                self.max_entries,
+                ttl
+            )
+            breaker.record_success()
+        except Exception as e:
+            breaker.record_failure()
+            print(f"Semantic cache add error: {e}")
+
+
+# Global instance
+semantic_cache = SemanticCache(
+    threshold=settings.semantic_cache_threshold,
+    near_miss=settings.semantic_cache_near_miss,
+    max_entries=settings.semantic_cache_max_entries,
+    refresh_interval=settings.semantic_cache_refresh_interval
+)
+
+
+def get_semantic_cache() -> SemanticCache:
+    """Get semantic cache instance."""
+    return semantic_cache
@@ -0,0 +1,165 @@
+"""Columnar, NumPy-backed mirror of SOS history for vectorized analytics."""
+import threading
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+from ..data.mock_db import get_sos_changes, get_user_by_id, notify_sos_changed
+
+# Columns holding dictionary-encoded strings
+CODED_COLUMNS = ("teacher", "cluster", "district", "topic", "subject")
+
+# Values of the success column
+UNKNOWN, FAILED, SUCCESSFUL = -1, 0, 1
+
+
+class SOSColumns:
+    """SOS history as parallel arrays, one row per record.
+
+    Teacher, cluster, district, topic and subject are stored as integer
+    codes into per-column label lists; created_at is epoch seconds and
+    success is UNKNOWN/FAILED/SUCCESSFUL. The mirror catches up with the
+    repository's change sequence before each query, so records saved or
+    updated by any worker are included; their teachers are announced
+    through notify_sos_changed.
+    """
+
+    def __init__(self):
+        self.labels = {name: [] for name in CODED_COLUMNS}
+        self.codes = {name: {} for name in CODED_COLUMNS}
+        self.rows: dict = {}  # SOS ID -> row
+        self.last_seq = 0
+        self._size = 0
+        self._teachers: dict = {}
+        self._lock = threading.Lock()
+        self._columns = {name: np.zeros(0, dtype=np.int32) for name in CODED_COLUMNS}
+        self._created = np.zeros(0, dtype=np.float64)
+        self._success = np.zeros(0, dtype=np.int8)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def column(self, name: str) -> np.ndarray:
+        """View of a column's filled rows."""
+        if name == "created":
+            return self._created[:self._size]
+        if name == "success":
+            return self._success[:self._size]
+        return self._columns[name][:self._size]
+
+    def encode(self, name: str, value: str) -> int:
+        codes = self.codes[name]
+        if value not in codes:
+            codes[value] = len(codes)
+            self.labels[name].append(value)
+        return codes[value]
+
+    def code_of(self, name: str, value: str) -> int:
+        """Code of a value, or -1 if it has never been seen."""
+        return self.codes[name].get(value, -1)
+
+    def sync(self):
+        """Apply SOS records saved or updated since the last sync."""
+        with self._lock:
+            records, seq = get_sos_changes(self.last_seq)
+            for sos in records:
+                row = self.rows.get(sos["id"])
+                if row is None:
+                    self._append(sos)
+                else:
+                    self._success[row] = success_code(sos.get("success"))
+            self.last_seq = seq
+
+        # Records may come from other workers' writes
+        for teacher_id in {sos["teacher_id"] for sos in records}:
+            notify_sos_changed(teacher_id)
+
+    def _append(self, sos: dict):
+        teacher = self._teacher(sos["teacher_id"])
+        context = sos.get("context") or {}
+        row = self._size
+        self._reserve(row + 1)
+
+        self._columns["teacher"][row] = self.encode("teacher", sos["teacher_id"])
+        self._columns["cluster"][row] = self.encode("cluster", teacher.get("cluster") or "Unknown")
+        self._columns["district"][row] = self.encode("district", teacher.get("district") or "Unknown")
+        self._columns["topic"][row] = self.encode("topic", context.get("topic") or "Other")
+        self._columns["subject"][row] = self.encode("subject", context.get("subject") or "General")
+        self._created[row] = datetime.fromisoformat(sos["created_at"]).timestamp()
+        self._success[row] = success_code(sos.get("success"))
+
+        self.rows[sos["id"]] = row
+        self._size += 1
+
+    def _teacher(self, teacher_id: str) -> dict:
+        if teacher_id not in self._teachers:
+            self._teachers[teacher_id] = get_user_by_id(teacher_id) or {}
+        return self._teachers[teacher_id]
+
+    def _reserve(self, capacity: int):
+        """Grow the columns geometrically so appends stay amortized O(1)."""
+        if capacity <= len(self._created):
+            return
+        new_capacity = max(capacity, 2 * len(self._created), 1024)
+        for name in CODED_COLUMNS:
+            self._columns[name] = np.resize(self._columns[name], new_capacity)
+        self._created = np.resize(self._created, new_capacity)
+        self._success = np.resize(self._success, new_capacity)
+
+    def district_mask(self, district: str) -> np.ndarray:
+        return self.column("district") == self.code_of("district", district)
+
+
+def success_code(success: Optional[bool]) -> int:
+    if success is None:
+        return UNKNOWN
+    return SUCCESSFUL if success else FAILED
+
+
+def count_by(codes: np.ndarray, size: int, weights: Optional[np.ndarray] = None) -> np.ndarray:
+    """Group-by count (or weighted sum) over codes 0..size-1."""
+    return np.bincount(codes, weights=weights, minlength=size)[:size]
+
+
+def count_pairs(first: np.ndarray, second: np.ndarray, second_size: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Group-by count over two coded columns, for the pairs that occur.
+
+    Returns parallel (first, second, count) arrays sorted by first, then
+    second. Only the given rows are grouped, so the cost does not grow
+    with the number of distinct (free-text) topics.
+    """
+    pairs, counts = np.unique(first.astype(np.int64) * second_size + second, return_counts=True)
+    return pairs // second_size, pairs % second_size, counts
+
+
+def top_per_group(groups: np.ndarray, values: np.ndarray, counts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(group, value) with the highest count in each group, lowest value on ties."""
+    if not len(groups):
+        return groups, values
+    order = np.lexsort((-counts, groups))
+    sorted_groups = groups[order]
+    first = order[np.r_[True, sorted_groups[1:] != sorted_groups[:-1]]]
+    return groups[first], values[first]
+
+
+def latest_per_group(groups: np.ndarray, created: np.ndarray, limit: int) -> np.ndarray:
+    """Positions of the latest `limit` rows of each group."""
+    if not len(groups):
+        return np.zeros(0, dtype=np.int64)
+    order = np.lexsort((-created, groups))
+    sorted_groups = groups[order]
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    lengths = np.diff(np.r_[starts, len(order)])
+    rank = np.arange(len(order)) - np.repeat(starts, lengths)
+    return order[rank < limit]
+
+
+# Global instance
+sos_columns = SOSColumns()
+
+
+def get_sos_columns() -> SOSColumns:
+    """Get the synced columnar SOS store."""
+    sos_columns.sync()
+    return sos_columns
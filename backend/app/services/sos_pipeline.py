@@ -0,0 +1,203 @@
+"""Staged orchestration for the SOS pipeline with per-stage deadlines."""
+import asyncio
+import time
+from typing import Any, Awaitable, Collection, Optional
+
+from ..config import get_settings
+from ..models.sos import SOSContext
+from .cache_service import set_cached_response, hard_ttl
+from .semantic_cache import get_semantic_cache
+from .youtube_service import search_videos
+
+settings = get_settings()
+
+# Playbook sections in the order a teacher needs them
+PLAYBOOK_SECTIONS = ("what_to_say", "activity", "class_management", "quick_check")
+
+# Soft TTLs (seconds) of cached playbooks; they are served stale for longer
+QUICK_FIX_TTL = 3600
+GENERATED_TTL = 7200
+
+# Stages whose default still gives a complete playbook: a late context call
+# falls back to keyword extraction before the cache key is even built, and a
+# late similar-problem lookup only means no quick fix, so the LLM writes it
+NON_CONTENT_STAGES = ("context", "similar")
+
+
+class StageRunner:
+    """Run independent pipeline stages concurrently, each under its own deadline.
+
+    A stage that misses its deadline or raises resolves to its default value,
+    so the caller can still return a partial playbook instead of waiting.
+    """
+
+    def __init__(self):
+        self._tasks: dict[str, asyncio.Task] = {}
+        self.late: list[str] = []
+        self.failed: list[str] = []
+        self.timings: dict[str, float] = {}
+
+    def start(self, name: str, awaitable: Awaitable, timeout: float, default: Any = None):
+        """Start a stage in the background."""
+        self._tasks[name] = asyncio.ensure_future(
+            self._run(name, awaitable, timeout, default)
+        )
+
+    def start_sync(self, name: str, func, *args, timeout: float, default: Any = None, **kwargs):
+        """Start a blocking stage in a worker thread."""
+        self.start(name, asyncio.to_thread(func, *args, **kwargs), timeout, default)
+
+    async def _run(self, name: str, awaitable: Awaitable, timeout: float, default: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            print(f"⏱️ Stage '{name}' missed its {timeout}s deadline")
+            self.late.append(name)
+            return default
+        except Exception as e:
+            print(f"Stage '{name}' error: {e}")
+            self.failed.append(name)
+            return default
+        finally:
+            self.timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    async def result(self, name: str) -> Any:
+        """Wait for a single stage and return its value (or default)."""
+        return await self._tasks[name]
+
+    async def gather(self) -> dict:
+        """Wait for all started stages and return their values by name."""
+        values = await asyncio.gather(*self._tasks.values())
+        return dict(zip(self._tasks.keys(), values))
+
+    @property
+    def incomplete(self) -> list[str]:
+        """Late or failed stages that left part of the playbook missing."""
+        return [name for name in self.late + self.failed if name not in NON_CONTENT_STAGES]
+
+    @property
+    def partial(self) -> bool:
+        """True when a stage the playbook is built from was late or failed."""
+        return bool(self.incomplete)
+
+
+def start_resource_stages(runner: StageRunner, rag, query_text: str, context) -> None:
+    """Start the NCERT reference and video search stages for a context."""
+    topic = context.topic or query_text
+    runner.start_sync(
+        "ncert_refs",
+        rag.get_ncert_references,
+        topic=topic,
+        grade=context.grade,
+        subject=context.subject,
+        timeout=settings.ncert_stage_timeout,
+        default=[]
+    )
+    runner.start(
+        "videos",
+        search_videos(
+            query=topic,
+            grade=context.grade,
+            language=context.language,
+            limit=3
+        ),
+        timeout=settings.video_stage_timeout,
+        default=[]
+    )
+
+
+def start_similar_stage(runner: StageRunner, rag, query_text: str, context) -> None:
+    """Start the similar-problem lookup stage for a context."""
+    runner.start_sync(
+        "similar",
+        rag.search_similar_problems,
+        query_text,
+        grade=context.grade,
+        subject=context.subject,
+        limit=3,
+        timeout=settings.similar_stage_timeout,
+        default=[]
+    )
+
+
+def find_quick_fix(similar: list, skip: Collection[str] = ()) -> Optional[dict]:
+    """Get the best similar problem if its fused relevance clears the quick-fix gate.
+
+    Quick fixes whose IDs are in skip (rejected by teachers) are passed over.
+    """
+    candidates = [s for s in similar if s.get("id") not in skip]
+    if candidates and candidates[0].get("relevance_score", 0) > settings.quick_fix_threshold:
+        return candidates[0]
+    return None
+
+
+def build_quick_fix_playbook(best_match: dict, query_text: str, language: Optional[str]) -> dict:
+    """Build a playbook from a quick fix in the requested language."""
+    lang = language or "en"
+    if lang == "hi":
+        what_to_say = best_match.get("what_to_say_hi", best_match.get("what_to_say", []))
+        problem_text = best_match.get("problem_hi", best_match.get("problem", query_text))
+        activity_name = best_match.get("activity_hi", best_match.get("activity", "Interactive Activity"))
+    elif lang == "kn":
+        what_to_say = best_match.get("what_to_say_kn", best_match.get("what_to_say", []))
+        problem_text = best_match.get("problem_kn", best_match.get("problem", query_text))
+        activity_name = best_match.get("activity_kn", best_match.get("activity", "Interactive Activity"))
+    else:
+        what_to_say = best_match.get("what_to_say_en", best_match.get("what_to_say", []))
+        problem_text = best_match.get("problem_en", best_match.get("problem", query_text))
+        activity_name = best_match.get("activity_en", best_match.get("activity", "Interactive Activity"))
+
+    return {
+        "id": best_match["id"],
+        "problem": problem_text,
+        "what_to_say": what_to_say,
+        "activity": {
+            "name": activity_name,
+            "steps": best_match.get(f"steps_{lang}", ["Follow the quick fix guidance"]),
+            "materials": best_match.get("materials", ["Available classroom materials"]),
+            "duration_minutes": 10
+        },
+        "class_management": best_match.get(f"class_management_{lang}", ["Use attention signals", "Praise participation"]),
+        "quick_check": {
+            "questions": best_match.get(f"questions_{lang}", ["Did students understand?"]),
+            "expected_responses": ["Students demonstrate understanding"],
+            "success_indicators": ["Active participation"]
+        },
+        "trust_score": best_match.get("success_rate", 0.8),
+        "from_quick_fix": True
+    }
+
+
+def summarize_similar(similar: list) -> list:
+    """Shrink similar problems to the fields returned to the client."""
+    return [
+        {"id": s["id"], "problem": s["problem"], "success_rate": s.get("success_rate", 0.8)}
+        for s in similar[:3]
+    ]
+
+
+def mark_partial(playbook: dict, runner: StageRunner) -> dict:
+    """Annotate a playbook with the stages that did not finish in time."""
+    if runner.partial:
+        playbook["partial"] = True
+        playbook["late_stages"] = runner.incomplete
+    return playbook
+
+
+async def cache_playbook(
+    cache_key: str,
+    playbook: dict,
+    ttl: int,
+    query_text: str,
+    context: SOSContext,
+    pin: bool = False
+):
+    """Cache a playbook and index its SOS text for semantic lookups.
+
+    The index entry lasts as long as the playbook can be served (stale).
+    """
+    await set_cached_response(cache_key, playbook, ttl=ttl, pin=pin)
+    await get_semantic_cache().add(
+        query_text, context.grade, context.subject, context.language, cache_key, ttl=hard_ttl(ttl)
+    )
@@ -0,0 +1,144 @@
+"""Dense vector index for quick fix retrieval."""
+from typing import Optional
+
+import numpy as np
+
+from .embedding_service import HashedNgramEmbedder
+
+# Language variants of a quick fix that are embedded as separate rows
+PROBLEM_FIELDS = ("problem", "problem_en", "problem_hi", "problem_kn")
+
+# Subject of cross-cutting fixes (attention, classroom management) that are
+# never filtered out by grade or subject
+GENERAL_SUBJECT = "general"
+
+
+class VectorIndex:
+    """Top-k cosine search over a contiguous float32 embedding matrix.
+
+    Each text field (e.g. language variant) of a document is one row; rows map back to their
+    document, and a document scores as its best-matching row. Grade and
+    subject are stored as parallel arrays so filters are applied as a mask
+    before any dot products are computed.
+    """
+
+    def __init__(self, dim: int = 512, grade_window: int = 2, text_fields: tuple = PROBLEM_FIELDS):
+        self.embedder = HashedNgramEmbedder(dim=dim, drop_stopwords=True)
+        self.dim = dim
+        self.grade_window = grade_window
+        self.text_fields = text_fields
+        self.documents: list = []
+        self.subject_codes: dict = {GENERAL_SUBJECT: 0}
+        self._size = 0
+        self._matrix = np.zeros((0, dim), dtype=np.float32)
+        self._row_docs = np.zeros(0, dtype=np.int32)
+        self._row_grades = np.zeros(0, dtype=np.int16)
+        self._row_subjects = np.zeros(0, dtype=np.int16)
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def build(self, documents: list):
+        """Fit the embedder on the documents and index them all."""
+        self.embedder.fit(
+            doc[field] for doc in documents for field in self.text_fields if doc.get(field)
+        )
+        self.add(documents)
+
+    def add(self, documents: list):
+        """Append documents to the index (e.g. newly shared solutions)."""
+        rows = []
+        for doc in documents:
+            doc_index = len(self.documents)
+            self.documents.append(doc)
+            grade = doc.get("grade") or 0
+            subject = self._subject_code(doc.get("subject"))
+            texts = {doc[field] for field in self.text_fields if doc.get(field)}
+            for text in texts:
+                rows.append((self.embed(text), doc_index, grade, subject))
+
+        if not rows:
+            return
+
+        self._reserve(self._size + len(rows))
+        end = self._size + len(rows)
+        self._matrix[self._size:end] = np.stack([row[0] for row in rows])
+        self._row_docs[self._size:end] = [row[1] for row in rows]
+        self._row_grades[self._size:end] = [row[2] for row in rows]
+        self._row_subjects[self._size:end] = [row[3] for row in rows]
+        self._size = end
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embed a text as a dense, L2-normalized float32 vector."""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for index, value in self.embedder.embed(text).items():
+            vector[index] = value
+        return vector
+
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        grade: Optional[int] = None,
+        subject: Optional[str] = None
+    ) -> list[tuple[int, float]]:
+        """Get up to k (document index, cosine similarity) pairs, best first.
+
+        Rows are pre-filtered to the subject and to grades within
+        grade_window of the requested grade; general fixes always pass.
+        If nothing passes the filter, the whole index is searched.
+        """
+        if not self._size or k <= 0:
+            return []
+
+        rows = self._filter_rows(grade, subject)
+        if not len(rows):
+            rows = np.arange(self._size)
+
+        scores = self._matrix[rows] @ self.embed(query)
+
+        # Over-fetch rows, since several variants of one document may rank
+        fetch = min(len(rows), k * len(self.text_fields))
+        top = np.argpartition(-scores, fetch - 1)[:fetch]
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        seen = set()
+        for row in top:
+            doc_index = int(self._row_docs[rows[row]])
+            if doc_index in seen:
+                continue
+            seen.add(doc_index)
+            results.append((doc_index, float(scores[row])))
+            if len(results) == k:
+                break
+        return results
+
+    def _filter_rows(self, grade: Optional[int], subject: Optional[str]) -> np.ndarray:
+        mask = np.ones(self._size, dtype=bool)
+        if grade:
+            grades = self._row_grades[:self._size]
+            mask &= np.abs(grades - grade) <= self.grade_window
+        if subject and subject.lower() != GENERAL_SUBJECT:
+            code = self.subject_codes.get(subject.lower(), -1)
+            mask &= self._row_subjects[:self._size] == code
+        mask |= self._row_subjects[:self._size] == self.subject_codes[GENERAL_SUBJECT]
+        return np.flatnonzero(mask)
+
+    def _subject_code(self, subject: Optional[str]) -> int:
+        key = (subject or GENERAL_SUBJECT).lower()
+        if key not in self.subject_codes:
+            self.subject_codes[key] = len(self.subject_codes)
+        return self.subject_codes[key]
+
+    def _reserve(self, capacity: int):
+        """Grow the row arrays geometrically so appends stay amortized O(1)."""
+        if capacity <= len(self._matrix):
+            return
+        new_capacity = max(capacity, 2 * len(self._matrix), 64)
+        matrix = np.zeros((new_capacity, self.dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        self._matrix = matrix
+        self._row_docs = np.resize(self._row_docs, new_capacity)
+        self._row_grades = np.resize(self._row_grades, new_capacity)
+        self._row_subjects = np.resize(self._row_subjects, new_capacity)
@@ -0,0 +1,54 @@
+"""Versioned response cache with ETag / If-None-Match support."""
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Callable
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+
+class ResponseCache:
+    """Cache JSON payloads per scope, valid while the data version is unchanged.
+
+    The ETag is derived from the scope and version, so a client that sends
+    the current ETag back gets a 304 before any payload is built.
+    """
+
+    def __init__(self, version_fn: Callable[[], str], max_entries: int = 500):
+        self.version_fn = version_fn
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self.stats = {"not_modified": 0, "hits": 0, "misses": 0}
+
+    def etag(self, scope: str, version: str) -> str:
+        digest = hashlib.md5(f"{scope}:{version}".encode()).hexdigest()[:16]
+        return f'W/"{digest}"'
+
+    async def respond(self, request: Request, scope: str, build: Callable[[], dict]) -> Response:
+        """Return 304, the cached payload, or a freshly built one, with an ETag.
+
+        version_fn and build read the database, so they run in a worker thread.
+        """
+        etag = self.etag(scope, await asyncio.to_thread(self.version_fn))
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+        if etag in request.headers.get("if-none-match", ""):
+            self.stats["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+
+        entry = self._entries.get(scope)
+        if entry and entry[0] == etag:
+            self.stats["hits"] += 1
+            self._entries.move_to_end(scope)
+            payload = entry[1]
+        else:
+            self.stats["misses"] += 1
+            payload = jsonable_encoder(await asyncio.to_thread(build))
+            self._entries[scope] = (etag, payload)
+            self._entries.move_to_end(scope)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return JSONResponse(payload, headers=headers)
@@ -0,0 +1,96 @@
+"""Helpers for streaming playbooks to the client as Server-Sent Events."""
+import asyncio
+import json
+from typing import Any, AsyncIterator
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Format a single Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def iter_with_deadline(source: AsyncIterator, timeout: float) -> AsyncIterator:
+    """Yield items from an async iterator, raising TimeoutError past the deadline."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    iterator = source.__aiter__()
+    while True:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            raise asyncio.TimeoutError()
+        try:
+            item = await asyncio.wait_for(iterator.__anext__(), remaining)
+        except StopAsyncIteration:
+            return
+        yield item
+
+
+class PartialJSONParser:
+    """Incrementally parse a streamed JSON object.
+
+    Text is fed in arbitrary chunks (LLM tokens). Each top-level field is
+    returned as soon as its value is complete, so the first section of a
+    playbook can be shown while the rest is still being generated. Anything
+    before the opening brace, such as a markdown code fence, is skipped.
+    """
+
+    def __init__(self):
+        self.fields: dict = {}
+        self.done = False
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._segment_start = None
+
+    def feed(self, chunk: str) -> list[tuple[str, Any]]:
+        """Consume a chunk and return the (key, value) pairs it completed."""
+        if self.done:
+            return []
+
+        self._buffer += chunk
+        completed = []
+
+        while self._pos < len(self._buffer):
+            char = self._buffer[self._pos]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif self._depth == 0:
+                if char == "{":
+                    self._depth = 1
+                    self._segment_start = self._pos + 1
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    completed.extend(self._close_segment())
+                    self.done = True
+                    break
+            elif char == "," and self._depth == 1:
+                completed.extend(self._close_segment())
+                self._segment_start = self._pos + 1
+
+            self._pos += 1
+
+        return completed
+
+    def _close_segment(self) -> list[tuple[str, Any]]:
+        segment = self._buffer[self._segment_start:self._pos].strip()
+        if not segment:
+            return []
+        try:
+            parsed = json.loads("{" + segment + "}")
+        except json.JSONDecodeError:
+            return []
+        self.fields.update(parsed)
+        return list(parsed.items())
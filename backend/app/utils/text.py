@@ -0,0 +1,72 @@
+"""Text normalization and tokenization for Hindi, Kannada and English."""
+import re
+import unicodedata
+
+# Word characters plus the Devanagari and Kannada blocks (without the danda
+# punctuation), since vowel signs like "ा" are not matched by \w on their own
+TOKEN_CHARS = r"\w\u0900-\u0963\u0966-\u097F\u0C80-\u0CFF"
+TOKEN_RE = re.compile(f"[{TOKEN_CHARS}]+")
+
+# Words found in almost every SOS ("students are not ...", "बच्चे ... नहीं
+# पा रहे") that say nothing about the problem, in their folded forms
+STOPWORDS = frozenset({
+    # English
+    "a", "an", "the", "is", "are", "am", "was", "were", "be", "been", "not", "no", "t",
+    "in", "on", "of", "to", "at", "with", "and", "or", "for", "my", "our", "their",
+    "they", "them", "this", "that", "it", "very", "too", "can", "cannot", "do", "doe",
+    "don", "student", "children", "child", "kid", "class", "grade", "std", "problem",
+    "issue", "difficulty", "help", "learning", "learn", "understanding", "understand",
+    "struggling", "struggle",
+    # Hindi
+    "बच्चे", "बच्चों", "बच्चा", "छात्र", "नहीं", "नही", "रहे", "रहा", "रही", "रहीं",
+    "है", "हैं", "हो", "पा", "पाते", "पाता", "का", "की", "के", "में", "से", "को", "ने",
+    "और", "भी", "बहुत", "कक्षा", "आ", "आता", "आती", "समझ", "कर", "करना",
+    # Hinglish
+    "bacche", "bachche", "bache", "baccho", "bachon", "nahi", "nahin", "rahe", "raha",
+    "rahi", "hai", "hain", "ho", "pa", "ka", "ki", "ke", "me", "mein", "se", "ko",
+    "samajh", "aa", "kar", "kaksha",
+    # Kannada
+    "ಮಕ್ಕಳು", "ಮಕ್ಕಳಿಗೆ", "ಇಲ್ಲ", "ತರಗತಿ",
+})
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and NFC-normalize text so equivalent spellings compare equal."""
+    return unicodedata.normalize("NFC", text or "").lower().strip()
+
+
+def tokenize(text: str, min_length: int = 1) -> list[str]:
+    """Split text into word tokens, keeping Indic words whole."""
+    return [t for t in TOKEN_RE.findall(normalize_text(text)) if len(t) >= min_length]
+
+
+def char_ngrams(word: str, n: int = 3) -> list[str]:
+    """Get character n-grams of a word padded with boundary spaces."""
+    padded = f" {word} "
+    return [padded[i:i + n] for i in range(max(1, len(padded) - n + 1))]
+
+
+def fold_token(token: str) -> str:
+    """Fold simple English plurals; Hindi and Kannada tokens are kept as-is."""
+    if token.isascii() and len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def is_stopword(token: str) -> bool:
+    """Check whether a folded token carries no meaning for retrieval."""
+    return token in STOPWORDS or token.isdigit()
+
+
+def index_terms(text: str) -> list[str]:
+    """Tokenize for keyword indexing, folding plurals and dropping stopwords.
+
+    "fractions" and "fraction" become the same term, as the old substring
+    checks allowed.
+    """
+    terms = []
+    for token in tokenize(text):
+        token = fold_token(token)
+        if not is_stopword(token):
+            terms.append(token)
+    return terms
@@ -0,0 +1,4 @@
+"""Test settings: an in-memory repository, so no test writes a database file."""
+import os
+
+os.environ["DATABASE_BACKEND"] = "memory"
@@ -0,0 +1,13 @@
+"""Dashboard analytics over the seeded demo history."""
+from datetime import datetime, timedelta
+
+from app.services.analytics_service import recent_sos_count
+
+
+def test_this_week_counts_days_not_records():
+    now = datetime.now()
+    assert recent_sos_count("teacher1", days=7, now=now) == 2
+    # sos1 was two days ago and sos2 one day ago
+    assert recent_sos_count("teacher1", days=7, now=now + timedelta(days=5)) == 1
+    assert recent_sos_count("teacher1", days=7, now=now + timedelta(days=7)) == 0
+    assert recent_sos_count("nobody", days=7, now=now) == 0
@@ -0,0 +1,116 @@
+"""Batch playbook endpoint."""
+import asyncio
+import json
+
+import pytest
+
+from app.models.sos import SOSBatchItem, SOSContext
+from app.models.user import User, UserRole
+from app.routes import sos
+from app.services import cache_service
+
+PLAYBOOK = {
+    "what_to_say": ["Let's count the sticks"],
+    "activity": {"name": "Stick fractions", "steps": ["Break a stick in two"]},
+    "class_management": ["Work in pairs"],
+    "quick_check": {"questions": ["What is half of 4?"]}
+}
+
+CRP = User(id="c1", name="Ravi", username="ravi", role=UserRole.CRP, district="Tumkur", language="en")
+
+
+def batch_item(topic: str) -> SOSBatchItem:
+    return SOSBatchItem(id=topic, text=f"Students confused by {topic}", context=SOSContext(
+        grade=5, subject="Math", topic=topic, language="en"
+    ))
+
+
+def parse_event(chunk: str) -> tuple[str, dict]:
+    name, data = chunk.strip().split("\n")
+    return name.removeprefix("event: "), json.loads(data.removeprefix("data: "))
+
+
+class NoSemanticMatches:
+    async def lookup(self, *args):
+        return None
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    """Run batch items without Redis or retrieval; the "Cached" topic is a cache hit.
+
+    Returns the track_usage flag of every cache lookup.
+    """
+    lookups = []
+    cached_key = sos.get_cache_key({"grade": 5, "subject": "Math", "topic": "Cached", "language": "en"})
+
+    async def get_cached_response(cache_key, track_usage=False, **kwargs):
+        lookups.append(track_usage)
+        return {"id": "cached", **PLAYBOOK} if cache_key == cached_key else None
+
+    def no_stages(runner, *args):
+        for name in ("ncert_refs", "videos", "similar"):
+            if name not in runner._tasks:
+                runner.start(name, asyncio.sleep(0, []), timeout=1, default=[])
+
+    async def cache_playbook(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(cache_service, "redis_client", None)
+    monkeypatch.setattr(sos, "get_cached_response", get_cached_response)
+    monkeypatch.setattr(sos, "get_semantic_cache", NoSemanticMatches)
+    monkeypatch.setattr(sos, "start_resource_stages", no_stages)
+    monkeypatch.setattr(sos, "start_similar_stage", no_stages)
+    monkeypatch.setattr(sos, "cache_playbook", cache_playbook)
+    return lookups
+
+
+def test_batch_streams_each_item_without_counting_usage(lookups, monkeypatch):
+    async def generate_playbook(**kwargs):
+        return PLAYBOOK
+
+    monkeypatch.setattr(sos, "generate_playbook", generate_playbook)
+
+    async def collect():
+        items = [batch_item("Cached"), batch_item("Fractions"), batch_item("Decimals")]
+        return [parse_event(event) async for event in sos.batch_event_stream(items, CRP)]
+
+    events = asyncio.run(collect())
+    items = {data["id"]: data for name, data in events if name == "item"}
+    assert items["Cached"]["status"] == "cached"
+    assert items["Fractions"]["status"] == items["Decimals"]["status"] == "generated"
+    assert items["Fractions"]["playbook"]["what_to_say"] == PLAYBOOK["what_to_say"]
+    assert events[-1] == ("done", {"total": 3, "statuses": {"cached": 1, "generated": 2}})
+    assert lookups and not any(lookups)
+
+
+def test_closing_the_stream_cancels_outstanding_items(lookups, monkeypatch):
+    started = []
+    cancelled = []
+
+    async def generate_playbook(**kwargs):
+        started.append(kwargs["topic"])
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.append(kwargs["topic"])
+            raise
+
+    monkeypatch.setattr(sos, "generate_playbook", generate_playbook)
+
+    async def main():
+        items = [batch_item("Cached"), batch_item("Fractions"), batch_item("Decimals")]
+        stream = sos.batch_event_stream(items, CRP)
+        first = parse_event(await stream.__anext__())
+        while len(started) < 2:
+            await asyncio.sleep(0)
+        # The client disconnects: the response closes the generator
+        await stream.aclose()
+        for _ in range(10):
+            await asyncio.sleep(0)
+        # Checked before asyncio.run cancels whatever is left
+        return first, sorted(cancelled)
+
+    (name, data), cancelled_items = asyncio.run(main())
+    assert (name, data["id"], data["status"]) == ("item", "Cached", "cached")
+    assert cancelled_items == ["Decimals", "Fractions"]
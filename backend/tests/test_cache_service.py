@@ -0,0 +1,66 @@
+"""In-process cache tier."""
+import asyncio
+import time
+
+from app.services import cache_service
+from app.services.cache_service import LocalCache
+
+
+def test_only_leaderboard_keys_are_pinned():
+    cache = LocalCache(max_entries=1, max_pinned=2, pin_ttl=60)
+    cache.set_pin_keys(["fractions", "counting", "reading"])
+    assert cache.pin_keys == {"fractions", "counting"}
+
+    cache.set("fractions", {"id": 1}, ttl=60, pin=True)
+    cache.set("general", {"id": 2}, ttl=60, pin=True)
+    cache.set("counting", {"id": 3}, ttl=60)
+    assert cache.sizes() == {"entries": 1, "pinned": 1}
+    assert cache.get("fractions") == {"id": 1}
+    # Not pinned, so evicted from the one-entry LRU
+    assert cache.get("general") is None
+
+
+def test_pins_leave_the_board_and_expire():
+    cache = LocalCache(max_entries=10, max_pinned=2, pin_ttl=0.01)
+    cache.set_pin_keys(["fractions", "counting"])
+    cache.set("fractions", {"id": 1}, ttl=60, pin=True)
+    cache.set("counting", {"id": 2}, ttl=60, pin=True)
+
+    cache.set_pin_keys(["counting"])
+    assert cache.get("fractions") is None
+    assert cache.get("counting") == {"id": 2}
+
+    time.sleep(0.02)
+    assert cache.get("counting") is None
+
+
+def test_entries_go_stale_after_their_soft_ttl():
+    cache = LocalCache(max_entries=10, max_pinned=1, pin_ttl=60)
+    cache.set_pin_keys(["counting"])
+    cache.set("fractions", {"id": 1}, ttl=60, fresh_for=0.01)
+    cache.set("counting", {"id": 2}, ttl=60, pin=True, fresh_for=0.01)
+    assert cache.lookup("fractions") == ({"id": 1}, True)
+
+    time.sleep(0.02)
+    assert cache.lookup("fractions") == ({"id": 1}, False)
+    assert cache.lookup("counting") == ({"id": 2}, False)
+    assert cache.lookup("reading") == (None, False)
+
+
+def test_stale_local_hit_is_revalidated(monkeypatch):
+    cache = LocalCache(max_entries=10, max_pinned=0)
+    cache.set("fresh", {"id": 1}, ttl=60, fresh_for=60)
+    cache.set("stale", {"id": 2}, ttl=60, fresh_for=0)
+    monkeypatch.setattr(cache_service, "local_cache", cache)
+    monkeypatch.setattr(cache_service, "revalidating", set())
+    revalidated = []
+
+    async def main():
+        for key in ("fresh", "stale", "stale"):
+            async def revalidate(key=key):
+                revalidated.append(key)
+            assert await cache_service.get_cached_response(key, revalidate=revalidate) is not None
+        await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+    assert revalidated == ["stale"]
@@ -0,0 +1,173 @@
+"""Off-peak cache warming and revalidation."""
+import asyncio
+
+import pytest
+
+from app.models.sos import SOSContext
+from app.services import cache_service, cache_warmer
+from app.services.cache_service import CircuitBreaker, get_cache_key, adjust_cache_lifetime
+from app.services.playbook_codec import split_refs, encode_playbook
+from app.services.sos_pipeline import QUICK_FIX_TTL, GENERATED_TTL, build_quick_fix_playbook
+
+PLAYBOOK = {
+    "what_to_say": ["Let's count the sticks"],
+    "activity": {"name": "Stick fractions", "steps": ["Break a stick in two"]},
+    "class_management": ["Work in pairs"],
+    "quick_check": {"questions": ["What is half of 4?"]}
+}
+
+QUICK_FIX = {
+    "id": "qf1",
+    "topic": "Fractions",
+    "problem": "Students confused by fractions",
+    "what_to_say_en": ["Fold the roti in half"],
+    "relevance_score": 0.95
+}
+
+
+def similar_stage(similar: list, late: bool = False):
+    """A start_similar_stage replacement returning similar, optionally after its deadline."""
+    def start(runner, rag, problem, context):
+        runner.start("similar", asyncio.sleep(1 if late else 0, similar), timeout=0.05, default=[])
+    return start
+
+
+@pytest.fixture
+def warm(monkeypatch):
+    """Run warm_playbook without Redis, refs or videos; returns the cached (playbook, ttl, pin)."""
+    cached = []
+
+    async def no_cached_response(cache_key, **kwargs):
+        return None
+
+    def no_resources(runner, rag, problem, context):
+        for name in ("ncert_refs", "videos"):
+            runner.start(name, asyncio.sleep(0, []), timeout=1, default=[])
+
+    async def generate_playbook(**kwargs):
+        return PLAYBOOK
+
+    async def cache_playbook(cache_key, playbook, ttl, query_text, context, pin=False):
+        cached.append((playbook, ttl, pin))
+
+    monkeypatch.setattr(cache_service, "redis_client", None)
+    monkeypatch.setattr(cache_warmer, "get_cached_response", no_cached_response)
+    monkeypatch.setattr(cache_warmer, "start_resource_stages", no_resources)
+    monkeypatch.setattr(cache_warmer, "generate_playbook", generate_playbook)
+    monkeypatch.setattr(cache_warmer, "cache_playbook", cache_playbook)
+    return cached
+
+
+def warm_fractions(**kwargs) -> str:
+    return asyncio.run(cache_warmer.warm_playbook(5, "Math", "Fractions", "en", use_llm=True, **kwargs))
+
+
+def test_llm_playbook_is_cached_after_a_late_similar_lookup(warm, monkeypatch):
+    monkeypatch.setattr(cache_warmer, "start_similar_stage", similar_stage([QUICK_FIX], late=True))
+    assert warm_fractions() == "llm"
+    [(playbook, ttl, pin)] = warm
+    assert playbook["what_to_say"] == PLAYBOOK["what_to_say"]
+    assert "partial" not in playbook
+    assert (ttl, pin) == (GENERATED_TTL, False)
+
+
+def test_quick_fix_playbook_is_cached_like_an_sos(warm, monkeypatch):
+    monkeypatch.setattr(cache_warmer, "start_similar_stage", similar_stage([QUICK_FIX]))
+    assert warm_fractions() == "quick_fix"
+    [(playbook, ttl, pin)] = warm
+    assert playbook["what_to_say"] == QUICK_FIX["what_to_say_en"]
+    assert (ttl, pin) == (QUICK_FIX_TTL, True)
+
+
+class FakePipeline:
+    """Queues calls and runs them on FakeRedis on execute()."""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    async def execute(self):
+        return [await getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class FakeRedis:
+    """Just enough Redis for feedback, rejected fixes and generation leases."""
+
+    def __init__(self):
+        self.values = {}
+        self.ttls = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, nx=False, px=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    async def ttl(self, key):
+        return self.ttls.get(key, -1) if key in self.values else -2
+
+    async def expire(self, key, seconds):
+        self.ttls[key] = seconds
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+
+    async def sadd(self, key, *members):
+        self.values.setdefault(key, set()).update(members)
+
+    async def smembers(self, key):
+        return self.values.get(key, set())
+
+    async def publish(self, channel, message):
+        return 0
+
+    async def eval(self, script, numkeys, key, token):
+        if self.values.get(key) == token:
+            del self.values[key]
+
+
+def test_negative_feedback_replaces_a_quick_fix_playbook(warm, monkeypatch):
+    redis = FakeRedis()
+    for name in ("redis_client", "redis_bytes"):
+        monkeypatch.setattr(cache_service, name, redis)
+    monkeypatch.setattr(cache_service, "breaker", CircuitBreaker(threshold=5, cooldown=30))
+    monkeypatch.setattr(cache_warmer, "llm_client", object())
+    monkeypatch.setattr(cache_warmer, "start_similar_stage", similar_stage([QUICK_FIX]))
+
+    context = SOSContext(grade=5, subject="Math", topic="Fractions", language="en")
+    cache_key = get_cache_key({"grade": 5, "subject": "Math", "topic": "Fractions", "language": "en"})
+    quick_fix_playbook = build_quick_fix_playbook(QUICK_FIX, QUICK_FIX["problem"], "en")
+    redis.values[cache_key] = encode_playbook(split_refs(quick_fix_playbook)[0])
+    redis.ttls[cache_key] = 5000
+
+    async def main():
+        await adjust_cache_lifetime(cache_key, False)
+        return await cache_warmer.revalidate_playbook(context, QUICK_FIX["problem"])
+
+    assert asyncio.run(main()) == "llm"
+    assert redis.values[f"{cache_key}:rejected"] == {"qf1"}
+    [(playbook, ttl, pin)] = warm
+    assert playbook["what_to_say"] == PLAYBOOK["what_to_say"] != quick_fix_playbook["what_to_say"]
+    assert not playbook["from_quick_fix"]
+    assert (ttl, pin) == (GENERATED_TTL, False)
+
+
+def test_refresh_without_feedback_keeps_the_quick_fix(warm, monkeypatch):
+    monkeypatch.setattr(cache_warmer, "start_similar_stage", similar_stage([QUICK_FIX]))
+    assert warm_fractions(refresh=True) == "quick_fix"
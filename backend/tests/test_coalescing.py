@@ -0,0 +1,204 @@
+"""Single-flight playbook generation."""
+import asyncio
+
+import pytest
+
+from app.services import cache_service
+from app.services.cache_service import GenerationCoalescer, CircuitBreaker
+
+PLAYBOOK = {"id": "pb1", "what_to_say": ["Let's count the sticks"]}
+
+
+class FakeLeaseRedis:
+    """Redis stand-in for the lease: SET NX and the compare-and-extend/delete scripts.
+
+    Leases never expire on their own here.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.extended = []
+
+    async def set(self, key, value, nx=False, px=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    async def eval(self, script, numkeys, key, token, *args):
+        if self.values.get(key) != token:
+            return 0
+        if script == cache_service.EXTEND_LEASE_SCRIPT:
+            self.extended.append(token)
+        else:
+            assert script == cache_service.RELEASE_LEASE_SCRIPT
+            del self.values[key]
+        return 1
+
+
+@pytest.fixture
+def no_redis(monkeypatch):
+    monkeypatch.setattr(cache_service, "redis_client", None)
+
+
+@pytest.fixture
+def lease_redis(monkeypatch):
+    redis = FakeLeaseRedis()
+    monkeypatch.setattr(cache_service, "redis_client", redis)
+    monkeypatch.setattr(cache_service, "breaker", CircuitBreaker(threshold=5, cooldown=30))
+    return redis
+
+
+async def run_flight(coalescer, cache_key, generate):
+    """Enter a flight and return (leader, result), generating if leader."""
+    async with coalescer.flight(cache_key) as flight:
+        if flight.leader:
+            flight.result = await generate()
+        return flight.leader, flight.result
+
+
+def test_followers_get_the_leaders_playbook(no_redis):
+    coalescer = GenerationCoalescer(lease=1, poll_interval=0.01, max_wait=1)
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return PLAYBOOK
+
+    async def main():
+        return await asyncio.gather(*(run_flight(coalescer, "fractions", generate) for _ in range(3)))
+
+    results = asyncio.run(main())
+    assert calls == [1]
+    assert sorted(leader for leader, _ in results) == [False, False, True]
+    assert all(result == PLAYBOOK for _, result in results)
+    assert coalescer.coalesced == 2
+    assert coalescer._inflight == {}
+
+
+def test_failed_leader_hands_over_to_a_follower(no_redis):
+    coalescer = GenerationCoalescer(lease=1, poll_interval=0.01, max_wait=1)
+    attempts = []
+
+    async def generate():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        if len(attempts) == 1:
+            raise ConnectionError("model timed out")
+        return PLAYBOOK
+
+    async def main():
+        return await asyncio.gather(
+            run_flight(coalescer, "fractions", generate),
+            run_flight(coalescer, "fractions", generate),
+            return_exceptions=True
+        )
+
+    first, second = asyncio.run(main())
+    assert isinstance(first, ConnectionError)
+    assert second == (True, PLAYBOOK)
+    assert len(attempts) == 2
+    assert coalescer.coalesced == 0
+
+
+def test_leader_releases_its_lease(lease_redis):
+    coalescer = GenerationCoalescer(lease=1, poll_interval=0.01, max_wait=1)
+
+    async def main():
+        async with coalescer.flight("fractions") as flight:
+            assert flight.leader
+            assert lease_redis.values["fractions:lease"] == flight.token
+
+    asyncio.run(main())
+    assert lease_redis.values == {}
+
+
+def test_release_keeps_a_lease_taken_over_by_another_worker(lease_redis):
+    coalescer = GenerationCoalescer(lease=1, poll_interval=0.01, max_wait=1)
+
+    async def main():
+        async with coalescer.flight("fractions") as flight:
+            assert flight.leader
+            # Our lease expired mid-generation and another worker took it
+            lease_redis.values["fractions:lease"] = "other-worker:1234"
+
+    asyncio.run(main())
+    assert lease_redis.values == {"fractions:lease": "other-worker:1234"}
+
+
+def test_follower_in_another_worker_polls_the_cache(lease_redis, monkeypatch):
+    coalescer = GenerationCoalescer(lease=1, poll_interval=0.01, max_wait=1)
+    lease_redis.values["fractions:lease"] = "other-worker:1234"
+    polls = []
+
+    async def get_cached_response(cache_key):
+        polls.append(cache_key)
+        return PLAYBOOK if len(polls) == 2 else None
+
+    monkeypatch.setattr(cache_service, "get_cached_response", get_cached_response)
+
+    async def main():
+        async with coalescer.flight("fractions") as flight:
+            return flight.leader, flight.result
+
+    assert asyncio.run(main()) == (False, PLAYBOOK)
+    assert polls == ["fractions", "fractions"]
+    assert coalescer.coalesced == 1
+    assert lease_redis.values == {"fractions:lease": "other-worker:1234"}
+
+
+def test_leader_renews_its_lease_while_generating(lease_redis):
+    coalescer = GenerationCoalescer(lease=0.03, poll_interval=0.01, max_wait=1)
+
+    async def main():
+        async with coalescer.flight("fractions") as flight:
+            await asyncio.sleep(0.1)
+            return flight.token
+
+    token = asyncio.run(main())
+    assert len(lease_redis.extended) >= 2
+    assert set(lease_redis.extended) == {token}
+    assert lease_redis.values == {}
+
+
+def test_follower_outwaits_a_lease_its_leader_keeps(lease_redis, monkeypatch):
+    coalescer = GenerationCoalescer(lease=0.02, poll_interval=0.01, max_wait=1)
+    lease_redis.values["fractions:lease"] = "other-worker:1234"
+    polls = []
+
+    async def get_cached_response(cache_key):
+        polls.append(cache_key)
+        # The other worker caches its playbook well after one lease
+        return PLAYBOOK if len(polls) == 10 else None
+
+    monkeypatch.setattr(cache_service, "get_cached_response", get_cached_response)
+
+    async def main():
+        async with coalescer.flight("fractions") as flight:
+            return flight.leader, flight.result
+
+    assert asyncio.run(main()) == (False, PLAYBOOK)
+
+
+def test_follower_taking_over_a_released_lease_uses_the_cached_playbook(lease_redis, monkeypatch):
+    coalescer = GenerationCoalescer(lease=1, poll_interval=0.01, max_wait=1)
+    lease_redis.values["fractions:lease"] = "other-worker:1234"
+    polls = []
+
+    async def get_cached_response(cache_key):
+        polls.append(cache_key)
+        if len(polls) == 1:
+            # The holder caches and releases between this poll and the next SET NX
+            del lease_redis.values["fractions:lease"]
+            return None
+        return PLAYBOOK
+
+    monkeypatch.setattr(cache_service, "get_cached_response", get_cached_response)
+
+    async def main():
+        async with coalescer.flight("fractions") as flight:
+            return flight.leader, flight.result
+
+    assert asyncio.run(main()) == (False, PLAYBOOK)
+    assert lease_redis.values == {}
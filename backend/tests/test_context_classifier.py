@@ -0,0 +1,35 @@
+"""Local context classification."""
+import pytest
+
+from app.services import context_classifier
+
+
+@pytest.fixture
+def loaded(monkeypatch):
+    monkeypatch.setattr(context_classifier, "classifier", None)
+    return context_classifier.load_context_classifier()
+
+
+def test_not_classified_before_loading(monkeypatch):
+    monkeypatch.setattr(context_classifier, "classifier", None)
+    assert context_classifier.classify_context("students weak in fractions class 5") is None
+
+
+def test_artifact_classifies(loaded):
+    assert context_classifier.classify_context("students weak in fractions class 5") == {
+        "grade": 5, "subject": "Math", "topic": "Fractions", "problem_type": "understanding"
+    }
+
+
+def test_missing_artifact_is_not_trained(monkeypatch):
+    def missing(*args, **kwargs):
+        raise FileNotFoundError
+
+    def train(*args, **kwargs):
+        raise AssertionError("trained at load time")
+
+    monkeypatch.setattr(context_classifier, "classifier", None)
+    monkeypatch.setattr(context_classifier.ContextClassifier, "load", missing)
+    monkeypatch.setattr(context_classifier, "train", train)
+    assert context_classifier.load_context_classifier() is None
+    assert context_classifier.classify_context("students weak in fractions class 5") is None
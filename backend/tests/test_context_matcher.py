@@ -0,0 +1,17 @@
+"""Keyword context extraction."""
+import pytest
+
+from app.services.context_matcher import matcher
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("बच्चे भाग नहीं ले रहे", {}),
+    ("बच्चों को भाग देना नहीं आता", {"subject": "Math", "topic": "Division"}),
+    ("कक्षा 3 में जोड़ना", {"grade": 3, "subject": "Math", "topic": "Addition"}),
+    ("students weak in fractions class 5", {"grade": 5, "subject": "Math", "topic": "Fractions"}),
+    ("aftermath of the exam", {}),
+    ("grade 1 math", {"grade": 1, "subject": "Math"}),
+    ("ಮಕ್ಕಳು ಓದಲು ಕಷ್ಟಪಡುತ್ತಿದ್ದಾರೆ", {"subject": "Kannada", "topic": "Reading"}),
+])
+def test_match(text, expected):
+    assert matcher.match(text) == expected
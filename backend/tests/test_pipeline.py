@@ -0,0 +1,41 @@
+"""Staged SOS pipeline."""
+import asyncio
+
+from app.services.sos_pipeline import StageRunner, mark_partial
+
+
+async def slow(value, seconds: float):
+    await asyncio.sleep(seconds)
+    return value
+
+
+def run_stages(stages: dict) -> StageRunner:
+    """Run {name: (value, seconds, timeout)} stages and return the runner."""
+    runner = StageRunner()
+
+    async def main():
+        for name, (value, seconds, timeout) in stages.items():
+            runner.start(name, slow(value, seconds), timeout=timeout, default=[])
+        await runner.gather()
+
+    asyncio.run(main())
+    return runner
+
+
+def test_late_similar_stage_leaves_the_playbook_complete():
+    runner = run_stages({
+        "similar": (["fix"], 0.2, 0.01),
+        "playbook": ({"what_to_say": ["Hello"]}, 0, 1),
+        "ncert_refs": (["ref"], 0, 1)
+    })
+    assert runner.late == ["similar"]
+    assert not runner.partial
+    assert "partial" not in mark_partial({}, runner)
+
+
+def test_late_resource_stage_marks_the_playbook_partial():
+    runner = run_stages({
+        "similar": ([], 0, 1),
+        "ncert_refs": (["ref"], 0.2, 0.01)
+    })
+    assert mark_partial({}, runner) == {"partial": True, "late_stages": ["ncert_refs"]}
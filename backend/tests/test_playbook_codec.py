@@ -0,0 +1,79 @@
+"""Compact playbook encoding for the Redis cache."""
+import asyncio
+import json
+
+import pytest
+
+from app.services import cache_service
+from app.services.playbook_codec import (
+    split_refs, join_refs, ref_ids, encode_playbook, decode_playbook, encode_refs, FORMAT_VERSION
+)
+
+REF = {"title": "Fractions", "chapter": "Chapter 7", "grade": 5, "relevance_score": 0.9}
+VIDEO = {"id": "v1", "title": "Halves and quarters", "url": "https://youtu.be/v1"}
+
+PLAYBOOK = {
+    "id": "pb1",
+    "what_to_say": ["आधा मतलब दो बराबर हिस्से"],
+    "activity": {"name": "Roti fractions", "steps": ["Fold a roti"]},
+    "ncert_refs": [REF, {**REF, "relevance_score": 0.4}],
+    "videos": [VIDEO]
+}
+
+
+def test_round_trip():
+    slim, refs = split_refs(PLAYBOOK)
+    decoded = decode_playbook(encode_playbook(slim))
+    assert decoded == slim
+    assert join_refs(decoded, refs) == PLAYBOOK
+
+
+def test_refs_are_shared_and_per_use_fields_stay_inline():
+    slim, refs = split_refs(PLAYBOOK)
+    first, second = slim["ncert_refs"]
+    assert first["$ref"] == second["$ref"]
+    assert (first["relevance_score"], second["relevance_score"]) == (0.9, 0.4)
+    assert len(refs) == 2
+    assert ref_ids(slim) == set(refs)
+    assert all("relevance_score" not in item for item in refs.values())
+    assert {key for key, _ in encode_refs(refs)} == {f"sahayak:ref:{item_id}" for item_id in refs}
+
+
+def test_plain_json_from_older_entries_is_accepted():
+    assert decode_playbook(json.dumps(PLAYBOOK).encode("utf-8")) == PLAYBOOK
+
+
+def test_unknown_version_is_rejected():
+    raw = encode_playbook(split_refs(PLAYBOOK)[0])
+    with pytest.raises(ValueError):
+        decode_playbook(bytes([FORMAT_VERSION + 1]) + raw[1:])
+
+
+def test_missing_ref_raises():
+    slim, refs = split_refs(PLAYBOOK)
+    refs.pop(slim["videos"][0]["$ref"])
+    with pytest.raises(KeyError):
+        join_refs(slim, refs)
+
+
+class FakeRefStore:
+    """Redis stand-in that only answers MGET for shared refs."""
+
+    def __init__(self, values: dict):
+        self.values = values
+
+    async def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+
+@pytest.mark.parametrize("expired", [False, True])
+def test_load_playbook_treats_a_missing_ref_as_a_miss(monkeypatch, expired):
+    slim, refs = split_refs(PLAYBOOK)
+    stored = dict(encode_refs(refs))
+    if expired:
+        stored.popitem()
+    monkeypatch.setattr(cache_service, "redis_bytes", FakeRefStore(stored))
+    monkeypatch.setattr(cache_service, "ref_cache", cache_service.LocalCache(10, 0))
+
+    loaded = asyncio.run(cache_service.load_playbook(encode_playbook(slim)))
+    assert loaded == (None if expired else PLAYBOOK)
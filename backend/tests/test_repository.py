@@ -0,0 +1,91 @@
+"""Repository backends."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.data.mock_db import open_repository, rollup_keys
+from app.data.repository import Repository, SQLiteRepository, ThreadedAsyncRepository, solution_feedback
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def repo(request, tmp_path):
+    repo = open_repository(request.param, str(tmp_path / "sahayak.db"))
+    yield repo
+    repo.close()
+
+
+def outcomes(repo) -> dict:
+    return {
+        (row["topic"], row["period"]): (row["successful"], row["failed"])
+        for row in repo.get_rollups(district="Patna")
+    }
+
+
+def test_repository_is_abstract():
+    with pytest.raises(TypeError):
+        Repository()
+
+
+def test_concurrent_feedback_moves_rollups_once(repo):
+    sos = repo.get_sos("sos3")
+    keys = rollup_keys(sos, repo.get_user(sos["teacher_id"]))
+    before = outcomes(repo)[("Fractions", "all")]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        previous = list(pool.map(
+            lambda _: repo.update_sos_outcome("sos3", {"success": True}, keys), range(8)
+        ))
+
+    assert [p["success"] for p in previous].count(None) == 1
+    assert outcomes(repo)[("Fractions", "all")] == (before[0] + 1, before[1])
+    assert repo.get_sos("sos3")["success"] is True
+
+
+def test_missing_sos_has_no_outcome(repo):
+    assert repo.update_sos_outcome("nope", {"success": True}, []) is None
+
+
+def test_concurrent_solution_uses_are_all_counted(repo):
+    before = repo.get_solution("sol1")["usage_count"]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        counts = list(pool.map(lambda _: repo.increment_solution_usage("sol1"), range(40)))
+    assert sorted(counts) == list(range(before + 1, before + 41))
+    assert repo.get_solution("sol1")["usage_count"] == before + 40
+    assert repo.increment_solution_usage("nope") is None
+
+
+def test_concurrent_solution_feedback_is_all_applied(repo):
+    # On SQLite, half the feedback comes through a second connection, like another worker
+    other = SQLiteRepository(repo.path) if isinstance(repo, SQLiteRepository) else repo
+    expected = dict(repo.get_solution("sol1"))
+    # Positive feedback only, so the result does not depend on the order
+    verdicts = [True] * 20
+    for success in verdicts:
+        expected.update(solution_feedback(expected, success))
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(
+            lambda args: (repo, other)[args[0] % 2].record_solution_feedback("sol1", args[1]),
+            enumerate(verdicts)
+        ))
+    other.close()
+
+    solution = repo.get_solution("sol1")
+    assert solution["success_rate"] == pytest.approx(expected["success_rate"])
+    assert repo.record_solution_feedback("nope", True) is None
+
+
+def test_threaded_async_repository(repo):
+    async_repo = ThreadedAsyncRepository(repo)
+
+    async def run():
+        await async_repo.save_solution({"id": "sol9", "topic": "Counting", "grade": 1, "usage_count": 0})
+        found = await async_repo.list_solutions("count", 1)
+        user = await async_repo.get_user_by_username("priya")
+        await async_repo.flush()
+        return found, user
+
+    found, user = asyncio.run(run())
+    assert [s["id"] for s in found] == ["sol9"]
+    assert user["id"] == "teacher1"
@@ -0,0 +1,75 @@
+"""Quick-fix retrieval rankings for real SOS phrasings."""
+import pytest
+
+from app.config import get_settings
+from app.services.rag_service import get_rag_service
+from app.utils.text import index_terms
+
+settings = get_settings()
+
+
+@pytest.fixture(scope="module")
+def rag():
+    return get_rag_service()
+
+
+def topics(results: list) -> list:
+    return [r["topic"] for r in results]
+
+
+def test_stopwords_are_not_indexed():
+    assert index_terms("बच्चे भाग नहीं ले रहे") == ["भाग", "ले"]
+    assert index_terms("Students not understanding fractions") == ["fraction"]
+
+
+def test_lexical_scores_stay_below_one_for_partial_matches(rag):
+    lexical = rag.quick_fix_retriever.lexical
+    for _, score in lexical.normalized_search("place value counting", k=10):
+        assert score < 1.0
+
+
+def test_unrelated_reading_query_is_not_a_quick_fix(rag):
+    results = rag.search_similar_problems("बच्चे पढ़ नहीं पा रहे")
+    assert "Participation" not in topics(results)
+    assert all(r["relevance_score"] <= settings.quick_fix_threshold for r in results)
+
+
+@pytest.mark.parametrize("query", [
+    "photosynthesis is confusing for grade 7",
+    "my class is noisy and confusing",
+])
+def test_one_shared_word_does_not_clear_the_quick_fix_gate(rag, query):
+    lexical = rag.quick_fix_retriever.lexical
+    assert all(score < 0.6 for _, score in lexical.normalized_search(query, k=10))
+    results = rag.search_similar_problems(query)
+    assert all(r["relevance_score"] <= settings.quick_fix_threshold for r in results)
+
+
+def test_addition_query_does_not_match_participation(rag):
+    results = rag.search_similar_problems("बच्चे जोड़ नहीं समझ रहे कक्षा 2", grade=2, subject="Math")
+    assert topics(results)[0] == "Addition"
+    assert "Participation" not in topics(results)
+
+
+@pytest.mark.parametrize("grade", [None, 1])
+def test_counting_query_ranks_counting_first(rag, grade):
+    results = rag.search_similar_problems("counting problem class 1", grade=grade)
+    assert topics(results)[:2] == ["Counting", "Skip Counting"]
+
+
+def test_hinglish_addition_query_finds_addition(rag):
+    results = rag.search_similar_problems("bacche jod nahi samajh rahe", grade=2, subject="Math")
+    assert topics(results)[0] == "Addition"
+
+
+@pytest.mark.parametrize("query, grade, subject, topic", [
+    ("बच्चे गिनती नहीं सीख पा रहे", 1, "Math", "Counting"),
+    ("बच्चे भाग नहीं ले रहे", None, None, "Participation"),
+    ("Students not understanding fractions in class 5", 5, "Math", "Fractions"),
+    ("Students struggling with place value", None, None, "Place Value"),
+])
+def test_clear_matches_clear_the_quick_fix_gate(rag, query, grade, subject, topic):
+    results = rag.search_similar_problems(query, grade=grade, subject=subject)
+    assert topics(results)[0] == topic
+    assert results[0]["relevance_score"] > settings.quick_fix_threshold
+    assert all(r["relevance_score"] <= settings.quick_fix_threshold for r in results[1:])
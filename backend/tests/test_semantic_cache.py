@@ -0,0 +1,61 @@
+"""Semantic cache lookups."""
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+from app.services import cache_service
+from app.services.embedding_service import cosine, get_embedder
+from app.services.semantic_cache import SemanticCache
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(cache_service, "redis_client", None)
+    return SemanticCache(threshold=0.88, near_miss=0.6, max_entries=3, refresh_interval=60)
+
+
+def lookup(cache, text):
+    return asyncio.run(cache.lookup(text, 5, "Math", "en"))
+
+
+def add(cache, text, cache_key, ttl=3600):
+    asyncio.run(cache.add(text, 5, "Math", "en", cache_key, ttl=ttl))
+
+
+def test_near_duplicate_finds_the_cached_key(cache):
+    add(cache, "Students not understanding fractions in class 5", "fractions")
+    add(cache, "Students cannot read big numbers", "numbers")
+    assert lookup(cache, "students not understanding fractions in class 5!") == "fractions"
+    assert lookup(cache, "Children fighting during the lunch break") is None
+
+
+def test_scores_match_sparse_cosine(cache):
+    texts = ["Decimals confusing", "Place value confusion", "Fractions not clear"]
+    for i, text in enumerate(texts):
+        add(cache, text, f"key{i}")
+    query = "place value is confusing"
+    vector = get_embedder().embed(query)
+    dense = [0.0] * get_embedder().dim
+    for index, value in vector.items():
+        dense[index] = value
+
+    score, entry = cache._scopes["5:math:en"].best(np.array(dense, dtype=np.float32))
+    expected = max(texts, key=lambda t: cosine(vector, get_embedder().embed(t)))
+    assert entry[2] == expected
+    assert score == pytest.approx(cosine(vector, get_embedder().embed(expected)), abs=1e-5)
+
+
+def test_entries_expire_with_their_playbook(cache):
+    add(cache, "Students not understanding fractions in class 5", "fractions", ttl=0)
+    time.sleep(0.01)
+    assert lookup(cache, "Students not understanding fractions in class 5") is None
+    assert len(cache._scopes["5:math:en"]) == 0
+
+
+def test_scope_is_capped(cache):
+    for i in range(5):
+        add(cache, f"problem number {i} with fractions", f"key{i}")
+    assert len(cache._scopes["5:math:en"]) == 3
+    assert lookup(cache, "problem number 0 with fractions") != "key0"
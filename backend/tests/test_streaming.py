@@ -0,0 +1,139 @@
+"""Streamed playbook parsing and caching."""
+import asyncio
+import json
+
+import pytest
+
+from app.models.sos import SOSRequest
+from app.models.user import User, UserRole
+from app.routes import sos
+from app.services import cache_service, mistral_service
+from app.services.sos_pipeline import PLAYBOOK_SECTIONS, GENERATED_TTL
+from app.utils.streaming import PartialJSONParser
+
+PLAYBOOK = {
+    "what_to_say": ["Let's count the sticks"],
+    "activity": {"name": "Stick fractions", "steps": ["Break a stick, {in two}"]},
+    "class_management": ["Work in pairs"],
+    "quick_check": {"questions": ["What is half of 4?"]}
+}
+
+TEACHER = User(id="t1", name="Asha", username="asha", role=UserRole.TEACHER, district="Tumkur", language="en")
+
+
+def test_parser_returns_sections_as_they_complete():
+    text = "```json\n" + json.dumps(PLAYBOOK) + "\n```"
+    parser = PartialJSONParser()
+    completed = []
+    for i in range(0, len(text), 7):
+        completed.extend(key for key, _ in parser.feed(text[i:i + 7]))
+    assert completed == list(PLAYBOOK)
+    assert parser.fields == PLAYBOOK
+    assert parser.done
+
+
+def test_parser_skips_a_truncated_section():
+    text = json.dumps(PLAYBOOK)
+    parser = PartialJSONParser()
+    parser.feed(text[:text.index('"quick_check"') + 20])
+    assert list(parser.fields) == ["what_to_say", "activity", "class_management"]
+    assert not parser.done
+
+
+def sse_events(chunks: list) -> dict:
+    """Parse SSE chunks into {event: data}."""
+    events = {}
+    for chunk in chunks:
+        name, data = chunk.strip().split("\n")
+        events[name.removeprefix("event: ")] = json.loads(data.removeprefix("data: "))
+    return events
+
+
+@pytest.fixture
+def stream(monkeypatch):
+    """Run sos_event_stream without Redis, retrieval or videos; returns (events, cached)."""
+    cached = []
+
+    async def context_stage(runner, query_text):
+        return {"grade": 5, "subject": "Math", "topic": "Fractions"}
+
+    async def no_cached_playbook(cache_key, query_text, context, current_user):
+        return cache_key, None
+
+    def no_stages(runner, *args):
+        for name in ("ncert_refs", "videos", "similar"):
+            if name not in runner._tasks:
+                runner.start(name, asyncio.sleep(0, []), timeout=1, default=[])
+
+    async def cache_playbook(cache_key, playbook, ttl, query_text, context, pin=False):
+        cached.append((playbook, ttl))
+
+    async def record_sos(*args, **kwargs):
+        return "sos1"
+
+    monkeypatch.setattr(cache_service, "redis_client", None)
+    monkeypatch.setattr(sos, "run_context_stage", context_stage)
+    monkeypatch.setattr(sos, "find_cached_playbook", no_cached_playbook)
+    monkeypatch.setattr(sos, "start_resource_stages", no_stages)
+    monkeypatch.setattr(sos, "start_similar_stage", no_stages)
+    monkeypatch.setattr(sos, "cache_playbook", cache_playbook)
+    monkeypatch.setattr(sos, "record_sos", record_sos)
+
+    async def collect():
+        query = "students confused by fractions"
+        return [event async for event in sos.sos_event_stream(SOSRequest(text=query), query, TEACHER)]
+
+    return lambda: (sse_events(asyncio.run(collect())), cached)
+
+
+def test_generated_stream_is_cached(stream, monkeypatch):
+    async def tokens(**kwargs):
+        text = json.dumps(PLAYBOOK)
+        for i in range(0, len(text), 11):
+            yield text[i:i + 11]
+
+    monkeypatch.setattr(sos, "stream_playbook", tokens)
+    events, cached = stream()
+    assert all(events[section] == PLAYBOOK[section] for section in PLAYBOOK_SECTIONS)
+    assert "partial" not in events["done"]["playbook"]
+    assert [ttl for _, ttl in cached] == [GENERATED_TTL]
+
+
+def test_fallback_stream_is_not_cached(stream, monkeypatch):
+    monkeypatch.setattr(mistral_service, "client", None)
+    events, cached = stream()
+    assert all(section in events for section in PLAYBOOK_SECTIONS)
+    assert events["done"]["playbook"]["partial"]
+    assert cached == []
+
+
+def test_stream_failing_after_every_section_is_not_cached(stream, monkeypatch):
+    async def tokens(**kwargs):
+        yield json.dumps(PLAYBOOK)
+        raise ConnectionError("stream reset")
+
+    monkeypatch.setattr(sos, "stream_playbook", tokens)
+    events, cached = stream()
+    assert events["what_to_say"] == PLAYBOOK["what_to_say"]
+    assert events["done"]["playbook"]["late_stages"] == ["playbook"]
+    assert cached == []
+
+
+def test_sections_are_sent_in_teacher_order_without_stray_keys(stream, monkeypatch):
+    async def tokens(**kwargs):
+        shuffled = {
+            "activity": PLAYBOOK["activity"],
+            "notes": "An extra key the model added",
+            "what_to_say": PLAYBOOK["what_to_say"],
+            "quick_check": PLAYBOOK["quick_check"],
+            "class_management": PLAYBOOK["class_management"]
+        }
+        text = json.dumps(shuffled)
+        for i in range(0, len(text), 11):
+            yield text[i:i + 11]
+
+    monkeypatch.setattr(sos, "stream_playbook", tokens)
+    events, cached = stream()
+    assert list(events) == ["context", *PLAYBOOK_SECTIONS, "ncert_refs", "videos", "done"]
+    assert all(events[section] == PLAYBOOK[section] for section in PLAYBOOK_SECTIONS)
+    assert len(cached) == 1